@@ -0,0 +1,203 @@
+"""
+CONSULTAS APROXIMADAS SOBRE SILVER
+==================================
+
+Para explorar silver.enriched_events sin recorrerla entera: la consulta se
+ejecuta sobre una muestra de usuarios (SAMPLE BY cityHash64(user_id)) y los
+resultados se escalan al total, con un intervalo de confianza.
+
+- La muestra es determinista: la misma fracción devuelve siempre los mismos
+  usuarios, y una fracción mayor contiene a la menor.
+- Al muestrear usuarios completos, también se pueden estimar usuarios
+  distintos ('users'), no solo conteos, sumas y medias.
+- Intervalos de confianza por réplicas: la muestra se divide en
+  config.approx_replicates submuestras (por hash de usuario) y la
+  dispersión entre ellas da el error estándar.
+- Muestra adaptativa: se empieza por config.approx_initial_fraction y se
+  amplía hasta llegar al error relativo pedido o agotar el tiempo máximo.
+
+Ejemplo:
+    estimate({'requests': ('count', None),
+              'avg_latency': ('avg', 'response_time_ms'),
+              'users': ('users', None)},
+             group_by=['user_country'], relative_error=0.05, max_seconds=1)
+"""
+
+import math
+import time
+from fractions import Fraction
+from statistics import NormalDist
+import lakehouseConfig as lhc
+import config as conf
+import cluster
+
+# Tipos de métrica: expresiones que se agregan por réplica
+METRIC_KINDS = ('count', 'sum', 'avg', 'users')
+SAMPLING_KEY = 'cityHash64(user_id)'
+
+
+def has_sampling_key(client):
+    return bool(client.command(
+        "SELECT sampling_key != '' FROM system.tables WHERE database = 'silver' AND name = {table:String}",
+        parameters={'table': cluster.local_name('silver.enriched_events').split('.')[1]}))
+
+
+def _source(fraction, sampling):
+    if fraction >= 1:
+        return "silver.enriched_events", "1"
+    ratio = f"{fraction:.6f}"
+    if sampling:
+        return f"silver.enriched_events SAMPLE {ratio}", "1"
+    # Tabla sin SAMPLE BY: la misma condición que aplica SAMPLE sobre su clave UInt64
+    # (clave < fracción * 2^64, truncado), así que salen los mismos usuarios, pero
+    # recorriendo todos los datos
+    return "silver.enriched_events", f"{SAMPLING_KEY} < {int(Fraction(ratio) * 2 ** 64)}"
+
+
+def _sample_query(metrics, fraction, sampling, where, group_by, replicates):
+    source, sample_condition = _source(fraction, sampling)
+    aggregates = []
+    for name, (kind, expr) in metrics.items():
+        if kind in ('sum', 'avg'):
+            aggregates.append(f"sum({expr}) AS `{name}`")
+        elif kind == 'users':
+            aggregates.append(f"uniqExact(user_id) AS `{name}`")
+    groups = ''.join(f"{column}, " for column in group_by)
+    return f"""
+        SELECT
+            {groups}intHash32({SAMPLING_KEY}) % {replicates} AS _replicate,
+            count() AS _rows{''.join(', ' + a for a in aggregates)}
+        FROM {source}
+        WHERE {sample_condition} AND ({where or '1'})
+        GROUP BY {groups}_replicate
+    """
+
+
+def _estimates(rows, metrics, n_groups, fraction, replicates, z):
+    """
+    {grupo: {métrica: {'estimate', 'low', 'high', 'relative_error'}}} a
+    partir de las filas (grupo..., réplica, filas, agregados...).
+    """
+    by_group = {}
+    for row in rows:
+        group, replicate, values = row[:n_groups], row[n_groups], row[n_groups + 1:]
+        by_group.setdefault(tuple(group), {})[replicate] = values
+
+    # Posición de cada métrica en `values`: 0 = filas (count); el resto, en orden
+    aggregated = [name for name, (kind, _) in metrics.items() if kind != 'count']
+    columns = {name: 0 if kind == 'count' else 1 + aggregated.index(name) for name, (kind, _) in metrics.items()}
+
+    exact = fraction >= 1
+    results = {}
+    for group, per_replicate in by_group.items():
+        results[group] = {}
+        for name, (kind, _) in metrics.items():
+            column = columns[name]
+            if kind == 'avg':
+                # Cociente de sumas; cada réplica da su propia media
+                total = sum(v[column] for v in per_replicate.values())
+                count = sum(v[0] for v in per_replicate.values())
+                estimate = total / count if count else None
+                samples = [v[column] / v[0] for v in per_replicate.values() if v[0]]
+            else:
+                # Las réplicas sin filas del grupo cuentan como 0
+                values = [per_replicate[r][column] if r in per_replicate else 0 for r in range(replicates)]
+                estimate = sum(values) / fraction
+                samples = [value * replicates / fraction for value in values]
+
+            if exact or estimate is None or len(samples) < 2:
+                half_width = 0.0 if exact else math.inf
+            else:
+                mean = sum(samples) / len(samples)
+                variance = sum((s - mean) ** 2 for s in samples) / (len(samples) - 1)
+                half_width = z * math.sqrt(variance / len(samples))
+            results[group][name] = {
+                'estimate': estimate,
+                'low': None if estimate is None else estimate - half_width,
+                'high': None if estimate is None else estimate + half_width,
+                'relative_error': (half_width / abs(estimate)) if estimate else (0.0 if half_width == 0 else math.inf),
+            }
+    return results
+
+
+def estimate(metrics, where=None, group_by=None, relative_error=None, max_seconds=None,
+             confidence=None, client=None):
+    """
+    Estima métricas de silver.enriched_events con una muestra de usuarios.
+
+    metrics: {nombre: (tipo, expresión)} con tipo 'count' (expresión None),
+    'sum', 'avg' o 'users' (usuarios distintos, expresión None).
+
+    Amplía la muestra hasta que el error relativo de todas las métricas (al
+    nivel de confianza indicado) sea <= relative_error, o hasta que la
+    siguiente ampliación no quepa en max_seconds.
+
+    Devuelve {'fraction', 'exact', 'sampled', 'relative_error', 'seconds',
+    'groups': {grupo: {métrica: {'estimate', 'low', 'high', 'relative_error'}}}}.
+    'sampled' es False si Silver no tiene SAMPLE BY (misma muestra con un filtro sobre
+    la clave de muestreo, leyendo todos los datos).
+    """
+    unknown = {kind for kind, _ in metrics.values()} - set(METRIC_KINDS)
+    if unknown:
+        raise ValueError(f"Tipos de métrica desconocidos: {', '.join(sorted(unknown))}")
+    client = client or lhc.get_client()
+    group_by = list(group_by or [])
+    relative_error = relative_error if relative_error is not None else conf.approx_relative_error
+    max_seconds = max_seconds if max_seconds is not None else conf.approx_max_seconds
+    confidence = confidence if confidence is not None else conf.approx_confidence
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    replicates = conf.approx_replicates
+    sampling = has_sampling_key(client)
+
+    started = time.perf_counter()
+    fraction = conf.approx_initial_fraction
+    while True:
+        query_start = time.perf_counter()
+        result = client.query(_sample_query(metrics, fraction, sampling, where, group_by, replicates))
+        query_seconds = time.perf_counter() - query_start
+        groups = _estimates(result.result_rows, metrics, len(group_by), fraction, replicates, z)
+
+        worst = max((m['relative_error'] for g in groups.values() for m in g.values()), default=0.0)
+        if fraction >= 1 or worst <= relative_error:
+            break
+        # El error baja con la raíz del tamaño de la muestra
+        needed = fraction * (worst / relative_error) ** 2 * 1.2 if math.isfinite(worst) else fraction * 10
+        next_fraction = min(1.0, max(needed, fraction * 2))
+        remaining = max_seconds - (time.perf_counter() - started) if max_seconds else math.inf
+        if query_seconds * next_fraction / fraction > remaining:
+            break
+        fraction = next_fraction
+
+    return {
+        'fraction': fraction,
+        'exact': fraction >= 1,
+        'sampled': sampling,
+        'relative_error': worst,
+        'seconds': time.perf_counter() - started,
+        'groups': groups,
+    }
+
+
+def print_estimate(result, group_by=()):
+    mode = "exacto" if result['exact'] else f"muestra del {result['fraction']:.2%} de los usuarios"
+    print(f" ({mode}, error relativo máx. {result['relative_error']:.1%}, {result['seconds'] * 1000:.0f} ms)")
+    for group, values in sorted(result['groups'].items(), key=lambda item: str(item[0])):
+        label = ", ".join(f"{c}={v}" for c, v in zip(group_by, group)) or "total"
+        metrics = "; ".join(
+            f"{name}: {m['estimate']:,.2f} [{m['low']:,.2f} - {m['high']:,.2f}]" if m['estimate'] is not None
+            else f"{name}: -"
+            for name, m in values.items())
+        print(f"   • {label}: {metrics}")
+
+
+if __name__ == "__main__":
+    metrics = {
+        'requests': ('count', None),
+        'users': ('users', None),
+        'gb_sent': ('sum', 'bytes_sent / 1e9'),
+        'avg_latency_ms': ('avg', 'response_time_ms'),
+    }
+    print(" Tráfico total (estimado):")
+    print_estimate(estimate(metrics))
+    print("\n Tráfico por país (estimado):")
+    print_estimate(estimate(metrics, group_by=['user_country']), group_by=['user_country'])
@@ -0,0 +1,220 @@
+"""
+API ASYNCIO DEL LAKEHOUSE
+=========================
+
+Interfaz asyncio para lanzar DDL y consultas independientes a la vez desde
+un único event loop (p.ej. el backend de un dashboard):
+
+- get_async_client(): AsyncClient de clickhouse_connect (requiere
+  clickhouse-connect[async], que instala aiohttp) con la misma configuración
+  que lakehouseConfig.get_client(). Sin sesión HTTP
+  (autogenerate_session_id=False): ClickHouse no permite consultas
+  concurrentes dentro de una misma sesión. Sus llamadas se etiquetan y se
+  perfilan igual que las del cliente síncrono (profiling.py).
+- gather_bounded(): ejecuta corrutinas con concurrencia limitada por un
+  semáforo. Si una falla, se cancelan las demás.
+- Cada consulta lleva su query_id; al cancelarla (timeout, error de otra
+  consulta o cancelación del llamante) se lanza KILL QUERY en el servidor,
+  ya que cancelar la corrutina no detiene la consulta en ClickHouse.
+- create_gold_views_async(), verify_gold_views_async(),
+  query_gold_examples_async() y run_pipeline_async() equivalen a sus
+  versiones síncronas.
+
+Uso:
+    python async_api.py            # Crea las vistas Gold y lanza las consultas de ejemplo
+"""
+
+import asyncio
+import time
+import uuid
+import clickhouse_connect
+import config as conf
+import cluster
+import lakehouseConfig as lhc
+import gold_layer as gl
+import profiling
+
+
+async def get_async_client(max_concurrency=None):
+    """
+    Cliente asíncrono (aiohttp), con tantas conexiones HTTP como consultas
+    concurrentes. Como el de get_client(), etiqueta cada llamada y pasa por
+    el profiling (profiling.wrap_async).
+    """
+    params = lhc.get_connection_params()
+    client = await clickhouse_connect.get_async_client(
+        **params,
+        autogenerate_session_id=False,
+        connector_limit=max_concurrency or conf.async_max_concurrency,
+    )
+    return profiling.wrap_async(client)
+
+
+async def _kill_query(client, query_id):
+    try:
+        await client.command("KILL QUERY WHERE query_id = {query_id:String} ASYNC",
+                             parameters={'query_id': query_id})
+    except Exception as e:
+        print(f" No se pudo cancelar la consulta {query_id} en ClickHouse: {e}")
+
+
+async def run_statement(client, sql, parameters=None, method='query', timeout=None):
+    """
+    Ejecuta una consulta (method='query', o 'query_arrow' para un resultado
+    en Arrow) o un comando (method='command').
+    Con timeout (s) o si se cancela la tarea, la consulta se mata en el servidor.
+    """
+    query_id = f"lakehouse-async-{uuid.uuid4().hex}"
+    # El log_comment (etiqueta en curso) lo añade el envoltorio de profiling
+    settings = {'query_id': query_id}
+    call = getattr(client, method)(sql, parameters=parameters, settings=settings)
+    try:
+        return await asyncio.wait_for(call, timeout or conf.async_query_timeout_seconds)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        await asyncio.shield(_kill_query(client, query_id))
+        raise
+
+
+async def gather_bounded(coroutines, max_concurrency=None):
+    """
+    Ejecuta las corrutinas con como mucho max_concurrency a la vez.
+    Devuelve los resultados en el mismo orden. Si alguna falla, cancela el
+    resto y propaga el error.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency or conf.async_max_concurrency)
+
+    async def bounded(coroutine):
+        try:
+            async with semaphore:
+                return await coroutine
+        finally:
+            coroutine.close()  # Cancelada antes de empezar: evita el aviso "never awaited"
+
+    tasks = [asyncio.ensure_future(bounded(c)) for c in coroutines]
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+        return [task.result() for task in tasks]
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        # Esperar a que las cancelaciones (y sus KILL QUERY) terminen
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+# =========================================================================
+# CAPA GOLD
+# =========================================================================
+
+async def create_gold_views_async(views=None, max_concurrency=None):
+    """
+    Crea las vistas Gold en paralelo (cada una con su POPULATE independiente).
+    """
+    views = views or gl.GOLD_VIEWS
+    client = await get_async_client(max_concurrency)
+    start_time = time.time()
+
+    async def create(view):
+        with lhc.tagged_queries(f"lakehouse:gold_{view}"):
+            await run_statement(client, cluster.localize_view_ddl(gl.GOLD_VIEW_DDL[view], f"gold.{view}"),
+                                method='command')
+            if cluster.is_clustered():
+                await run_statement(client, cluster.distributed_ddl(f"gold.{view}"), method='command')
+        print(f" {view} - {gl.GOLD_VIEW_DESCRIPTIONS[view]}")
+
+    try:
+        await gather_bounded([create(view) for view in views], max_concurrency)
+    finally:
+        await client.close()
+    print(f" {len(views)} vistas Gold creadas en {time.time() - start_time:.2f}s")
+
+
+async def verify_gold_views_async(views=None, max_concurrency=None):
+    """
+    Devuelve {vista: número de registros}, consultando todas las vistas a la vez.
+    """
+    views = views or gl.GOLD_VIEWS
+    client = await get_async_client(max_concurrency)
+    try:
+        counts = await gather_bounded(
+            [run_statement(client, f"SELECT count() FROM gold.{view}", method='command') for view in views],
+            max_concurrency)
+    finally:
+        await client.close()
+    return dict(zip(views, counts))
+
+
+async def query_gold_async(client, sql, parameters=None, timeout=None, fmt='rows'):
+    """
+    Consulta de dashboard sobre Gold. Devuelve el resultado en `fmt`
+    (gold_layer.RESULT_FORMATS; por defecto, las filas).
+    """
+    if fmt == 'rows':
+        result = await run_statement(client, sql, parameters=parameters, timeout=timeout)
+        return result.result_rows
+    if fmt not in gl.RESULT_FORMATS:
+        raise ValueError(f"Formato desconocido: {fmt}. Disponibles: {', '.join(gl.RESULT_FORMATS)}")
+    table = await run_statement(client, sql, parameters=parameters, method='query_arrow', timeout=timeout)
+    return gl.convert_arrow(table, fmt)
+
+
+async def query_gold_examples_async(max_concurrency=None, fmt='rows'):
+    """
+    Lanza a la vez las consultas estándar Gold. Devuelve {título: resultado en `fmt`}.
+    """
+    client = await get_async_client(max_concurrency)
+
+    async def run(i, sql):
+        with lhc.tagged_queries(f"lakehouse:gold_query_{i}"):
+            return await query_gold_async(client, sql, fmt=fmt)
+
+    try:
+        rows = await gather_bounded([run(i, sql) for i, (_, sql) in enumerate(gl.GOLD_EXAMPLE_QUERIES, start=1)],
+                                    max_concurrency)
+    finally:
+        await client.close()
+    return {title: result for (title, _), result in zip(gl.GOLD_EXAMPLE_QUERIES, rows)}
+
+
+# =========================================================================
+# PIPELINE
+# =========================================================================
+
+async def _in_thread(func):
+    # Las etapas Mongo/Bronze/Silver siguen siendo síncronas (pandas, pymongo)
+    return await asyncio.get_running_loop().run_in_executor(None, func)
+
+
+async def run_pipeline_async(max_concurrency=None):
+    """
+    Pipeline completo desde el event loop: las etapas independientes se
+    solapan y las vistas Gold se crean en paralelo.
+    """
+    import mongo as mng
+    import bronze_layer as bl
+    import silver_layer as sl
+
+    await gather_bounded([_in_thread(mng.load_data_to_mongo), _in_thread(lhc.setup_lakehouse)])
+    await gather_bounded([_in_thread(bl.ingest_logs), _in_thread(bl.ingest_users),
+                          _in_thread(bl.ingest_ip_reputation)])
+    await _in_thread(sl.process_silver)
+    await create_gold_views_async(max_concurrency=max_concurrency)
+    counts = await verify_gold_views_async(max_concurrency=max_concurrency)
+    for view, count in counts.items():
+        print(f"   ✓ gold.{view}: {count:,} registros")
+
+
+async def _main():
+    await create_gold_views_async()
+    for title, rows in (await query_gold_examples_async()).items():
+        print(f"\n {title}:")
+        print(rows)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,267 @@
+"""
+BENCHMARK END-TO-END DEL LAKEHOUSE
+==================================
+
+Ejecuta el pipeline completo (Mongo -> Bronze -> Silver -> Gold) y las
+consultas Gold estándar sobre datasets sintéticos de varios tamaños
+(data_generator.py), contra un ClickHouse y un MongoDB locales.
+
+Por cada tamaño y etapa registra (vía metrics.py):
+- duración y throughput (filas/s)
+- pico de memoria (RSS de Python, incluidos los procesos de la ingesta
+  Bronze, y memoria de ClickHouse)
+- bytes escaneados por ClickHouse
+
+Los resultados se comparan con un baseline versionado
+(config.benchmark_baseline_file, pensado para subirse al repositorio). Si
+alguna etapa empeora más de config.benchmark_regression_threshold, el
+proceso termina con código 1.
+
+Uso:
+    python benchmark.py                      # Ejecuta y compara con el baseline
+    python benchmark.py --sizes 10000 100000 # Solo algunos tamaños
+    python benchmark.py --update-baseline    # Guarda los resultados como nuevo baseline
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+import config as conf
+import metrics
+import data_generator as dg
+import mongo as mng
+import lakehouseConfig as lhc
+import bronze_layer as bl
+import silver_layer as sl
+import gold_layer as gl
+
+BASELINE_VERSION = 1
+
+# Días de datos sintéticos (terminan en la hora actual)
+DATASET_DAYS = 30
+
+# Métricas que se comparan con el baseline (mayor = peor)
+COMPARED_METRICS = ['duration_seconds', 'peak_rss_bytes', 'ch_peak_memory_bytes', 'read_bytes']
+
+
+def _server(config_file):
+    with open(config_file, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    return str(config["host"]).lower(), int(config["port"])
+
+
+def _use_local_services():
+    """
+    Apunta el pipeline al ClickHouse/Mongo de benchmark para no tocar los datos reales.
+    El benchmark borra las bases de datos del lakehouse: sin un ClickHouse
+    propio (config.benchmark_config_file) no se ejecuta.
+    """
+    if not conf.benchmark_config_file:
+        raise ValueError("El benchmark borra bronze/silver/gold/catalog: configura "
+                         "config.benchmark_config_file con un ClickHouse distinto del principal.")
+    if os.path.exists(conf.config_file) and _server(conf.benchmark_config_file) == _server(conf.config_file):
+        raise ValueError(f"config.benchmark_config_file ({conf.benchmark_config_file}) apunta al mismo "
+                         "ClickHouse que config.config_file; el benchmark borraría sus datos.")
+    conf.config_file = conf.benchmark_config_file
+    conf.db_name = conf.benchmark_db_name
+
+
+def prepare_dataset(rows):
+    """
+    Genera (o reutiliza) el dataset sintético de `rows` eventos en un único fichero CSV.
+
+    Las consultas Gold estándar filtran respecto a today()/now() (último día,
+    última hora...), así que los datos terminan en la hora actual: cada hora
+    se regenera el dataset y se borran los anteriores del mismo tamaño.
+    """
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - timedelta(days=DATASET_DAYS)
+    prefix = f"rows_{rows}_"
+    out_dir = os.path.join(conf.benchmark_data_dir, f"{prefix}{start:%Y%m%d%H}")
+    logs_path = os.path.join(out_dir, 'logs_web_00000.csv')
+    if not os.path.exists(logs_path):
+        if os.path.isdir(conf.benchmark_data_dir):
+            for entry in os.listdir(conf.benchmark_data_dir):
+                if entry.startswith(prefix) or entry == f"rows_{rows}":
+                    shutil.rmtree(os.path.join(conf.benchmark_data_dir, entry), ignore_errors=True)
+        dg.generate_dataset(out_dir, rows, n_users=max(100, rows // 50), n_ips=max(50, rows // 500),
+                            days=DATASET_DAYS, start_date=start.isoformat(timespec='seconds'),
+                            seed=conf.benchmark_seed, file_format='csv', chunk_rows=rows)
+    return out_dir, logs_path
+
+
+def reset_lakehouse():
+    # Nunca sobre la conexión principal (ver _use_local_services)
+    if not conf.benchmark_config_file or conf.config_file != conf.benchmark_config_file:
+        raise RuntimeError("reset_lakehouse() solo se ejecuta contra el ClickHouse de benchmark.")
+    client = lhc.get_client()
+    for database in ('gold', 'silver', 'bronze', 'catalog'):
+        client.command(f"DROP DATABASE IF EXISTS {database} SYNC")
+
+
+def run_size(rows, query_repetitions):
+    """
+    Ejecuta el pipeline completo para un tamaño. Devuelve {etapa: métricas}.
+    """
+    data_dir, logs_path = prepare_dataset(rows)
+    conf.ruta_data = data_dir
+    bl.path_logs_csv = logs_path
+
+    reset_lakehouse()
+    metrics.reset_run()
+
+    mng.load_data_to_mongo()
+    lhc.setup_lakehouse()
+    bl.ingest_logs()
+    bl.ingest_users()
+    bl.ingest_ip_reputation()
+    sl.process_silver()
+    gl.create_gold_views()
+
+    # Consultas Gold estándar: nos quedamos con la mejor de N repeticiones
+    latencies = {}
+    for i, (title, sql) in enumerate(gl.GOLD_EXAMPLE_QUERIES, start=1):
+        name = f"query_{i}"
+        with metrics.stage(name):
+            client = lhc.get_client()
+            best = None
+            for _ in range(query_repetitions):
+                start = time.perf_counter()
+                client.query(sql)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        latencies[name] = best
+
+    results = {}
+    for stage_record in metrics.collect_run():
+        name = stage_record['stage']
+        results[name] = {key: stage_record.get(key) for key in
+                         ['duration_seconds', 'rows_in', 'rows_out', 'rows_per_second', 'peak_rss_bytes',
+                          'read_rows', 'read_bytes', 'written_rows', 'ch_peak_memory_bytes']}
+        if name in latencies:
+            # En las consultas la duración comparable es la latencia de una ejecución
+            results[name]['duration_seconds'] = latencies[name]
+            results[name]['read_bytes'] = (results[name]['read_bytes'] or 0) // query_repetitions
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BASELINE_VERSION:
+        print(f" El baseline {path} tiene otra versión ({baseline.get('version')}); se ignora.")
+        return None
+    return baseline
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    Devuelve la lista de regresiones (tamaño, etapa, métrica, antes, ahora).
+    Se ignoran diferencias por debajo del umbral de ruido absoluto.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage_name, values in stages.items():
+            old = baseline['results'].get(size, {}).get(stage_name)
+            if not old:
+                continue
+            for metric in COMPARED_METRICS:
+                before, now = old.get(metric), values.get(metric)
+                if not before or now is None:
+                    continue
+                noise = conf.benchmark_min_seconds if metric == 'duration_seconds' else 0
+                if now > before * (1 + threshold) and now - before > noise:
+                    regressions.append((size, stage_name, metric, before, now))
+    return regressions
+
+
+def run_benchmark(sizes=None, update_baseline=False, threshold=None, query_repetitions=None):
+    sizes = sizes or conf.benchmark_sizes
+    threshold = conf.benchmark_regression_threshold if threshold is None else threshold
+    query_repetitions = query_repetitions or conf.benchmark_query_repetitions
+    _use_local_services()
+
+    results = {}
+    for rows in sizes:
+        print("\n" + "=" * 60)
+        print(f" BENCHMARK: {rows:,} eventos")
+        print("=" * 60)
+        results[str(rows)] = run_size(rows, query_repetitions)
+
+    report = {
+        'version': BASELINE_VERSION,
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': _git_commit(),
+        'threshold': threshold,
+        'results': results,
+    }
+    bench_dir = os.path.join(conf.ruta_reports, 'benchmarks')
+    os.makedirs(bench_dir, exist_ok=True)
+    report_path = os.path.join(bench_dir, f"bench_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    print("\n" + "-" * 60)
+    print(f" {'tamaño':>10}  {'etapa':<36} {'segundos':>9} {'filas/s':>12} {'MB leídos':>10}")
+    for size, stages in results.items():
+        for stage_name, values in stages.items():
+            print(f" {size:>10}  {stage_name:<36} {values['duration_seconds']:>9.3f} "
+                  f"{values['rows_per_second'] or 0:>12,.0f} {(values['read_bytes'] or 0) / 1024 / 1024:>10.1f}")
+    print(f"\n Resultados guardados en {report_path}")
+
+    if update_baseline:
+        os.makedirs(os.path.dirname(conf.benchmark_baseline_file) or '.', exist_ok=True)
+        with open(conf.benchmark_baseline_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f" Baseline actualizado: {conf.benchmark_baseline_file}")
+        return True
+
+    baseline = load_baseline(conf.benchmark_baseline_file)
+    if baseline is None:
+        print(" No hay baseline con el que comparar (usa --update-baseline para crearlo).")
+        return True
+
+    regressions = compare_with_baseline(results, baseline, threshold)
+    if not regressions:
+        print(f" Sin regresiones respecto al baseline ({baseline.get('git_commit')}, umbral {threshold:.0%}).")
+        return True
+    print(f"\n ✗ REGRESIONES respecto al baseline ({baseline.get('git_commit')}, umbral {threshold:.0%}):")
+    for size, stage_name, metric, before, now in regressions:
+        print(f"   • [{size}] {stage_name}.{metric}: {before:,.3f} -> {now:,.3f} (+{now / before - 1:.0%})")
+    return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end del lakehouse con umbrales de regresión.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=None, help="Número de eventos por ejecución")
+    parser.add_argument('--threshold', type=float, default=None, help="Regresión máxima permitida (0.2 = +20%%)")
+    parser.add_argument('--repetitions', type=int, default=None, help="Repeticiones de cada consulta Gold")
+    parser.add_argument('--update-baseline', action='store_true', help="Guarda los resultados como baseline")
+    args = parser.parse_args(argv)
+
+    try:
+        success = run_benchmark(args.sizes, args.update_baseline, args.threshold, args.repetitions)
+    except ValueError as e:
+        print(f" ✗ {e}")
+        sys.exit(2)
+    if not success:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
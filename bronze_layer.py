@@ -1,113 +1,312 @@
 # Imports
-from datetime import date
-from random import randint, choice
 from datetime import datetime
 import os
-import clickhouse_connect
 import pandas as pd
-import clickhouse_connect
-from pymongo import MongoClient
-import pandas as pd
-import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import glob
+import gzip
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import lakehouseConfig as lakehouseConfig
+import config as conf
+import catalog
+import cluster
+import dimension_cache
 import mongo as mng
+import metrics
 
 # Ruta donde está el CSV de logs (ajusta según tu carpeta)
+# Puede ser un fichero, una carpeta (se cargan todos sus logs) o un patrón glob,
+# p.ej. r'/var/log/web/logs_web_*.csv.gz'. Se admiten ficheros planos, .gz, .zst y
+# .parquet (p.ej. los que genera data_generator.py --format parquet).
 ruta_data = r'C:\Users\pablo\Desktop\Master\GestionAlmacenamientoBigData\PracticaFinal\data'
 path_logs_csv = os.path.join(ruta_data, 'logs_web.csv') #ojo que el nombre del csv sea el mismo
 
-def ingest_bronze():
+LOG_FILE_EXTENSIONS = ('.csv', '.csv.gz', '.csv.zst', '.log', '.log.gz', '.log.zst', '.parquet')
+
+
+# Cada fuente se ingesta con su propia función para poder ejecutarlas por
+# separado (y en paralelo) desde el orquestador. Si no se pasa cliente, la
+# función abre (y cierra) sus propias conexiones. Los errores se propagan.
+
+def list_log_files(source):
+    """
+    Ficheros de log a partir de un fichero, una carpeta o un patrón glob.
+    """
+    if any(c in source for c in '*?['):
+        return sorted(f for f in glob.glob(source) if os.path.isfile(f))
+    if os.path.isdir(source):
+        return sorted(os.path.join(source, f) for f in os.listdir(source)
+                      if f.endswith(LOG_FILE_EXTENSIONS))
+    return [source] if os.path.exists(source) else []
+
+
+def _open_log_file(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    if path.endswith('.zst'):
+        import zstandard  # Dependencia opcional, solo para ficheros .zst
+        raw = open(path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True),
+                                encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _read_log_file(path):
+    """
+    Bloques de hasta conf.bronze_insert_batch_rows filas como DataFrames de
+    strings (Bronze lo guarda todo como String).
+    """
+    if path.endswith('.parquet'):
+        # Se lee por record batches: la memoria no depende del tamaño del fichero
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=conf.bronze_insert_batch_rows):
+            batch = pa.RecordBatch.from_arrays([pc.cast(column, pa.string()) for column in batch.columns],
+                                               names=batch.schema.names)
+            yield batch.to_pandas()
+        return
+    with _open_log_file(path) as f:
+        # Leemos todo como string (dtype=str) para cumplir con la tabla Bronze definida
+        yield from pd.read_csv(f, dtype=str, chunksize=conf.bronze_insert_batch_rows)
+
+
+def _file_identity(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, int(stat.st_mtime)
+
+
+def _mark_file(ch_client, identity, status, rows=0):
+    file_path, file_size, file_mtime = identity
+    ch_client.insert('bronze.ingested_files',
+                     [[file_path, file_size, file_mtime, status, rows, datetime.now()]],
+                     column_names=['file_path', 'file_size', 'file_mtime', 'status', 'rows', 'updated_at'])
+
+
+def _init_ingest_worker(config_file, query_tag):
+    # Con 'spawn' los procesos hijos no ven cambios hechos en config en tiempo de
+    # ejecución ni la etiqueta de la etapa (sin ella sus INSERT no tendrían
+    # log_comment y no contarían en las métricas de bronze_logs)
+    lakehouseConfig.conf.config_file = config_file
+    lakehouseConfig.query_tag.set(query_tag)
+
+
+def _ingest_log_file(path):
+    """
+    Ingesta un fichero de log (en un proceso del pool). Se lee por bloques
+    para que la memoria no dependa del tamaño del fichero.
+    """
     ch_client = lakehouseConfig.get_client()
-    mongo_client, mongo_db = mng.create_mongo_connection()
-    
-    print("Iniciando ingesta a Capa BRONZE...")
+    # En cluster, cada bloque se reparte y se inserta directamente en los shards
+    shard_clients = cluster.shard_clients() if cluster.is_clustered() and conf.cluster_shard_hosts else None
+    identity = _file_identity(path)
+    _mark_file(ch_client, identity, 'started')
+
+    rows = 0
+    for df_logs in _read_log_file(path):
+        # Reemplazar NaN por cadenas vacías para evitar errores en CH
+        df_logs = df_logs.fillna('')
+        df_logs['_source_file'] = identity[0]
+        cluster.insert_sharded(ch_client, 'bronze.logs_web', 'user_id', df=df_logs, clients=shard_clients)
+        rows += len(df_logs)
+
+    _mark_file(ch_client, identity, 'done', rows)
+    return path, rows, os.getpid(), metrics.process_peak_rss_bytes()
 
+
+@metrics.instrumented('bronze_logs')
+def ingest_logs(ch_client=None):
     # ---------------------------------------------------------
     # 1. INGESTA LOGS (CSV) -> ClickHouse (bronze.logs_web)
-    #  "logs_web.csv" -> Ingestar como fichero CSV.
+    #  "logs_web.csv" -> Ingestar como fichero(s) CSV.
     # ---------------------------------------------------------
+    ch_client = ch_client or lakehouseConfig.get_client()
+    files = list_log_files(path_logs_csv)
+    if not files:
+        print(f" No se encuentran ficheros de logs en: {path_logs_csv}")
+        return 0
+
+    # Control de ficheros ya cargados: último estado registrado de cada ruta.
+    # Si el fichero quedó a medias ('started') o ha cambiado desde su carga
+    # (tamaño o fecha de modificación), se borran sus filas antes de
+    # recargarlo: nunca quedan en Bronze dos cargas del mismo fichero.
+    result = ch_client.query("""
+        SELECT file_path, argMax(file_size, updated_at), argMax(file_mtime, updated_at), argMax(status, updated_at)
+        FROM bronze.ingested_files
+        GROUP BY file_path
+    """)
+    loaded = {p: (size, mtime, status) for p, size, mtime, status in result.result_rows}
+    pending = []
+    cleaned = False
+    for path in files:
+        identity = _file_identity(path)
+        previous = loaded.get(identity[0])
+        if previous == (identity[1], identity[2], 'done'):
+            continue
+        if previous is not None:
+            reason = "carga incompleta" if previous[2] == 'started' else "el fichero ha cambiado"
+            print(f"   Borrando las filas cargadas de {path} ({reason})...")
+            ch_client.command(f"ALTER TABLE {cluster.ddl_name('bronze.logs_web')} DELETE WHERE _source_file = {{p:String}}",
+                              parameters={'p': identity[0]}, settings={'mutations_sync': 2 if cluster.is_clustered() else 1})
+            cleaned = True
+        pending.append(path)
+    if cleaned:
+        # Los borrados no pasan por la vista del catálogo: se recalculan sus estadísticas
+        catalog.rebuild(ch_client, 'bronze.logs_web')
+
+    print(f"   {len(files)} ficheros de logs, {len(files) - len(pending)} ya cargados, {len(pending)} pendientes.")
+    if not pending:
+        return 0
+
+    workers = min(conf.bronze_ingest_workers or os.cpu_count(), len(pending))
+    total_rows = 0
+    worker_peaks = {}  # Pico de RSS de cada proceso del pool
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_ingest_worker,
+                             initargs=(lakehouseConfig.conf.config_file, lakehouseConfig.query_tag.get())) as pool:
+        for path, rows, pid, peak_rss in pool.map(_ingest_log_file, pending):
+            total_rows += rows
+            worker_peaks[pid] = max(worker_peaks.get(pid, 0), peak_rss)
+            print(f"   ✓ {os.path.basename(path)}: {rows:,} registros")
+
+    metrics.record(rows_in=total_rows, rows_out=total_rows, child_rss_bytes=sum(worker_peaks.values()))
+    print(f"[logs_web] Ingestados {total_rows} registros de {len(pending)} ficheros en Bronze ({workers} procesos).")
+    return total_rows
+
+
+def _replace_dimension(ch_client, collection, table, key_column, arrow_table, rows, column_names):
+    """
+    Sustituye el contenido de una tabla de dimensión por la colección de Mongo.
+    Si la tabla ya tiene esa versión (misma huella de Mongo y mismas filas) no
+    se toca y devuelve False: recargarla no cambia nada y Silver no tiene que
+    revisar los días ya enriquecidos.
+    """
+    fingerprint = dimension_cache.snapshot_fingerprint(arrow_table)
+    source = f"mongo.{collection}"
+    loaded = catalog.consumed(ch_client, 'bronze', source).get('')
+    if fingerprint and loaded == fingerprint and ch_client.command(f"SELECT count() FROM {table}") == len(rows):
+        return False
+
+    # Es una foto completa de la colección: se carga en una tabla de staging y
+    # se intercambia con la actual (EXCHANGE es atómico), así que quien lea la
+    # dimensión (p.ej. Silver) ve la versión anterior o la nueva, nunca una
+    # tabla vacía o a medias. Si la carga falla, la tabla actual no se toca.
+    staging = f"{table}_staging"
+    _drop_dimension_staging(ch_client, staging)
+    ch_client.command(f"CREATE TABLE {cluster.ddl_name(staging)} AS {cluster.local_name(table)}")
+    cluster.create_distributed(ch_client, staging)
     try:
-        if os.path.exists(path_logs_csv):
-            print(f"   Leyendo CSV: {path_logs_csv}...")
-            # Leemos todo como string (dtype=str) para cumplir con la tabla Bronze definida
-            df_logs = pd.read_csv(path_logs_csv, dtype=str)
-            
-            # Reemplazar NaN por cadenas vacías para evitar errores en CH
-            df_logs = df_logs.fillna('')
-            
-            # Insertar en ClickHouse
-            ch_client.insert_df('bronze.logs_web', df_logs)
-            print(f"[logs_web] Ingestados {len(df_logs)} registros en Bronze.")
-        else:
-            print(f" No se encuentra el fichero CSV: {path_logs_csv}")
-    except Exception as e:
-        print(f" Error ingestando Logs: {e}")
+        cluster.insert_sharded(ch_client, staging, key_column, rows=rows, column_names=column_names)
+        ch_client.command(f"EXCHANGE TABLES {cluster.local_name(table)} AND {cluster.ddl_name(staging)}")
+    finally:
+        # Tras el intercambio, staging tiene la versión anterior
+        _drop_dimension_staging(ch_client, staging)
+    # La huella solo se registra con la nueva versión ya en su sitio
+    if fingerprint:
+        catalog.mark_consumed(ch_client, 'bronze', source, {'': fingerprint})
+    return True
+
 
+def _drop_dimension_staging(ch_client, staging):
+    if cluster.is_clustered():
+        ch_client.command(f"DROP TABLE IF EXISTS {staging}{cluster.on_cluster()} SYNC")
+    ch_client.command(f"DROP TABLE IF EXISTS {cluster.ddl_name(staging)} SYNC")
+
+
+@metrics.instrumented('bronze_users')
+def ingest_users(ch_client=None, mongo_db=None):
     # ---------------------------------------------------------
     # 2. INGESTA USERS (Mongo) -> ClickHouse (bronze.users)
     #  "users.json" -> Desde colección "users" de MongoDB.
     # ---------------------------------------------------------
+    ch_client = ch_client or lakehouseConfig.get_client()
+    mongo_client = None
+    if mongo_db is None:
+        mongo_client, mongo_db = mng.create_mongo_connection()
     try:
         # Recuperamos documentos de Mongo excluyendo el _id interno de mongo si no coincide,
         # pero el enunciado dice que el _id del json es la clave[cite: 86]. 
         # Mongo importa el campo "_id" del json como su id principal.
-        cursor_users = mongo_db.users.find({})
-        users_list = list(cursor_users)
+        # La colección solo se lee si ha cambiado; si no, sale de la copia local (dimension_cache.py)
+        users_table, from_cache = dimension_cache.load_dimension(mongo_db, 'users')
         
-        if users_list:
-            # Preparamos los datos para ClickHouse
-            # Convertimos todo a string para asegurar compatibilidad con Bronze
-            data_to_insert = []
-            for doc in users_list:
-                row = [
-                    str(doc.get('_id', '')),
-                    str(doc.get('username', '')),
-                    str(doc.get('email', '')),
-                    str(doc.get('role', '')),
-                    str(doc.get('country', '')),
-                    str(doc.get('created_at', '')),
-                    str(doc.get('is_premium', '')), # Convertimos bool a string 'True'/'False'
-                    str(doc.get('risk_score', ''))
-                ]
-                data_to_insert.append(row)
-            
-            column_names = ['_id', 'username', 'email', 'role', 'country', 'created_at', 'is_premium', 'risk_score']
-            
-            ch_client.insert('bronze.users', data_to_insert, column_names=column_names)
-            print(f" [users] Ingestados {len(data_to_insert)} usuarios desde Mongo.")
-        else:
+        if users_table.num_rows == 0:
             print("La colección 'users' en Mongo está vacía.")
-            
-    except Exception as e:
-        print(f" Error ingestando Users: {e}")
+            return 0
 
+        # Preparamos los datos para ClickHouse
+        # La caché ya lo guarda todo como string para asegurar compatibilidad con Bronze
+        # (p.ej. is_premium como 'True'/'False')
+        data_to_insert = dimension_cache.table_rows(users_table)
+        column_names = dimension_cache.DIMENSIONS['users']['columns']
+        
+        if not _replace_dimension(ch_client, 'users', 'bronze.users', '_id', users_table,
+                                  data_to_insert, column_names):
+            metrics.record(rows_in=users_table.num_rows)
+            print(" [users] bronze.users ya tiene esta versión de la colección; no se recarga.")
+            return 0
+        metrics.record(rows_in=users_table.num_rows, rows_out=len(data_to_insert))
+        origin = "la copia local (sin cambios en Mongo)" if from_cache else "Mongo"
+        print(f" [users] Ingestados {len(data_to_insert)} usuarios desde {origin}.")
+        return len(data_to_insert)
+    finally:
+        if mongo_client is not None:
+            mongo_client.close()
+
+
+@metrics.instrumented('bronze_ip_reputation')
+def ingest_ip_reputation(ch_client=None, mongo_db=None):
     # ---------------------------------------------------------
     # 3. INGESTA IP_REPUTATION (Mongo) -> ClickHouse (bronze.ip_reputation)
     # "ip_reputation.json" -> Desde colección "ip_reputation".
     # ---------------------------------------------------------
+    ch_client = ch_client or lakehouseConfig.get_client()
+    mongo_client = None
+    if mongo_db is None:
+        mongo_client, mongo_db = mng.create_mongo_connection()
     try:
-        cursor_ips = mongo_db.ip_reputation.find({})
-        ips_list = list(cursor_ips)
+        ips_table, from_cache = dimension_cache.load_dimension(mongo_db, 'ip_reputation')
         
-        if ips_list:
-            data_to_insert = []
-            for doc in ips_list:
-                row = [
-                    str(doc.get('ip', '')),
-                    str(doc.get('source', '')),
-                    str(doc.get('risk_level', '')),
-                    str(doc.get('threat_type', '')),
-                    str(doc.get('last_seen', ''))
-                ]
-                data_to_insert.append(row)
-
-            column_names = ['ip', 'source', 'risk_level', 'threat_type', 'last_seen']
-            
-            ch_client.insert('bronze.ip_reputation', data_to_insert, column_names=column_names)
-            print(f" [ip_reputation] Ingestadas {len(data_to_insert)} IPs desde Mongo.")
-        else:
+        if ips_table.num_rows == 0:
             print(" La colección 'ip_reputation' en Mongo está vacía.")
+            return 0
 
+        data_to_insert = dimension_cache.table_rows(ips_table)
+        column_names = dimension_cache.DIMENSIONS['ip_reputation']['columns']
+        
+        if not _replace_dimension(ch_client, 'ip_reputation', 'bronze.ip_reputation', 'ip', ips_table,
+                                  data_to_insert, column_names):
+            metrics.record(rows_in=ips_table.num_rows)
+            print(" [ip_reputation] bronze.ip_reputation ya tiene esta versión de la colección; no se recarga.")
+            return 0
+        metrics.record(rows_in=ips_table.num_rows, rows_out=len(data_to_insert))
+        origin = "la copia local (sin cambios en Mongo)" if from_cache else "Mongo"
+        print(f" [ip_reputation] Ingestadas {len(data_to_insert)} IPs desde {origin}.")
+        return len(data_to_insert)
+    finally:
+        if mongo_client is not None:
+            mongo_client.close()
+
+
+def ingest_bronze():
+    # Cada fuente abre su propio cliente ClickHouse dentro de su etapa de métricas
+    mongo_client, mongo_db = mng.create_mongo_connection()
+    
+    print("Iniciando ingesta a Capa BRONZE...")
+
+    try:
+        ingest_logs()
+    except Exception as e:
+        print(f" Error ingestando Logs: {e}")
+
+    try:
+        ingest_users(mongo_db=mongo_db)
+    except Exception as e:
+        print(f" Error ingestando Users: {e}")
+
+    try:
+        ingest_ip_reputation(mongo_db=mongo_db)
     except Exception as e:
         print(f" Error ingestando IP Reputation: {e}")
 
@@ -119,4 +318,3 @@ def ingest_bronze():
 
 #if __name__ == "__main__":
 #    ingest_bronze()
-
@@ -0,0 +1,259 @@
+"""
+CATÁLOGO DE ESTADÍSTICAS DEL LAKEHOUSE
+======================================
+
+Estadísticas por partición (día de event_ts) de bronze.logs_web y
+silver.enriched_events, en catalog.table_stats:
+
+- filas, min/max de event_ts
+- sketches de valores distintos de user_id e ip_address (uniqCombined)
+- nulos/vacíos por columna (null_rates() los da como proporción)
+
+Se mantienen solas: una vista materializada por tabla resume cada bloque
+insertado y la tabla (AggregatingMergeTree) va combinando los resúmenes,
+así que ingerir un fichero no obliga a recorrer la tabla. Los borrados
+(limpieza de cargas incompletas, retención, recarga de particiones) se
+reflejan con forget()/rebuild().
+
+Además catalog.consumed_partitions guarda, para cada consumidor (p.ej. el
+reverse ETL), la firma de cada partición de origen que ya ha procesado:
+changed_partitions() dice qué días hay que recalcular. Silver registra ahí
+los ficheros de Bronze que ha consumido (ver silver_layer.changed_files):
+las firmas por día de Bronze cambian con su TTL, que no debe recalcular nada.
+"""
+
+import hashlib
+import json
+from datetime import datetime
+import cluster
+
+# Tablas con estadísticas: expresión temporal (define la partición) y
+# columnas String cuyo valor vacío cuenta como nulo.
+CATALOG_TABLES = {
+    'bronze.logs_web': {
+        'time': "parseDateTimeBestEffortOrNull(event_ts)",
+        'columns': ['event_id', 'event_ts', 'user_id', 'ip_address', 'http_method', 'url_path',
+                    'status_code', 'bytes_sent', 'response_time_ms', 'user_agent', 'is_suspicious'],
+    },
+    'silver.enriched_events': {
+        'time': "event_ts",
+        'columns': ['event_id', 'user_id', 'ip_address', 'http_method', 'url_path', 'user_agent',
+                    'user_name', 'user_email', 'user_role', 'user_country',
+                    'ip_risk_level', 'ip_threat_type', 'ip_source'],
+    },
+}
+
+
+def setup_catalog(client):
+    client.command(f"CREATE DATABASE IF NOT EXISTS catalog{cluster.on_cluster()}")
+    client.command(f"""
+    CREATE TABLE IF NOT EXISTS {cluster.ddl_name('catalog.table_stats')} (
+        table_name String,
+        partition String,                                  -- Día (YYYY-MM-DD); '' si event_ts no es válido
+        rows SimpleAggregateFunction(sum, UInt64),
+        min_event_ts SimpleAggregateFunction(min, Nullable(DateTime)),
+        max_event_ts SimpleAggregateFunction(max, Nullable(DateTime)),
+        users_sketch AggregateFunction(uniqCombined, String),
+        ips_sketch AggregateFunction(uniqCombined, String),
+        null_counts SimpleAggregateFunction(sumMap, Map(String, UInt64)),
+        updated_at SimpleAggregateFunction(max, DateTime64(3))
+    ) ENGINE = AggregatingMergeTree()
+    ORDER BY (table_name, partition)
+    """)
+    cluster.create_distributed(client, 'catalog.table_stats')
+
+    # Particiones de origen ya procesadas por cada consumidor (solo en el nodo del pipeline)
+    client.command("""
+    CREATE TABLE IF NOT EXISTS catalog.consumed_partitions (
+        consumer String,
+        source String,
+        partition String,
+        signature String,
+        updated_at DateTime64(3)
+    ) ENGINE = ReplacingMergeTree(updated_at)
+    ORDER BY (consumer, source, partition)
+    """)
+
+
+def _partition_expr(table):
+    return f"ifNull(toString(toDate({CATALOG_TABLES[table]['time']})), '')"
+
+
+def _stats_select(table, source):
+    spec = CATALOG_TABLES[table]
+    null_counts = ', '.join(f"'{c}', countIf({c} = '')" for c in spec['columns'])
+    return f"""
+    SELECT
+        '{table}' AS table_name,
+        {_partition_expr(table)} AS partition,
+        count() AS rows,
+        min({spec['time']}) AS min_event_ts,
+        max({spec['time']}) AS max_event_ts,
+        uniqCombinedState(user_id) AS users_sketch,
+        uniqCombinedState(ip_address) AS ips_sketch,
+        map({null_counts}) AS null_counts,
+        now64(3) AS updated_at
+    FROM {source}
+    """
+
+
+def _view_name(table):
+    return f"catalog.stats_{table.replace('.', '_')}"
+
+
+def track(client, table):
+    """
+    Crea (si no existe) la vista que mantiene las estadísticas de `table`.
+    Si la tabla ya tenía datos, se calculan una vez recorriéndola.
+    """
+    view = _view_name(table)
+    existed = client.command(f"EXISTS TABLE {cluster.local_name(view)}")
+    ddl = f"""
+    CREATE MATERIALIZED VIEW IF NOT EXISTS {view}
+    TO catalog.table_stats
+    AS {_stats_select(table, table)}
+    GROUP BY partition
+    """
+    client.command(cluster.localize_view_ddl(ddl, view, sources=(table, 'catalog.table_stats')))
+    if not existed:
+        rebuild(client, table)
+
+
+def forget(client, table, partitions=None):
+    """
+    Borra las estadísticas de `table` (todas o solo esas particiones).
+    """
+    condition = "AND partition IN {partitions:Array(String)}" if partitions is not None else ""
+    client.command(f"""
+        ALTER TABLE {cluster.ddl_name('catalog.table_stats')}
+        DELETE WHERE table_name = {{table:String}} {condition}
+    """, parameters={'table': table, 'partitions': list(partitions or [])},
+        settings={'mutations_sync': 2 if cluster.is_clustered() else 1})
+
+
+def rebuild(client, table, partitions=None):
+    """
+    Recalcula las estadísticas de `table` recorriendo sus datos (todas o solo
+    esas particiones). Para después de borrados que no pasan por la vista.
+    """
+    forget(client, table, partitions)
+    where = f"WHERE {_partition_expr(table)} IN {{partitions:Array(String)}}" if partitions is not None else ""
+    client.command(f"""
+        INSERT INTO catalog.table_stats
+        {_stats_select(table, table)}
+        {where}
+        GROUP BY partition
+    """, parameters={'partitions': list(partitions or [])}, settings=cluster.insert_select_settings())
+
+
+# =========================================================================
+# LECTURA
+# =========================================================================
+
+def partition_stats(client, table):
+    """
+    {partición: {'rows', 'min_event_ts', 'max_event_ts', 'distinct_users', 'distinct_ips', 'null_counts'}}
+    """
+    result = client.query("""
+        SELECT
+            partition,
+            sum(rows),
+            min(min_event_ts),
+            max(max_event_ts),
+            uniqCombinedMerge(users_sketch),
+            uniqCombinedMerge(ips_sketch),
+            sumMap(null_counts)
+        FROM catalog.table_stats
+        WHERE table_name = {table:String}
+        GROUP BY partition
+        ORDER BY partition
+    """, parameters={'table': table})
+    keys = ['rows', 'min_event_ts', 'max_event_ts', 'distinct_users', 'distinct_ips', 'null_counts']
+    return {row[0]: dict(zip(keys, row[1:])) for row in result.result_rows}
+
+
+def table_summary(client, table, partitions=None):
+    """
+    Totales de la tabla (o de esas particiones): filas, rango de event_ts,
+    usuarios e IPs distintos (combinando los sketches) y tasa de nulos.
+    """
+    condition = "AND partition IN {partitions:Array(String)}" if partitions is not None else ""
+    result = client.query(f"""
+        SELECT
+            sum(rows),
+            min(min_event_ts),
+            max(max_event_ts),
+            uniqCombinedMerge(users_sketch),
+            uniqCombinedMerge(ips_sketch),
+            sumMap(null_counts)
+        FROM catalog.table_stats
+        WHERE table_name = {{table:String}} {condition}
+    """, parameters={'table': table, 'partitions': list(partitions or [])})
+    rows, min_ts, max_ts, users, ips, null_counts = result.result_rows[0]
+    return {
+        'rows': rows, 'min_event_ts': min_ts, 'max_event_ts': max_ts,
+        'distinct_users': users, 'distinct_ips': ips,
+        'null_rates': {column: count / rows for column, count in null_counts.items()} if rows else {},
+    }
+
+
+def table_rows(client, table):
+    return client.command("SELECT sum(rows) FROM catalog.table_stats WHERE table_name = {table:String}",
+                          parameters={'table': table}) or 0
+
+
+def _signature(stats):
+    return hashlib.md5(json.dumps(
+        [stats['rows'], stats['min_event_ts'], stats['max_event_ts'], stats['distinct_users'], stats['distinct_ips']],
+        default=str).encode()).hexdigest()
+
+
+def partition_signatures(client, table):
+    """
+    {partición: firma}. La firma cambia si cambian las filas de la partición
+    (número, rango temporal o usuarios/IPs distintos), no con los merges.
+    """
+    return {partition: _signature(stats) for partition, stats in partition_stats(client, table).items()}
+
+
+def fingerprint(client, table):
+    """
+    Huella de toda la tabla, para saber si una etapa que la lee tiene algo que hacer.
+    """
+    return hashlib.md5(json.dumps(sorted(partition_signatures(client, table).items())).encode()).hexdigest()
+
+
+# =========================================================================
+# PARTICIONES CONSUMIDAS
+# =========================================================================
+
+def consumed(client, consumer, source):
+    result = client.query("""
+        SELECT partition, signature
+        FROM catalog.consumed_partitions FINAL
+        WHERE consumer = {consumer:String} AND source = {source:String}
+    """, parameters={'consumer': consumer, 'source': source})
+    return dict(result.result_rows)
+
+
+def mark_consumed(client, consumer, source, signatures):
+    """
+    Registra las firmas {partición: firma} de `source` que `consumer` ya ha procesado.
+    """
+    if not signatures:
+        return
+    now = datetime.now()
+    client.insert('catalog.consumed_partitions',
+                  [[consumer, source, partition, signature, now] for partition, signature in signatures.items()],
+                  column_names=['consumer', 'source', 'partition', 'signature', 'updated_at'])
+
+
+def changed_partitions(client, consumer, source):
+    """
+    Particiones de `source` nuevas o modificadas desde que `consumer` las
+    procesó, con su firma actual. Las que ya no existen en origen (p.ej.
+    borradas por retención) no cuentan como cambios.
+    """
+    done = consumed(client, consumer, source)
+    return {partition: signature for partition, signature in partition_signatures(client, source).items()
+            if done.get(partition) != signature}
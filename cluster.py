@@ -0,0 +1,185 @@
+"""
+DESPLIEGUE EN CLUSTER (VARIOS SHARDS)
+=====================================
+
+Con config.cluster_name definido, cada tabla del lakehouse se crea como:
+
+- <tabla>_local: la tabla real (MergeTree...), en todos los nodos (ON CLUSTER).
+- <tabla>: tabla Distributed sobre las <tabla>_local, que es la que se
+  consulta (y en la que se inserta si no se enruta a mano).
+
+Claves de sharding:
+- bronze.logs_web y silver.enriched_events (y su staging): CRC32(user_id)
+- bronze.users (y su staging): CRC32(_id), así cada usuario está en el mismo shard que sus logs
+- bronze.ip_reputation (y su staging): CRC32(ip)
+- silver.user_agents: CRC32(user_agent)
+
+Bronze calcula el mismo CRC32 en Python (zlib.crc32) e inserta cada bloque
+directamente en el shard que le toca (config.cluster_shard_hosts), sin pasar
+por el nodo coordinador.
+
+Sin cluster_name todas las funciones devuelven los nombres y sentencias de
+un único nodo, así que el resto de módulos no distinguen entre ambos casos.
+"""
+
+import re
+import zlib
+import config as conf
+
+# Clave de sharding de cada tabla Distributed (None = solo lectura)
+SHARDING_KEYS = {
+    'bronze.logs_web': 'CRC32(user_id)',
+    'bronze.users': 'CRC32(_id)',
+    'bronze.users_staging': 'CRC32(_id)',
+    'bronze.ip_reputation': 'CRC32(ip)',
+    'bronze.ip_reputation_staging': 'CRC32(ip)',
+    'silver.enriched_events': 'CRC32(user_id)',
+    'silver.enriched_events_staging': 'CRC32(user_id)',
+    'silver.user_agents': 'CRC32(user_agent)',
+}
+
+
+def is_clustered():
+    return bool(conf.cluster_name)
+
+
+def on_cluster():
+    return f" ON CLUSTER {conf.cluster_name}" if is_clustered() else ""
+
+
+def local_name(table):
+    """
+    Tabla donde están físicamente los datos ('bronze.logs_web' -> 'bronze.logs_web_local').
+    """
+    return f"{table}_local" if is_clustered() else table
+
+
+def ddl_name(table):
+    """
+    Nombre para un CREATE/ALTER/TRUNCATE: tabla local en todos los nodos.
+    """
+    return f"{local_name(table)}{on_cluster()}"
+
+
+def system_table(name):
+    """
+    Tabla de sistema de todos los nodos (p.ej. system.parts de cada shard).
+    """
+    if is_clustered():
+        return f"clusterAllReplicas('{conf.cluster_name}', system.{name})"
+    return f"system.{name}"
+
+
+def all_shards(table):
+    """
+    Datos locales de `table` en todos los nodos, sin pasar por la Distributed
+    (p.ej. para agrupar por hostName()).
+    """
+    if is_clustered():
+        return f"clusterAllReplicas('{conf.cluster_name}', {local_name(table)})"
+    return table
+
+
+def distributed_ddl(table):
+    """
+    CREATE de la tabla Distributed `table` sobre <table>_local (None sin cluster).
+    """
+    if not is_clustered():
+        return None
+    database, name = table.split('.')
+    key = SHARDING_KEYS.get(table)
+    engine_args = f"'{conf.cluster_name}', '{database}', '{name}_local'" + (f", {key}" if key else "")
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table}{on_cluster()}
+        AS {table}_local
+        ENGINE = Distributed({engine_args})
+    """
+
+
+def create_distributed(client, table):
+    ddl = distributed_ddl(table)
+    if ddl:
+        client.command(ddl)
+
+
+def localize_view_ddl(ddl, view, sources=('silver.enriched_events',)):
+    """
+    Adapta un CREATE MATERIALIZED VIEW a cluster: la vista se crea como
+    <view>_local en cada nodo y lee de las tablas locales de sus fuentes.
+    """
+    if not is_clustered():
+        return ddl
+    ddl = re.sub(rf"\b{re.escape(view)}\b", ddl_name(view), ddl, count=1)
+    return localize(ddl, sources)
+
+
+def localize(sql, tables):
+    """
+    Cambia las referencias a esas tablas por sus tablas locales, para
+    ejecutar la sentencia en un shard concreto.
+    """
+    if not is_clustered():
+        return sql
+    for table in tables:
+        # Solo referencias a tablas, no literales ('bronze.logs_web' AS table_name)
+        sql = re.sub(rf"(?<!')\b{re.escape(table)}\b(?!')", local_name(table), sql)
+    return sql
+
+
+def insert_select_settings():
+    """
+    Settings para INSERT ... SELECT entre tablas Distributed: cada shard
+    inserta en su tabla local lo que lee de sus tablas locales, y las
+    tablas Distributed de un JOIN se leen completas en cada shard.
+    """
+    if not is_clustered():
+        return {}
+    return {'parallel_distributed_insert_select': 2, 'distributed_product_mode': 'allow'}
+
+
+# =========================================================================
+# ENRUTADO DE INSERCIONES
+# =========================================================================
+
+def shard_clients():
+    """
+    Un cliente por shard, en el orden de remote_servers.
+    """
+    import lakehouseConfig as lhc  # Import diferido: lakehouseConfig importa este módulo
+    return [lhc.get_client(host=shard['host'], port=shard['port']) for shard in conf.cluster_shard_hosts]
+
+
+def shard_of(key, n_shards):
+    """
+    Índice de shard de una clave: igual que Distributed con CRC32(key) y pesos 1.
+    """
+    return zlib.crc32(str(key).encode('utf-8')) % n_shards
+
+
+def insert_sharded(client, table, key_column, df=None, rows=None, column_names=None, clients=None):
+    """
+    Inserta un DataFrame (df) o una lista de filas (rows + column_names).
+
+    En cluster con config.cluster_shard_hosts, las filas se reparten por
+    CRC32(key_column) y cada parte va directamente a la tabla local de su
+    shard. Si no, se insertan en `table` (la Distributed reparte en servidor).
+    """
+    if not is_clustered() or not conf.cluster_shard_hosts:
+        if df is not None:
+            return client.insert_df(table, df)
+        return client.insert(table, rows, column_names=column_names)
+
+    clients = clients or shard_clients()
+    if df is not None:
+        shards = df[key_column].map(lambda key: shard_of(key, len(clients)))
+        for i, shard_df in df.groupby(shards):
+            clients[i].insert_df(local_name(table), shard_df)
+        return
+
+    key_index = column_names.index(key_column)
+    parts = [[] for _ in clients]
+    for row in rows:
+        parts[shard_of(row[key_index], len(clients))].append(row)
+    for shard_client, part in zip(clients, parts):
+        if part:
+            shard_client.insert(local_name(table), part, column_names=column_names)
@@ -21,3 +21,147 @@ config_file = r'C:\Users\pablo\Desktop\Master\GestionAlmacenamientoBigData\Pract
     "secure": true_or_false
 }
 '''
+
+#SLO CONFIG (gold_slo.py)
+#umbral de latencia (ms) a partir del cual una petición se considera "lenta"
+slo_latency_threshold_ms = 500
+#objetivo de peticiones buenas (rápidas y sin 5xx), p.ej. 0.99 = 99%
+slo_target = 0.99
+
+#RETENTION CONFIG (retention.py)
+#bronze: días que se conservan los datos raw (desde su fecha de carga)
+#silver: días tras los que los eventos se resumen por hora y se borra el detalle
+#gold: días que se conservan las vistas con granularidad horaria
+retention_policies = {
+    'bronze': {'ttl_days': 30},
+    'silver': {'downsample_after_days': 90, 'cold_after_days': 30},
+    'gold': {'hourly_ttl_days': 180},
+}
+#storage policy del servidor ClickHouse con un volumen "frío" (None = no se mueven particiones)
+storage_policy = None
+cold_volume = 'cold'
+
+#carpeta donde se escriben los informes (retención, métricas...)
+ruta_reports = 'reports'
+
+#EXPORT CONFIG (export_layer.py)
+#carpeta de salida de los ficheros Parquet y compresión por defecto
+ruta_exports = 'exports'
+export_compression = 'zstd'
+
+#SCHEDULER CONFIG (pipeline_scheduler.py)
+#tareas en paralelo, reintentos por tarea y espera base del backoff exponencial (s)
+scheduler_max_workers = 4
+scheduler_retries = 3
+scheduler_backoff_seconds = 2
+#añade la tarea 'retention' (retention.apply_retention) al final del pipeline
+scheduler_retention_enabled = False
+#fichero donde se guardan las huellas de entrada y el resultado de la última ejecución
+pipeline_state_file = '.pipeline_state.json'
+
+#METRICS CONFIG (metrics.py)
+#textfile para el collector de node_exporter (dentro de <ruta_reports>/metrics)
+metrics_prometheus_file = 'lakehouse.prom'
+#aviso si una etapa tarda más de este % respecto a la ejecución anterior (0.2 = +20%)
+metrics_regression_warning = 0.2
+
+#BENCHMARK CONFIG (benchmark.py)
+#config.json de un ClickHouse de benchmark distinto del principal (obligatorio: el benchmark borra
+#las bases de datos del lakehouse; con None el benchmark no se ejecuta)
+benchmark_config_file = None
+#base de datos Mongo de benchmark (se borra en cada ejecución)
+benchmark_db_name = "lakehouse_benchmark"
+#tamaños (número de eventos) y datos sintéticos generados para cada uno
+benchmark_sizes = [10_000, 100_000, 1_000_000]
+benchmark_data_dir = 'data_generated/benchmark'
+benchmark_seed = 42
+benchmark_query_repetitions = 5
+#baseline versionado (se sube al repositorio) y regresión máxima permitida (0.25 = +25%)
+benchmark_baseline_file = 'benchmarks/baseline.json'
+benchmark_regression_threshold = 0.25
+#diferencias de tiempo menores que esto (s) se consideran ruido
+benchmark_min_seconds = 0.05
+
+#PROFILING CONFIG (profiling.py)
+#activa el profiling de todas las consultas (también con la variable de entorno LAKEHOUSE_PROFILE=1)
+profiling_enabled = False
+#consultas más lentas que esto (ms) se capturan con su EXPLAIN
+profiling_slow_query_ms = 1000
+#memoria por consulta a partir de la cual se avisa en el informe (bytes)
+profiling_memory_warning_bytes = 2 * 1024 ** 3
+
+#BRONZE INGEST CONFIG (bronze_layer.py)
+#procesos para cargar ficheros de logs en paralelo (None = todos los núcleos)
+bronze_ingest_workers = None
+#filas por INSERT (bloques grandes = menos partes en ClickHouse)
+bronze_insert_batch_rows = 500_000
+
+#ASYNC CONFIG (async_api.py)
+#consultas/DDL simultáneos como máximo desde el event loop
+async_max_concurrency = 8
+#tiempo máximo por consulta en segundos (None = sin límite); al vencer se hace KILL QUERY
+async_query_timeout_seconds = None
+
+#CLUSTER CONFIG (cluster.py)
+#nombre del cluster en remote_servers para desplegar en varios shards (None = un único nodo)
+cluster_name = None
+#host/puerto HTTP de cada shard, en el orden de remote_servers. Bronze inserta
+#directamente en cada shard; vacío = las inserciones pasan por las tablas Distributed
+cluster_shard_hosts = []
+#cluster local de pruebas (local_cluster.py): carpeta de trabajo y puertos base
+local_cluster_dir = 'local_cluster'
+local_cluster_http_port = 18123
+local_cluster_tcp_port = 19000
+local_cluster_keeper_port = 19181
+
+#USER AGENT CONFIG (user_agents.py)
+#user-agents distintos que el parser mantiene en caché
+ua_cache_size = 100_000
+
+#GOLD COMPACTION CONFIG (gold_compaction.py)
+#franja horaria "tranquila" (hora inicio, hora fin) en la que se compacta; None = a cualquier hora
+compaction_quiet_hours = (1, 6)
+#consultas en curso a partir de las cuales el servidor no se considera tranquilo
+compaction_max_running_queries = 2
+#bytes (en disco) que se pueden reescribir como máximo en cada pasada
+compaction_io_budget_bytes = 2 * 1024 ** 3
+#proporción de filas sin combinar en una partición a partir de la cual se compacta
+compaction_unmerged_ratio = 0.05
+#aviso (y compactación aunque no sea franja tranquila) al llegar a esta fracción de parts_to_delay_insert
+compaction_parts_warning_ratio = 0.5
+#segundos entre pasadas con --watch
+compaction_check_interval_seconds = 600
+
+#APPROXIMATE QUERY CONFIG (approx_query.py)
+#fracción de usuarios con la que empieza la muestra adaptativa
+approx_initial_fraction = 0.01
+#submuestras para calcular los intervalos de confianza
+approx_replicates = 32
+#nivel de confianza de los intervalos
+approx_confidence = 0.95
+#error relativo objetivo por defecto (0.05 = ±5%)
+approx_relative_error = 0.05
+#tiempo máximo por defecto para ampliar la muestra (s)
+approx_max_seconds = 1.0
+
+#REVERSE ETL CONFIG (reverse_etl.py)
+#operaciones por bulk_write al sincronizar Gold con MongoDB
+reverse_etl_batch_size = 1000
+
+#DIMENSION CACHE CONFIG (dimension_cache.py)
+#copia local (Arrow IPC, leída con memory-map) de las colecciones users e ip_reputation
+dimension_cache_enabled = True
+dimension_cache_dir = '.dimension_cache'
+#huella de cada colección: 'stats' (UUID de la colección, nº de documentos y _id máximo: sin leer
+#documentos) o 'dbhash' (md5 exacto; lee toda la colección con bloqueo y no funciona a través de mongos)
+dimension_fingerprint_mode = 'stats'
+#campo (indexado) con la fecha de modificación de cada documento, para que 'stats' detecte ediciones (None = no)
+dimension_change_field = None
+
+#SILVER JOIN CONFIG (silver_layer.py)
+#memoria máxima (bytes) de la consulta INSERT ... SELECT de Silver (max_memory_usage)
+silver_join_memory_budget_bytes = 4 * 1024 ** 3
+#fracción del presupuesto para las tablas de los JOIN (el resto: lectura de Bronze, inserción y vistas Gold)
+silver_join_memory_fraction = 0.5
+#memoria de la tabla hash respecto a los bytes sin comprimir de la dimensión
+silver_join_hash_overhead = 2.0
@@ -0,0 +1,365 @@
+"""
+GENERADOR DE DATOS SINTÉTICOS A ESCALA
+======================================
+
+Genera logs_web, users.json e ip_reputation.json coherentes entre sí y con
+el tamaño que se quiera (de miles a miles de millones de eventos), para
+probar el pipeline a escala de producción.
+
+- Determinista: la misma semilla produce exactamente los mismos ficheros,
+  independientemente del número de procesos.
+- Los logs se generan por bloques (un fichero por bloque) en paralelo con un
+  pool de procesos; cada bloque usa su propia semilla derivada (seed, bloque),
+  así que la memoria por proceso no depende del total de filas.
+- Sesgos realistas:
+    * URLs, usuarios e IPs con distribución Zipf (pocos concentran casi todo).
+    * Tráfico diurno (pico a media tarde, valle de madrugada).
+    * Ráfagas de fuerza bruta (POST /login -> 401) y escaneos (404 sobre
+      rutas inexistentes) desde IPs de alto riesgo, marcadas como sospechosas.
+    * Tormentas de 5xx: ventanas de minutos con errores y latencias altas.
+- Formatos: csv, csv.gz o parquet.
+
+Uso:
+    python data_generator.py --rows 10000000 --users 200000 --ips 20000 --format csv.gz --out data_big
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import datetime, timedelta
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+
+LOG_COLUMNS = ['event_id', 'event_ts', 'user_id', 'ip_address', 'http_method', 'url_path',
+               'status_code', 'bytes_sent', 'response_time_ms', 'user_agent', 'is_suspicious']
+FORMATS = ['csv', 'csv.gz', 'parquet']
+
+COUNTRIES = ['ES', 'US', 'FR', 'DE', 'IT', 'GB', 'PT', 'MX', 'BR', 'AR', 'NL', 'IN']
+COUNTRY_WEIGHTS = [0.22, 0.18, 0.1, 0.1, 0.08, 0.08, 0.05, 0.05, 0.05, 0.03, 0.03, 0.03]
+ROLES = ['standard', 'analyst', 'admin']
+ROLE_WEIGHTS = [0.85, 0.12, 0.03]
+
+# Catálogo de endpoints: (método, ruta, latencia mediana ms, bytes medios)
+ENDPOINTS = [
+    ('GET', '/', 80, 15000), ('GET', '/products', 150, 40000), ('GET', '/cart', 120, 8000),
+    ('POST', '/cart', 180, 1200), ('GET', '/checkout', 250, 9000), ('POST', '/checkout', 450, 2000),
+    ('GET', '/login', 60, 5000), ('POST', '/login', 220, 1500), ('GET', '/logout', 40, 800),
+    ('GET', '/api/v1/orders', 200, 6000), ('POST', '/api/v1/orders', 350, 1800),
+    ('POST', '/api/v1/login', 200, 900), ('GET', '/api/v1/products', 130, 25000),
+    ('GET', '/search', 300, 20000), ('GET', '/account', 140, 7000), ('GET', '/admin', 260, 11000),
+]
+N_PRODUCT_PAGES = 5000
+SCAN_PATHS = ['/wp-admin', '/.env', '/phpmyadmin', '/.git/config', '/admin.php', '/backup.zip',
+              '/wp-login.php', '/server-status', '/config.json', '/api/v1/debug']
+
+BROWSER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36',
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36 Edg/124.0.0.0',
+    'Mozilla/5.0 (iPad; CPU OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1',
+    'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)',
+    'Mozilla/5.0 (compatible; bingbot/2.0; +http://www.bing.com/bingbot.htm)',
+]
+BROWSER_WEIGHTS = [0.34, 0.16, 0.06, 0.17, 0.14, 0.06, 0.03, 0.025, 0.015]
+ATTACK_AGENTS = ['curl/7.68.0', 'python-requests/2.31.0', 'Go-http-client/1.1', 'sqlmap/1.7.2#stable',
+                 'Mozilla/5.0 zgrab/0.x']
+
+# Tráfico relativo por hora del día (UTC)
+DIURNAL_WEIGHTS = np.array([2, 1.5, 1, 1, 1, 1.5, 3, 5, 7, 8, 8.5, 9, 9, 9, 9.5, 10, 10, 9.5,
+                            9, 8, 7, 6, 4.5, 3], dtype=float)
+
+
+def zipf_sampler(n, exponent=1.1):
+    """
+    CDF de una Zipf finita sobre n elementos (el índice 0 es el más popular).
+    """
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    cdf = np.cumsum(weights)
+    return cdf / cdf[-1]
+
+
+def sample_zipf(rng, cdf, size):
+    return np.minimum(np.searchsorted(cdf, rng.random(size)), len(cdf) - 1)
+
+
+def random_ips(rng, n):
+    """
+    n IPs públicas distintas.
+    """
+    ips = set()
+    while len(ips) < n:
+        octets = rng.integers([1, 0, 0, 1], [224, 256, 256, 255], size=(n - len(ips), 4))
+        for a, b, c, d in octets:
+            if a in (10, 127, 172, 192):
+                continue
+            ips.add(f"{a}.{b}.{c}.{d}")
+    return sorted(ips)
+
+
+# =========================================================================
+# DIMENSIONES (users.json / ip_reputation.json)
+# =========================================================================
+
+def generate_users(n_users, seed):
+    rng = np.random.default_rng([seed, 0, 1])
+    countries = rng.choice(COUNTRIES, size=n_users, p=COUNTRY_WEIGHTS)
+    roles = rng.choice(ROLES, size=n_users, p=ROLE_WEIGHTS)
+    premium = rng.random(n_users) < 0.2
+    risk = np.round(rng.beta(1.5, 8, size=n_users), 2)
+    created_days = rng.integers(0, 3 * 365, size=n_users)
+    base = datetime(2023, 1, 1)
+
+    users = []
+    for i in range(n_users):
+        username = f"user{i + 1:07d}"
+        created_at = base + timedelta(days=int(created_days[i]), seconds=int(rng.integers(0, 86400)))
+        users.append({
+            '_id': f"usr_{i + 1:07d}",
+            'username': username,
+            'email': f"{username}@example.com",
+            'role': str(roles[i]),
+            'country': str(countries[i]),
+            'created_at': created_at.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'is_premium': bool(premium[i]),
+            'risk_score': float(risk[i]),
+        })
+    return users
+
+
+def generate_ip_reputation(n_ips, seed):
+    """
+    Lista de IPs con reputación. Las primeras son las de mayor riesgo (las
+    que protagonizan los ataques); el resto son IPs conocidas benignas.
+    """
+    rng = np.random.default_rng([seed, 0, 2])
+    ips = random_ips(rng, n_ips)
+    rng.shuffle(ips)
+    n_risky = max(1, n_ips // 10)
+
+    entries = []
+    for i, ip in enumerate(ips):
+        if i < n_risky:
+            risk_level = str(rng.choice(['critical', 'high', 'medium'], p=[0.3, 0.45, 0.25]))
+            threat_type = str(rng.choice(['brute_force', 'credential_stuffing', 'scanner', 'suspicious_login']))
+            source = 'threat_intel'
+        else:
+            risk_level = 'low'
+            threat_type = str(rng.choice(['benign', 'internal_traffic'], p=[0.8, 0.2]))
+            source = str(rng.choice(['internal_allow_list', 'isp_feed']))
+        last_seen = datetime(2025, 1, 1) + timedelta(minutes=int(rng.integers(0, 365 * 24 * 60)))
+        entries.append({
+            '_id': f"ip_{i + 1:07d}",
+            'ip': ip,
+            'source': source,
+            'risk_level': risk_level,
+            'threat_type': threat_type,
+            'last_seen': last_seen.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        })
+    return entries
+
+
+# =========================================================================
+# LOGS (generación por bloques)
+# =========================================================================
+
+_worker = {}
+
+
+def _init_worker(params):
+    """
+    Prepara en cada proceso los catálogos comunes (una vez por proceso).
+    """
+    reputation = generate_ip_reputation(params['n_ips'], params['seed'])
+    risky = np.array([e['ip'] for e in reputation if e['risk_level'] != 'low'])
+    known_benign = [e['ip'] for e in reputation if e['risk_level'] == 'low']
+    # Las IPs de clientes normales: las benignas conocidas + IPs anónimas
+    anonymous = random_ips(np.random.default_rng([params['seed'], 0, 3]), params['n_ips'] * 5)
+    client_ips = np.array(known_benign + anonymous)
+    np.random.default_rng([params['seed'], 0, 4]).shuffle(client_ips)
+
+    paths = [p for _, p, _, _ in ENDPOINTS] + [f"/products/{i}" for i in range(1, N_PRODUCT_PAGES + 1)]
+    _worker.update({
+        'params': params,
+        'risky_ips': risky,
+        'client_ips': client_ips,
+        'client_ip_cdf': zipf_sampler(len(client_ips), 0.9),
+        'user_cdf': zipf_sampler(params['n_users'], 1.05),
+        'endpoint_cdf': zipf_sampler(len(ENDPOINTS) + N_PRODUCT_PAGES, 1.2),
+        'methods': np.array([m for m, _, _, _ in ENDPOINTS] + ['GET'] * N_PRODUCT_PAGES),
+        'paths': np.array(paths),
+        'median_latency': np.array([l for _, _, l, _ in ENDPOINTS] + [140] * N_PRODUCT_PAGES, dtype=float),
+        'mean_bytes': np.array([b for _, _, _, b in ENDPOINTS] + [30000] * N_PRODUCT_PAGES, dtype=float),
+        'hour_p': DIURNAL_WEIGHTS / DIURNAL_WEIGHTS.sum(),
+        'browser_p': np.array(BROWSER_WEIGHTS) / sum(BROWSER_WEIGHTS),
+    })
+
+
+def generate_log_chunk(chunk):
+    """
+    Genera el bloque `chunk` de logs como DataFrame de strings (formato Bronze).
+    """
+    w = _worker
+    params = w['params']
+    first_row = chunk * params['chunk_rows']
+    n = min(params['chunk_rows'], params['rows'] - first_row)
+    rng = np.random.default_rng([params['seed'], 1, chunk])
+    start = np.datetime64(params['start_date'], 's')
+
+    # --- Tráfico normal ---------------------------------------------------
+    day = rng.integers(0, params['days'], size=n)
+    hour = rng.choice(24, size=n, p=w['hour_p'])
+    second_of_hour = rng.integers(0, 3600, size=n)
+    offsets = day * 86400 + hour * 3600 + second_of_hour
+
+    endpoint = sample_zipf(rng, w['endpoint_cdf'], n)
+    methods = w['methods'][endpoint]
+    paths = w['paths'][endpoint]
+    latency = rng.lognormal(np.log(w['median_latency'][endpoint]), 0.6)
+    bytes_sent = rng.gamma(2.0, w['mean_bytes'][endpoint] / 2.0)
+
+    user_idx = sample_zipf(rng, w['user_cdf'], n)
+    user_ids = np.char.add('usr_', np.char.zfill((user_idx + 1).astype(str), 7)).astype(object)
+    user_ids[rng.random(n) < 0.1] = ''  # Visitantes anónimos
+    ips = w['client_ips'][sample_zipf(rng, w['client_ip_cdf'], n)].astype(object)
+    agents = np.array(BROWSER_AGENTS, dtype=object)[rng.choice(len(BROWSER_AGENTS), size=n, p=w['browser_p'])]
+
+    status = rng.choice([200, 302, 304, 401, 403, 404, 500, 502, 503], size=n,
+                        p=[0.88, 0.03, 0.03, 0.01, 0.005, 0.035, 0.005, 0.0025, 0.0025])
+    suspicious = np.zeros(n, dtype=np.int8)
+
+    # --- Ráfagas de ataque desde IPs de alto riesgo ------------------------
+    # Cada ráfaga ocupa un tramo contiguo de filas con la misma IP y una
+    # ventana de pocos minutos.
+    attack_rows = int(n * params['attack_fraction'])
+    position = rng.integers(0, max(1, n - attack_rows)) if attack_rows else 0
+    while attack_rows > 0:
+        size = int(min(attack_rows, rng.integers(50, 500)))
+        rows = slice(position, position + size)
+        burst_start = offsets[position]
+        offsets[rows] = burst_start + np.sort(rng.integers(0, 300, size=size))
+        ips[rows] = rng.choice(w['risky_ips'])
+        agents[rows] = rng.choice(ATTACK_AGENTS)
+        suspicious[rows] = 1
+        latency[rows] = rng.lognormal(np.log(120), 0.4, size=size)
+        if rng.random() < 0.6:
+            # Fuerza bruta / credential stuffing contra el login
+            methods[rows] = 'POST'
+            paths[rows] = rng.choice(['/login', '/api/v1/login'])
+            status[rows] = rng.choice([401, 403, 200], size=size, p=[0.9, 0.08, 0.02])
+            user_ids[rows] = np.char.add('usr_', np.char.zfill(
+                rng.integers(1, params['n_users'] + 1, size=size).astype(str), 7))
+            bytes_sent[rows] = rng.integers(300, 1500, size=size)
+        else:
+            # Escaneo de rutas inexistentes
+            methods[rows] = 'GET'
+            paths[rows] = rng.choice(SCAN_PATHS, size=size)
+            status[rows] = rng.choice([404, 403], size=size, p=[0.9, 0.1])
+            user_ids[rows] = ''
+            bytes_sent[rows] = rng.integers(100, 600, size=size)
+        attack_rows -= size
+        position = (position + size) % max(1, n - size)
+
+    # --- Tormentas de 5xx ---------------------------------------------------
+    for _ in range(rng.poisson(params['storms_per_chunk'])):
+        storm_start = rng.integers(0, params['days'] * 86400)
+        in_storm = (offsets >= storm_start) & (offsets < storm_start + rng.integers(300, 1800))
+        hit = in_storm & (rng.random(n) < 0.6)
+        status[hit] = rng.choice([500, 502, 503, 504], size=int(hit.sum()))
+        latency[hit] = latency[hit] * rng.uniform(3, 10)
+
+    # Algunos usuarios legítimos con actividad rara también se marcan
+    suspicious[(status == 401) & (rng.random(n) < 0.3)] = 1
+
+    timestamps = (start + offsets.astype('timedelta64[s]')).astype(str)
+    return pd.DataFrame({
+        'event_id': np.char.add('evt_', np.char.zfill(np.arange(first_row + 1, first_row + n + 1).astype(str), 12)),
+        'event_ts': np.char.add(timestamps, 'Z'),
+        'user_id': user_ids,
+        'ip_address': ips,
+        'http_method': methods,
+        'url_path': paths,
+        'status_code': status.astype(str),
+        'bytes_sent': np.maximum(bytes_sent, 0).astype(np.int64).astype(str),
+        'response_time_ms': np.maximum(latency, 1).astype(np.int64).astype(str),
+        'user_agent': agents,
+        'is_suspicious': suspicious.astype(str),
+    }, columns=LOG_COLUMNS)
+
+
+def _write_chunk(chunk):
+    params = _worker['params']
+    df = generate_log_chunk(chunk)
+    path = os.path.join(params['out_dir'], f"logs_web_{chunk:05d}.{params['format']}")
+    tmp_path = path + '.tmp'
+    if params['format'] == 'parquet':
+        df.to_parquet(tmp_path, index=False, compression='zstd')
+    else:
+        df.to_csv(tmp_path, index=False, compression='gzip' if params['format'] == 'csv.gz' else None)
+    os.replace(tmp_path, path)
+    return len(df)
+
+
+def generate_dataset(out_dir, rows, n_users=10000, n_ips=2000, days=30, start_date='2025-06-01',
+                     seed=42, file_format='csv', chunk_rows=1_000_000, workers=None,
+                     attack_fraction=0.02, storms_per_chunk=1.0):
+    """
+    Escribe users.json, ip_reputation.json y los logs (un fichero por bloque) en out_dir.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Formato no soportado: {file_format} ({', '.join(FORMATS)})")
+    os.makedirs(out_dir, exist_ok=True)
+    start_time = time.time()
+
+    print(f" Generando dimensiones: {n_users:,} usuarios, {n_ips:,} IPs con reputación...")
+    with open(os.path.join(out_dir, 'users.json'), 'w', encoding='utf-8') as f:
+        json.dump(generate_users(n_users, seed), f, indent=2)
+    with open(os.path.join(out_dir, 'ip_reputation.json'), 'w', encoding='utf-8') as f:
+        json.dump(generate_ip_reputation(n_ips, seed), f, indent=2)
+
+    params = {
+        'out_dir': out_dir, 'rows': rows, 'n_users': n_users, 'n_ips': n_ips, 'days': days,
+        'start_date': start_date, 'seed': seed, 'format': file_format, 'chunk_rows': chunk_rows,
+        'attack_fraction': attack_fraction, 'storms_per_chunk': storms_per_chunk,
+    }
+    n_chunks = (rows + chunk_rows - 1) // chunk_rows
+    workers = workers or os.cpu_count()
+    print(f" Generando {rows:,} eventos en {n_chunks} ficheros {file_format} con {workers} procesos...")
+
+    written = 0
+    with Pool(workers, initializer=_init_worker, initargs=(params,)) as pool:
+        for done, chunk_rows_written in enumerate(pool.imap_unordered(_write_chunk, range(n_chunks)), start=1):
+            written += chunk_rows_written
+            if done % max(1, n_chunks // 20) == 0 or done == n_chunks:
+                print(f"   {done}/{n_chunks} ficheros ({written:,} filas)")
+
+    duration = time.time() - start_time
+    print(f" Dataset generado en {out_dir}: {written:,} eventos en {duration:.1f}s "
+          f"({written / max(duration, 1e-9):,.0f} filas/s)")
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Genera logs_web, users.json e ip_reputation.json sintéticos.")
+    parser.add_argument('--out', default='data_generated', help="Carpeta de salida")
+    parser.add_argument('--rows', type=int, default=1_000_000, help="Número de eventos de log")
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--ips', type=int, default=2000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--start-date', default='2025-06-01')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', default='csv', choices=FORMATS)
+    parser.add_argument('--chunk-rows', type=int, default=1_000_000, help="Filas por fichero")
+    parser.add_argument('--workers', type=int, default=None, help="Procesos (por defecto, todos los núcleos)")
+    args = parser.parse_args(argv)
+
+    generate_dataset(args.out, args.rows, args.users, args.ips, args.days, args.start_date, args.seed,
+                     args.format, args.chunk_rows, args.workers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+CACHÉ LOCAL DE LAS DIMENSIONES DE MONGODB
+=========================================
+
+Guarda cada colección de dimensiones (users, ip_reputation) en un fichero
+Arrow IPC en config.dimension_cache_dir, junto con su huella:
+
+- La huella sale de metadatos e índices de la colección (UUID, número de
+  documentos, _id máximo y, opcionalmente, un campo de modificación), así
+  que comprobar si la copia sigue al día no lee documentos. Con
+  config.dimension_fingerprint_mode = 'dbhash' se usa el md5 exacto del
+  servidor, que sí los lee todos (ver collection_fingerprint).
+- Si la huella no ha cambiado, la dimensión se lee con memory-map: no hay
+  lectura de Mongo ni deserialización; las páginas se cargan al usarlas.
+- Si ha cambiado (o no hay copia), se lee la colección, se reescribe el
+  fichero de forma atómica y se sirve igualmente desde el mmap.
+
+Los valores se guardan como texto, igual que los inserta Bronze. Cada
+fichero se ordena por su clave, y reputation_lookup() la usa para buscar
+IPs por búsqueda binaria sobre el mmap, sin construir un diccionario.
+"""
+
+import hashlib
+import json
+import os
+import pyarrow as pa
+from pymongo.errors import OperationFailure
+import config as conf
+
+# Columnas (en orden de Bronze) y clave de cada dimensión
+DIMENSIONS = {
+    'users': {
+        'columns': ['_id', 'username', 'email', 'role', 'country', 'created_at', 'is_premium', 'risk_score'],
+        'key': '_id',
+    },
+    'ip_reputation': {
+        'columns': ['ip', 'source', 'risk_level', 'threat_type', 'last_seen'],
+        'key': 'ip',
+    },
+}
+
+
+def _stats_fingerprint(db, collection):
+    """
+    Huella barata a partir de metadatos e índices, sin leer documentos:
+    UUID de la colección (cambia al borrarla y recargarla, que es como la
+    carga mongo.py), número de documentos, _id máximo y, si se configura,
+    el máximo del campo de modificación (config.dimension_change_field).
+    """
+    info = next(db.list_collections(filter={'name': collection}), None)
+    if info is None:
+        return None
+    coll = db[collection]
+    values = [str(info.get('info', {}).get('uuid')), coll.estimated_document_count()]
+    for field in ('_id', conf.dimension_change_field):
+        if field:
+            last = coll.find_one({}, {field: 1}, sort=[(field, -1)])
+            values.append(str(last.get(field)) if last else None)
+    return hashlib.md5(json.dumps(values).encode()).hexdigest()
+
+
+def collection_fingerprint(db, collection):
+    """
+    Huella de la colección según config.dimension_fingerprint_mode:
+    - 'stats' (por defecto): ver _stats_fingerprint. No detecta ediciones
+      de documentos sin un campo de modificación.
+    - 'dbhash': md5 exacto del contenido (comando dbHash). El servidor lee
+      todos los documentos y bloquea la base de datos mientras tanto; no
+      está disponible a través de mongos (cluster sharded), y en ese caso
+      se usa 'stats'.
+    """
+    if conf.dimension_fingerprint_mode == 'dbhash':
+        try:
+            result = db.command('dbHash', collections=[collection])
+            return result['collections'].get(collection)
+        except OperationFailure as e:
+            print(f" dbHash no disponible para '{collection}' ({e}); se usa la huella por metadatos.")
+    return _stats_fingerprint(db, collection)
+
+
+def snapshot_path(collection, db_name=None):
+    # Una carpeta por base de datos Mongo (p.ej. la del benchmark no pisa la normal)
+    return os.path.join(conf.dimension_cache_dir, db_name or conf.db_name, f"{collection}.arrow")
+
+
+def open_snapshot(collection, db_name=None):
+    """
+    Tabla Arrow de la copia local (memory-map, sin copiar a memoria) o None.
+    """
+    path = snapshot_path(collection, db_name)
+    if not os.path.exists(path):
+        return None
+    return pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+
+
+def snapshot_fingerprint(table):
+    metadata = table.schema.metadata or {}
+    fingerprint = metadata.get(b'fingerprint')
+    return fingerprint.decode() if fingerprint else None
+
+
+def _to_table(collection, documents):
+    spec = DIMENSIONS[collection]
+    # Como en Bronze: todo a texto
+    schema = pa.schema([(column, pa.string()) for column in spec['columns']])
+    columns = {column: [str(doc.get(column, '')) for doc in documents] for column in spec['columns']}
+    return pa.table(columns, schema=schema).sort_by(spec['key'])
+
+
+def write_snapshot(collection, documents, fingerprint, db_name=None):
+    table = _to_table(collection, documents)
+    table = table.replace_schema_metadata({'fingerprint': fingerprint or ''})
+
+    path = snapshot_path(collection, db_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+
+def load_dimension(db, collection):
+    """
+    (tabla Arrow, servida_de_caché). Solo lee la colección de Mongo si ha
+    cambiado desde la última copia (o si la caché está desactivada).
+    """
+    if not conf.dimension_cache_enabled:
+        return _to_table(collection, list(db[collection].find({}))), False
+
+    fingerprint = collection_fingerprint(db, collection)
+    table = open_snapshot(collection, db.name)
+    if table is not None and fingerprint and snapshot_fingerprint(table) == fingerprint:
+        return table, True
+
+    del table  # Libera el mmap antes de reemplazar el fichero (en Windows no se puede si está abierto)
+    write_snapshot(collection, list(db[collection].find({})), fingerprint, db.name)
+    return open_snapshot(collection, db.name), False
+
+
+def table_rows(table):
+    """
+    Filas de la tabla como listas (para insertar en ClickHouse).
+    """
+    return [list(row) for row in zip(*(column.to_pylist() for column in table.columns))]
+
+
+# =========================================================================
+# CONSULTA DE REPUTACIÓN DE IPs
+# =========================================================================
+
+def _find(column, value):
+    # Búsqueda binaria sobre la columna ordenada
+    lo, hi = 0, len(column)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if column[mid].as_py() < value:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo if lo < len(column) and column[lo].as_py() == value else None
+
+
+def reputation_lookup(db=None):
+    """
+    Devuelve una función ip -> {'source', 'risk_level', 'threat_type', 'last_seen'}
+    (o None si la IP no está). Con `db` se comprueba antes que la copia siga
+    al día; sin él se usa la copia local tal cual, sin tocar Mongo.
+    """
+    if db is not None:
+        table, _ = load_dimension(db, 'ip_reputation')
+    else:
+        table = open_snapshot('ip_reputation')
+        if table is None:
+            raise FileNotFoundError(f"No hay copia local de ip_reputation en {snapshot_path('ip_reputation')}")
+    ips = table.column('ip')
+    columns = [c for c in DIMENSIONS['ip_reputation']['columns'] if c != 'ip']
+
+    def lookup(ip):
+        index = _find(ips, ip)
+        if index is None:
+            return None
+        return {column: table.column(column)[index].as_py() for column in columns}
+    return lookup
@@ -0,0 +1,268 @@
+"""
+EXPORTACIÓN A PARQUET PARTICIONADO
+==================================
+
+Exporta silver.enriched_events o cualquier vista Gold a ficheros Parquet
+particionados por día:
+
+    <ruta_exports>/<nombre>/event_date=YYYY-MM-DD/part-0.parquet
+
+- Selección de columnas y filtro (WHERE) que se ejecutan en ClickHouse, de
+  modo que solo viajan las columnas y filas necesarias.
+- Una sola consulta para todos los días a exportar, ordenada por día: los
+  datos llegan como record batches de Arrow (formato ArrowStream) y se
+  reparten en un fichero por día, batch a batch, así que la memoria no
+  depende del tamaño de la partición.
+- Modo incremental: solo se reexportan los días cuyo contenido ha cambiado
+  desde la última exportación (estado en _export_state.json). Las partes
+  activas descartan sin leer datos los días intactos; del resto se compara
+  un hash del contenido, así que los merges no provocan reexportaciones. Las carpetas
+  de días que ya no existen en el origen se borran.
+
+Uso:
+    python export_layer.py silver --columns event_ts,user_id,url_path --incremental
+    python export_layer.py endpoint_performance --where "http_method = 'GET'" --compression snappy
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import date
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import lakehouseConfig as lhc
+import gold_layer as gl
+import gold_compaction
+import config as conf
+
+COMPRESSIONS = ['zstd', 'snappy', 'gzip', 'lz4', 'none']
+PARTITION_PREFIX = 'event_date='
+# Columna auxiliar con el día de cada fila (se usa para repartir los batches y no se escribe)
+DAY_COLUMN = '_export_day'
+
+
+def resolve_source(name):
+    """
+    Devuelve (tabla, columna temporal) para 'silver' o el nombre de una vista Gold.
+    """
+    if name in ('silver', 'enriched_events', 'silver.enriched_events'):
+        return 'silver.enriched_events', 'event_ts'
+    view = name.split('.', 1)[1] if name.startswith('gold.') else name
+    if view not in gl.GOLD_TIME_COLUMNS:
+        raise ValueError(f"Origen desconocido: {name}. Usa 'silver' o una vista Gold: {', '.join(gl.GOLD_VIEWS)}")
+    return f"gold.{view}", gl.GOLD_TIME_COLUMNS[view][0]
+
+
+def _data_table(client, table):
+    """
+    (base de datos, tablas donde están las partes): la propia tabla o, para
+    una vista Gold, su tabla destino.
+    """
+    database, name = table.split('.')
+    if database == 'gold':
+        return database, list(gold_compaction.inner_tables(client, [name]))
+    return database, [name]
+
+
+def part_fingerprints(client, table, time_column, where=None):
+    """
+    Huella rápida por día, a partir de los nombres de las partes activas
+    (cualquier insert, merge o mutación los cambia). Solo sirve para
+    descartar los días que seguro no han cambiado (ver content_fingerprints):
+    - Tabla particionada por día (Silver) sin filtro: la huella de cada día
+      es la de su partición, sin leer datos.
+    - Si no (vistas Gold, particionadas por mes): se lee solo la columna
+      temporal (y la del filtro) para saber qué días hay en cada partición, y
+      cada día toma la huella de las particiones donde tiene filas.
+    """
+    database, tables = _data_table(client, table)
+    result = client.query("""
+        SELECT partition, arrayStringConcat(arraySort(groupArray(name)), ',')
+        FROM system.parts
+        WHERE active AND database = {db:String} AND table IN {tables:Array(String)}
+        GROUP BY partition
+    """, parameters={'db': database, 'tables': tables})
+    parts = {partition: hashlib.md5(names.encode()).hexdigest() for partition, names in result.result_rows}
+    if not parts:
+        return {}
+
+    partition_key = client.command(
+        "SELECT any(partition_key) FROM system.tables WHERE database = {db:String} AND name IN {tables:Array(String)}",
+        parameters={'db': database, 'tables': tables})
+    if partition_key == f"toDate({time_column})" and not where:
+        # 'tuple()': tabla antigua sin particionar
+        return {day: signature for day, signature in parts.items() if day != 'tuple()'}
+
+    partition_expr = f"toString({partition_key})" if partition_key else "'tuple()'"
+    where_sql = f"WHERE {where}" if where else ""
+    result = client.query(f"""
+        SELECT toString(toDate({time_column})) AS day, groupUniqArray({partition_expr})
+        FROM {table}
+        {where_sql}
+        GROUP BY day
+    """)
+    return {day: '-'.join(parts.get(p, '') for p in sorted(partitions))
+            for day, partitions in result.result_rows}
+
+
+def content_fingerprints(client, table, time_column, days, where=None):
+    """
+    Huella del contenido de los días indicados (filas y hash de sus valores):
+    no cambia con los merges ni con las mutaciones que no tocan los datos.
+    Solo se calcula para los días cuyas partes han cambiado.
+    """
+    if not days:
+        return {}
+    where_sql = f"AND ({where})" if where else ""
+    result = client.query(f"""
+        SELECT toString(toDate({time_column})) AS day, count(), sum(cityHash64(*))
+        FROM {table}
+        WHERE toDate({time_column}) IN {{days:Array(Date)}} {where_sql}
+        GROUP BY day
+    """, parameters={'days': [date.fromisoformat(d) for d in days]})
+    return {day: f"{rows}-{row_hash}" for day, rows, row_hash in result.result_rows}
+
+
+def partition_path(out_dir, day):
+    return os.path.join(out_dir, f"{PARTITION_PREFIX}{day}", 'part-0.parquet')
+
+
+def export_days(client, table, time_column, days, out_dir, columns=None, where=None, compression='zstd'):
+    """
+    Vuelca los días pedidos con una sola consulta ordenada por día y reparte
+    los batches en un Parquet por día, escribiendo batch a batch. Devuelve
+    {día: filas escritas} (los días sin filas tras el filtro no aparecen).
+    """
+    select = ', '.join(f"`{c}`" for c in columns) if columns else '*'
+    where_sql = f"AND ({where})" if where else ""
+    sql = f"""
+        SELECT toDate({time_column}) AS {DAY_COLUMN}, {select}
+        FROM {table}
+        WHERE toDate({time_column}) IN {{days:Array(Date)}} {where_sql}
+        ORDER BY {DAY_COLUMN}
+    """
+
+    written = {}
+    writer = path = None
+
+    def close_day():
+        # El fichero del día solo aparece completo
+        writer.close()
+        os.replace(path + '.tmp', path)
+
+    try:
+        with client.query_arrow_stream(sql, parameters={'days': [date.fromisoformat(d) for d in days]}) as stream:
+            for batch in stream:
+                day_column = batch.column(0)
+                data = pa.RecordBatch.from_arrays(batch.columns[1:], names=batch.schema.names[1:])
+                # Las filas llegan ordenadas: un batch tiene uno o pocos días
+                for day in pc.unique(day_column).to_pylist():
+                    rows = data.filter(pc.equal(day_column, day))
+                    day = day.isoformat()
+                    if day not in written:
+                        if writer is not None:
+                            close_day()
+                            writer = None
+                        path = partition_path(out_dir, day)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        writer = pq.ParquetWriter(path + '.tmp', rows.schema,
+                                                  compression=None if compression == 'none' else compression)
+                        written[day] = 0
+                    writer.write_batch(rows)
+                    written[day] += rows.num_rows
+        if writer is not None:
+            close_day()
+            writer = None
+    finally:
+        if writer is not None:
+            # Error a mitad de un día: no se deja el .tmp a medias
+            writer.close()
+            os.remove(path + '.tmp')
+            if not os.listdir(os.path.dirname(path)):
+                os.rmdir(os.path.dirname(path))
+    return written
+
+
+def remove_partition(out_dir, day):
+    shutil.rmtree(os.path.dirname(partition_path(out_dir, day)), ignore_errors=True)
+
+
+def export_table(source, out_dir=None, columns=None, where=None, compression=None, incremental=False):
+    client = lhc.get_client()
+    table, time_column = resolve_source(source)
+    out_dir = os.path.join(out_dir or conf.ruta_exports, table.split('.')[1])
+    compression = compression or conf.export_compression
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Compresión no soportada: {compression} ({', '.join(COMPRESSIONS)})")
+
+    print(f" Exportando {table} a {out_dir} (compresión {compression})...")
+    state_path = os.path.join(out_dir, '_export_state.json')
+    state = {}
+    if incremental and os.path.exists(state_path):
+        with open(state_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+    # Si cambian columnas o filtro, la exportación previa no sirve
+    options = {'columns': columns, 'where': where, 'compression': compression}
+    if state.get('options') != options:
+        state = {'options': options, 'partitions': {}}
+
+    # Dos niveles: las partes descartan sin leer datos los días intactos; de
+    # los demás se compara el contenido, así un merge no provoca reexportar
+    fingerprints = part_fingerprints(client, table, time_column, where)
+    previous = {day: entry for day, entry in state['partitions'].items() if isinstance(entry, dict)}
+    changed = [day for day in sorted(fingerprints)
+               if not incremental or previous.get(day, {}).get('parts') != fingerprints[day]]
+    contents = content_fingerprints(client, table, time_column, changed, where)
+    days = [day for day in changed
+            if not incremental or previous.get(day, {}).get('content') != contents.get(day)]
+    skipped = len(fingerprints) - len(days)
+    for day in changed:
+        state['partitions'][day] = {'parts': fingerprints[day], 'content': contents.get(day)}
+
+    written = export_days(client, table, time_column, days, out_dir, columns, where, compression) if days else {}
+    for day in days:
+        if day not in written:
+            # Día vacío tras el filtro: no dejamos ficheros antiguos
+            remove_partition(out_dir, day)
+        print(f"   ✓ {day}: {written.get(day, 0):,} filas")
+
+    # Días que ya no están en el origen (p.ej. borrados por retención)
+    existing = set(state['partitions'])
+    if os.path.isdir(out_dir):
+        existing |= {entry[len(PARTITION_PREFIX):] for entry in os.listdir(out_dir)
+                     if entry.startswith(PARTITION_PREFIX)}
+    removed = sorted(existing - set(fingerprints))
+    for day in removed:
+        remove_partition(out_dir, day)
+        state['partitions'].pop(day, None)
+
+    os.makedirs(out_dir, exist_ok=True)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+
+    total_rows = sum(written.values())
+    print(f" Exportación finalizada: {len(days)} particiones ({total_rows:,} filas), {skipped} sin cambios, "
+          f"{len(removed)} eliminadas.")
+    return len(days), skipped, total_rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta Silver o una vista Gold a Parquet particionado por día.")
+    parser.add_argument('source', help="'silver' o nombre de vista Gold (p.ej. endpoint_performance)")
+    parser.add_argument('--out', default=None, help="Carpeta de salida (por defecto config.ruta_exports)")
+    parser.add_argument('--columns', default=None, help="Columnas separadas por comas")
+    parser.add_argument('--where', default=None, help="Filtro SQL que se ejecuta en ClickHouse")
+    parser.add_argument('--compression', default=None, choices=COMPRESSIONS)
+    parser.add_argument('--incremental', action='store_true', help="Solo días cambiados desde la última exportación")
+    args = parser.parse_args(argv)
+
+    columns = [c.strip() for c in args.columns.split(',')] if args.columns else None
+    export_table(args.source, args.out, columns, args.where, args.compression, args.incremental)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+COMPACTACIÓN DE LAS VISTAS GOLD
+===============================
+
+Las vistas Gold usan SummingMergeTree, ReplacingMergeTree y
+AggregatingMergeTree: las filas con la misma clave solo se combinan cuando
+ClickHouse fusiona sus partes en segundo plano. Hasta entonces una consulta
+ve filas duplicadas, salvo que use FINAL (caro).
+
+Cada pasada de run_compaction():
+
+1. Lee de system.parts las partes activas de cada partición (mes) de cada
+   vista Gold y calcula la proporción de filas sin combinar de las que
+   tienen más de una parte.
+2. Avisa de las particiones que se acercan a parts_to_delay_insert /
+   parts_to_throw_insert ("Too many parts"); esas se compactan siempre.
+3. En la franja tranquila (config.compaction_quiet_hours y pocas consultas
+   en curso) lanza OPTIMIZE ... PARTITION ID ... FINAL sobre las particiones
+   con más filas sin combinar, sin pasar de config.compaction_io_budget_bytes.
+
+needs_final(view) dice si una vista tiene particiones sin compactar: si no,
+los dashboards pueden consultarla sin FINAL.
+
+Uso:
+    python gold_compaction.py              # una pasada
+    python gold_compaction.py --watch      # una pasada cada compaction_check_interval_seconds
+    python gold_compaction.py --status     # estado de cada vista, sin compactar
+"""
+
+import argparse
+import re
+import time
+from datetime import datetime
+import lakehouseConfig as lhc
+import gold_layer as gl
+import config as conf
+import cluster
+
+
+def inner_tables(client, views=None):
+    """
+    {tabla destino de la vista (nombre en system.parts): vista Gold}
+    """
+    views = views or gl.GOLD_VIEWS
+    result = client.query(f"""
+        SELECT DISTINCT name, toString(uuid)
+        FROM {cluster.system_table('tables')}
+        WHERE database = 'gold' AND engine = 'MaterializedView'
+    """)
+    inner = {}
+    for name, uuid in result.result_rows:
+        view = name[:-len('_local')] if cluster.is_clustered() and name.endswith('_local') else name
+        if view in views:
+            # Base de datos Atomic (.inner_id.<uuid>) u Ordinary (.inner.<vista>)
+            inner[f".inner_id.{uuid}"] = view
+            inner[f".inner.{name}"] = view
+    return inner
+
+
+def partition_health(client, views=None):
+    """
+    Una entrada por partición de cada vista Gold: partes activas (máximo
+    entre nodos), filas y bytes en disco (suma de todos los nodos).
+    """
+    inner = inner_tables(client, views)
+    if not inner:
+        return []
+    result = client.query(f"""
+        SELECT table, partition_id, any(partition), max(parts), sum(rows), sum(bytes)
+        FROM (
+            SELECT hostName() AS host, table, partition_id, any(partition) AS partition,
+                   count() AS parts, sum(rows) AS rows, sum(bytes_on_disk) AS bytes
+            FROM {cluster.system_table('parts')}
+            WHERE active AND database = 'gold' AND table IN {{tables:Array(String)}}
+            GROUP BY host, table, partition_id
+        )
+        GROUP BY table, partition_id
+        ORDER BY table, partition_id
+    """, parameters={'tables': list(inner)})
+    return [{'view': inner[table], 'partition_id': partition_id, 'partition': partition,
+             'parts': parts, 'rows': rows, 'bytes': bytes_on_disk}
+            for table, partition_id, partition, parts, rows, bytes_on_disk in result.result_rows]
+
+
+def _sorting_key(view):
+    return re.search(r"^ORDER BY (.+)$", gl.GOLD_VIEW_DDL[view], re.MULTILINE).group(1).strip()
+
+
+def unmerged_ratio(client, view, partition_id):
+    """
+    Proporción de filas de la partición que aún se combinarán en un merge
+    (1 - claves distintas / filas), contando cada nodo por separado.
+    """
+    time_column = gl.GOLD_TIME_COLUMNS[view][0]
+    # 'all': vista creada antes de particionar Gold por mes
+    condition = f"toYYYYMM({time_column}) = {int(partition_id)}" if partition_id != 'all' else "1"
+    rows, keys = client.query(f"""
+        SELECT sum(rows), sum(keys)
+        FROM (
+            SELECT hostName() AS host, count() AS rows, uniqExact(({_sorting_key(view)})) AS keys
+            FROM {cluster.all_shards(f'gold.{view}')}
+            WHERE {condition}
+            GROUP BY host
+        )
+    """).result_rows[0]
+    return 1 - keys / rows if rows else 0.0
+
+
+def parts_limits(client):
+    result = client.query("""
+        SELECT name, value
+        FROM system.merge_tree_settings
+        WHERE name IN ('parts_to_delay_insert', 'parts_to_throw_insert')
+    """)
+    return {name: int(value) for name, value in result.result_rows}
+
+
+def server_is_quiet(client, now=None):
+    """
+    (tranquilo, motivo): dentro de la franja horaria y con pocas consultas en curso.
+    """
+    now = now or datetime.now()
+    if conf.compaction_quiet_hours is not None:
+        start, end = conf.compaction_quiet_hours
+        in_window = start <= now.hour < end if start <= end else (now.hour >= start or now.hour < end)
+        if not in_window:
+            return False, f"fuera de la franja {start:02d}:00-{end:02d}:00"
+    # Descontamos esta misma consulta
+    running = client.command("SELECT count() - 1 FROM system.processes")
+    if running > conf.compaction_max_running_queries:
+        return False, f"{running} consultas en curso"
+    return True, "servidor tranquilo"
+
+
+def optimize_partition(client, view, partition_id):
+    # OPTIMIZE sobre una vista materializada se reenvía a su tabla destino
+    client.command(f"OPTIMIZE TABLE {cluster.ddl_name(f'gold.{view}')} PARTITION ID '{partition_id}' FINAL")
+
+
+def needs_final(client, view):
+    """
+    True si alguna partición de la vista tiene más de una parte (puede haber
+    filas sin combinar). Si es False, consultar sin FINAL da el mismo resultado.
+    """
+    return any(p['parts'] > 1 for p in partition_health(client, [view]))
+
+
+def run_compaction(force=False):
+    """
+    Una pasada de mantenimiento. Con force se compacta aunque el servidor no
+    esté tranquilo y aunque haya pocas filas sin combinar (respetando el
+    presupuesto de I/O). Devuelve un resumen de lo hecho.
+    """
+    with lhc.tagged_queries("lakehouse:gold_compaction"):
+        client = lhc.get_client()
+        health = partition_health(client)
+        limits = parts_limits(client)
+        warning_parts = max(2, int(limits.get('parts_to_delay_insert', 1000) * conf.compaction_parts_warning_ratio))
+
+        warnings = []
+        for p in health:
+            if p['parts'] >= warning_parts:
+                warnings.append(p)
+                print(f" ⚠️  gold.{p['view']} [{p['partition']}]: {p['parts']} partes activas "
+                      f"(parts_to_delay_insert={limits.get('parts_to_delay_insert')}, "
+                      f"parts_to_throw_insert={limits.get('parts_to_throw_insert')})")
+
+        quiet, reason = (True, "forzado") if force else server_is_quiet(client)
+        print(f" [compaction] {len(health)} particiones Gold; {reason}.")
+
+        candidates = []
+        for p in health:
+            urgent = p['parts'] >= warning_parts
+            if p['parts'] < 2 or not (quiet or urgent):
+                continue
+            p['unmerged_ratio'] = unmerged_ratio(client, p['view'], p['partition_id'])
+            if urgent or force or p['unmerged_ratio'] >= conf.compaction_unmerged_ratio:
+                candidates.append((urgent, p))
+
+        # Primero las que se acercan al límite de partes; después, las que más filas ahorran
+        candidates.sort(key=lambda c: (not c[0], -c[1]['unmerged_ratio'] * c[1]['rows']))
+        budget = conf.compaction_io_budget_bytes
+        optimized, skipped = [], []
+        for _, p in candidates:
+            if p['bytes'] > budget:
+                skipped.append(p)
+                continue
+            start = time.perf_counter()
+            optimize_partition(client, p['view'], p['partition_id'])
+            p['seconds'] = time.perf_counter() - start
+            budget -= p['bytes']
+            optimized.append(p)
+            print(f"   ✓ gold.{p['view']} [{p['partition']}]: {p['parts']} partes, "
+                  f"{p['unmerged_ratio']:.1%} filas sin combinar, {p['bytes'] / 1024 / 1024:.1f} MB "
+                  f"({p['seconds']:.2f} s)")
+        for p in skipped:
+            print(f"   · gold.{p['view']} [{p['partition']}]: fuera del presupuesto de I/O "
+                  f"({p['bytes'] / 1024 / 1024:.1f} MB), queda para la siguiente pasada")
+
+    return {
+        'quiet': quiet,
+        'reason': reason,
+        'warnings': warnings,
+        'optimized': optimized,
+        'skipped': skipped,
+        'bytes_rewritten': sum(p['bytes'] for p in optimized),
+    }
+
+
+def print_status():
+    client = lhc.get_client()
+    health = partition_health(client)
+    for view in gl.GOLD_VIEWS:
+        partitions = [p for p in health if p['view'] == view]
+        if not partitions:
+            continue
+        pending = [p for p in partitions if p['parts'] > 1]
+        state = f"{len(pending)} particiones sin compactar (usar FINAL)" if pending else "compactada (sin FINAL)"
+        print(f" gold.{view}: {len(partitions)} particiones, "
+              f"máx. {max(p['parts'] for p in partitions)} partes - {state}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compactación de las vistas Gold.")
+    parser.add_argument('--force', action='store_true', help="Compacta aunque no sea franja tranquila")
+    parser.add_argument('--watch', nargs='?', type=int, const=conf.compaction_check_interval_seconds,
+                        default=None, metavar='SEGUNDOS', help="Repite la pasada cada N segundos")
+    parser.add_argument('--status', action='store_true', help="Muestra el estado sin compactar")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        print_status()
+        return
+    while True:
+        run_compaction(force=args.force)
+        if args.watch is None:
+            break
+        time.sleep(args.watch)
+
+
+if __name__ == "__main__":
+    main()
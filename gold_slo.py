@@ -0,0 +1,148 @@
+"""
+CAPA GOLD - PERCENTILES, SLOs Y ERROR BUDGET
+============================================
+
+Consultas sobre gold.endpoint_latency_histogram. Como el histograma guarda
+conteos por bucket logarítmico fijo, se puede sumar entre horas y endpoints
+y calcular percentiles arbitrarios sobre cualquier rango de tiempo y grupo
+de endpoints sin volver a escanear Silver.
+
+Conceptos:
+- Petición "buena": latencia <= umbral del SLO y sin error 5xx.
+- SLO attainment: % de peticiones buenas en el rango.
+- Error budget: peticiones malas permitidas = (1 - objetivo) * total.
+- Burn: peticiones malas / error budget (1.0 = presupuesto consumido).
+"""
+
+import math
+from datetime import datetime, timedelta
+import lakehouseConfig as lhc
+import config as conf
+
+# Debe coincidir con la expresión de latency_bucket en gold_layer.py
+BUCKETS_PER_OCTAVE = 8
+
+
+def bucket_bounds(bucket):
+    """
+    Devuelve (límite inferior, límite superior) en ms de un bucket.
+    """
+    if bucket <= 0:
+        return 0.0, 1.0
+    return 2 ** ((bucket - 1) / BUCKETS_PER_OCTAVE), 2 ** (bucket / BUCKETS_PER_OCTAVE)
+
+
+def fetch_latency_histogram(client, start, end, endpoints=None):
+    """
+    Suma los buckets del histograma en [start, end) para los endpoints dados
+    (todos si endpoints es None). Devuelve una lista ordenada de
+    (bucket, peticiones, errores_5xx).
+    """
+    where_endpoints = ""
+    parameters = {'start': start, 'end': end}
+    if endpoints:
+        where_endpoints = "AND url_path IN {endpoints:Array(String)}"
+        parameters['endpoints'] = list(endpoints)
+
+    result = client.query(f"""
+        SELECT
+            latency_bucket,
+            sum(request_count) AS requests,
+            sum(server_errors) AS errors
+        FROM gold.endpoint_latency_histogram
+        WHERE performance_hour >= {{start:DateTime}}
+          AND performance_hour < {{end:DateTime}}
+          {where_endpoints}
+        GROUP BY latency_bucket
+        ORDER BY latency_bucket
+    """, parameters=parameters)
+    return [(int(b), int(r), int(e)) for b, r, e in result.result_rows]
+
+
+def percentile_from_histogram(histogram, q):
+    """
+    Estima el percentil q (0..1) interpolando en escala logarítmica dentro
+    del bucket que contiene el rango buscado. Devuelve None si no hay datos.
+    """
+    total = sum(requests for _, requests, _ in histogram)
+    if total == 0:
+        return None
+
+    target = q * total
+    cumulative = 0
+    for bucket, requests, _ in histogram:
+        if requests == 0:
+            continue
+        if cumulative + requests >= target:
+            low, high = bucket_bounds(bucket)
+            fraction = (target - cumulative) / requests
+            if low == 0:
+                return high * fraction
+            return low * (high / low) ** fraction
+        cumulative += requests
+    return bucket_bounds(histogram[-1][0])[1]
+
+
+def good_requests_from_histogram(histogram, threshold_ms):
+    """
+    Peticiones buenas (latencia <= threshold_ms y sin 5xx). El bucket que
+    contiene el umbral se reparte de forma proporcional en escala logarítmica.
+    """
+    good = 0.0
+    for bucket, requests, errors in histogram:
+        low, high = bucket_bounds(bucket)
+        if high <= threshold_ms:
+            fraction = 1.0
+        elif low >= threshold_ms:
+            fraction = 0.0
+        elif low == 0:
+            fraction = threshold_ms / high
+        else:
+            fraction = math.log(threshold_ms / low) / math.log(high / low)
+        good += (requests - errors) * fraction
+    return good
+
+
+def latency_percentiles(start, end, endpoints=None, percentiles=(0.5, 0.95, 0.99), client=None):
+    """
+    Percentiles de latencia (ms) para un rango y grupo de endpoints.
+    """
+    client = client or lhc.get_client()
+    histogram = fetch_latency_histogram(client, start, end, endpoints)
+    return {f"p{round(q * 100, 2):g}": percentile_from_histogram(histogram, q) for q in percentiles}
+
+
+def slo_report(start, end, endpoints=None, threshold_ms=None, target=None, client=None):
+    """
+    Calcula SLO attainment y consumo de error budget para el rango dado.
+    """
+    client = client or lhc.get_client()
+    threshold_ms = threshold_ms or conf.slo_latency_threshold_ms
+    target = target or conf.slo_target
+
+    histogram = fetch_latency_histogram(client, start, end, endpoints)
+    total = sum(requests for _, requests, _ in histogram)
+    if total == 0:
+        return {'total_requests': 0, 'attainment_pct': None, 'error_budget': 0,
+                'bad_requests': 0, 'budget_burn': None, 'slo_met': None}
+
+    good = good_requests_from_histogram(histogram, threshold_ms)
+    bad = total - good
+    error_budget = (1 - target) * total
+    return {
+        'total_requests': total,
+        'threshold_ms': threshold_ms,
+        'target_pct': target * 100,
+        'attainment_pct': good * 100.0 / total,
+        'bad_requests': round(bad),
+        'error_budget': error_budget,
+        'budget_burn': bad / error_budget if error_budget else None,
+        'slo_met': good / total >= target,
+    }
+
+
+if __name__ == "__main__":
+    end = datetime.now().replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    start = end - timedelta(days=7)
+    print(f" Latencias últimos 7 días: {latency_percentiles(start, end)}")
+    print(f" SLO últimos 7 días: {slo_report(start, end)}")
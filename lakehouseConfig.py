@@ -1,21 +1,55 @@
 import clickhouse_connect
+import contextvars
 import json
+from contextlib import contextmanager
 import config as conf
+import catalog
+import cluster
 
+# Etiqueta de la etapa en curso (la fija metrics.stage). Cada llamada de un
+# cliente de get_client() la envía como log_comment (se lee al hacer la
+# llamada, ver profiling.ProfiledClient), de modo que sus consultas se pueden
+# localizar en system.query_log aunque el cliente se creara antes.
+query_tag = contextvars.ContextVar('query_tag', default=None)
 
 
-def get_client():
+def get_connection_params(host=None, port=None):
     # Leer el fichero de configuracion con los datos de conexion
+    # (host/port permiten conectar con un shard concreto del cluster)
     with open(conf.config_file, 'r', encoding='utf-8') as file:
         config = json.load(file)
-    client = clickhouse_connect.get_client(
-    host= config["host"],
-    port = config["port"],
+    settings = {}
+    if query_tag.get():
+        settings['log_comment'] = query_tag.get()
+    return dict(
+    host= host or config["host"],
+    port = port or config["port"],
     username = config["username"],
     password = config["password"],
-    secure = config["secure"]
+    secure = config["secure"],
+    settings = settings
 )
-    return client
+
+
+def get_client(host=None, port=None):
+    client = clickhouse_connect.get_client(**get_connection_params(host, port))
+    # Etiqueta de cada llamada y profiling opcional (import diferido: profiling importa este módulo)
+    import profiling
+    return profiling.wrap(client)
+
+
+@contextmanager
+def tagged_queries(tag):
+    """
+    Etiqueta las consultas hechas dentro del bloque (p.ej. una consulta Gold)
+    para identificarlas en system.query_log y en el informe de profiling.
+    Vale también para clientes creados antes del bloque.
+    """
+    token = query_tag.set(tag)
+    try:
+        yield
+    finally:
+        query_tag.reset(token)
 
 def setup_lakehouse():
     client = get_client()
@@ -25,18 +59,20 @@ def setup_lakehouse():
     # ---------------------------------------------------------
     databases = ['bronze', 'silver', 'gold']
     for db in databases:
-        client.command(f"CREATE DATABASE IF NOT EXISTS {db}")
+        client.command(f"CREATE DATABASE IF NOT EXISTS {db}{cluster.on_cluster()}")
         print(f" Base de datos '{db}' lista.")
 
     # 2. CREAR TABLAS CAPA BRONZE (Estructura Raw)
     # ---------------------------------------------------------
     # Usamos motor MergeTree. En Bronze, usamos String/Nullable 
     # para asegurar que la ingesta no falle por formatos.
+    # En cluster cada tabla se crea como <tabla>_local en todos los nodos,
+    # más una tabla Distributed con el nombre original (ver cluster.py).
     
     # A. Tabla Logs Web (viene del CSV) 
     # Definimos columnas según anexo 
     client.command("""
-    CREATE TABLE IF NOT EXISTS bronze.logs_web (
+    CREATE TABLE IF NOT EXISTS {table} (
         event_id String,
         event_ts String,         -- Se convertirá a DateTime en Silver
         user_id String,
@@ -47,16 +83,36 @@ def setup_lakehouse():
         bytes_sent String,       
         response_time_ms String,
         user_agent String,
-        is_suspicious String
+        is_suspicious String,
+        _ingested_at DateTime DEFAULT now(),  -- Fecha de carga (la TTL de retención se aplica sobre ella)
+        _source_file String DEFAULT ''       -- Fichero de origen (permite limpiar cargas incompletas)
     ) ENGINE = MergeTree()
     ORDER BY tuple()             -- En Bronze a veces no hay orden claro, o usas event_id
-    """)
+    """.format(table=cluster.ddl_name('bronze.logs_web')))
+    client.command(f"ALTER TABLE {cluster.ddl_name('bronze.logs_web')} ADD COLUMN IF NOT EXISTS _source_file String DEFAULT ''")
+    cluster.create_distributed(client, 'bronze.logs_web')
     print("Tabla 'bronze.logs_web' creada.")
 
+    # Registro de ficheros de logs cargados, una fila por carga (se lee la última
+    # de cada ruta): un fichero nunca se carga dos veces; si cambia, sus filas se
+    # reemplazan. Solo en el nodo al que se conecta el pipeline, también en cluster.
+    client.command("""
+    CREATE TABLE IF NOT EXISTS bronze.ingested_files (
+        file_path String,
+        file_size UInt64,
+        file_mtime UInt64,              -- Fecha de modificación (epoch)
+        status LowCardinality(String),  -- 'started' | 'done'
+        rows UInt64,
+        updated_at DateTime64(3)
+    ) ENGINE = ReplacingMergeTree(updated_at)
+    ORDER BY file_path
+    """)
+    print("Tabla 'bronze.ingested_files' creada.")
+
     # B. Tabla Users (viene de Mongo -> users.json) [cite: 10]
     # Definimos columnas según anexo
     client.command("""
-    CREATE TABLE IF NOT EXISTS bronze.users (
+    CREATE TABLE IF NOT EXISTS {table} (
         _id String,
         username String,
         email String,
@@ -67,13 +123,14 @@ def setup_lakehouse():
         risk_score String
     ) ENGINE = MergeTree()
     ORDER BY _id
-    """)
+    """.format(table=cluster.ddl_name('bronze.users')))
+    cluster.create_distributed(client, 'bronze.users')
     print(" Tabla 'bronze.users' creada.")
 
     # C. Tabla IP Reputation (viene de Mongo -> ip_reputation.json) 
     # Definimos columnas según anexo 
     client.command("""
-    CREATE TABLE IF NOT EXISTS bronze.ip_reputation (
+    CREATE TABLE IF NOT EXISTS {table} (
         ip String,
         source String,
         risk_level String,
@@ -81,8 +138,14 @@ def setup_lakehouse():
         last_seen String
     ) ENGINE = MergeTree()
     ORDER BY ip
-    """)
+    """.format(table=cluster.ddl_name('bronze.ip_reputation')))
+    cluster.create_distributed(client, 'bronze.ip_reputation')
     print("Tabla 'bronze.ip_reputation' creada.")
+
+    # D. Catálogo de estadísticas (filas, rango temporal, distintos y nulos por día)
+    catalog.setup_catalog(client)
+    catalog.track(client, 'bronze.logs_web')
+    print("Catálogo de estadísticas 'catalog.table_stats' creado.")
     
     print("-" * 30)
     print("Estructura Lakehouse inicializada correctamente.")
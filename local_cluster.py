@@ -0,0 +1,193 @@
+"""
+CLUSTER LOCAL DE PRUEBAS
+========================
+
+Levanta N servidores ClickHouse en esta máquina (un proceso por shard,
+cada uno con sus puertos y su carpeta de datos) para probar el despliegue
+en cluster (cluster.py) sin más hardware. El primer nodo incluye
+ClickHouse Keeper, necesario para las sentencias ON CLUSTER.
+
+Por cada nodo escribe en config.local_cluster_dir:
+- node<i>/config.xml y node<i>/users.xml
+- config_node<i>.json (formato de config.json para conectar con ese nodo)
+
+Uso (requiere el binario `clickhouse` en el PATH o con --binary):
+    python local_cluster.py start --shards 3
+    python local_cluster.py stop
+
+Después, en config.py:
+    config_file = 'local_cluster/config_node1.json'
+    cluster_name = 'lakehouse_local'
+    cluster_shard_hosts = [...]   # lo imprime `start`
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import time
+import urllib.request
+import config as conf
+
+CLUSTER_NAME = 'lakehouse_local'
+HOST = '127.0.0.1'
+
+
+def node_ports(i):
+    # i empieza en 1
+    return {
+        'http': conf.local_cluster_http_port + i - 1,
+        'tcp': conf.local_cluster_tcp_port + i - 1,
+        'interserver': conf.local_cluster_tcp_port + 100 + i - 1,
+    }
+
+
+def _config_xml(i, shards, node_dir):
+    ports = node_ports(i)
+    remote_shards = ''.join(
+        f"<shard><replica><host>{HOST}</host><port>{node_ports(s)['tcp']}</port></replica></shard>"
+        for s in range(1, shards + 1))
+    keeper = ''
+    if i == 1:
+        keeper = f"""
+    <keeper_server>
+        <tcp_port>{conf.local_cluster_keeper_port}</tcp_port>
+        <server_id>1</server_id>
+        <log_storage_path>{node_dir}/coordination/log</log_storage_path>
+        <snapshot_storage_path>{node_dir}/coordination/snapshots</snapshot_storage_path>
+        <raft_configuration>
+            <server><id>1</id><hostname>{HOST}</hostname><port>{conf.local_cluster_keeper_port + 1}</port></server>
+        </raft_configuration>
+    </keeper_server>"""
+    return f"""<clickhouse>
+    <logger>
+        <level>warning</level>
+        <log>{node_dir}/log/server.log</log>
+        <errorlog>{node_dir}/log/error.log</errorlog>
+    </logger>
+    <listen_host>{HOST}</listen_host>
+    <http_port>{ports['http']}</http_port>
+    <tcp_port>{ports['tcp']}</tcp_port>
+    <interserver_http_port>{ports['interserver']}</interserver_http_port>
+    <interserver_http_host>{HOST}</interserver_http_host>
+    <path>{node_dir}/data/</path>
+    <tmp_path>{node_dir}/tmp/</tmp_path>
+    <user_files_path>{node_dir}/user_files/</user_files_path>
+    <users_config>users.xml</users_config>
+    <remote_servers>
+        <{CLUSTER_NAME}>{remote_shards}</{CLUSTER_NAME}>
+    </remote_servers>
+    <macros>
+        <shard>{i}</shard>
+        <replica>{HOST}-{i}</replica>
+    </macros>
+    <zookeeper>
+        <node><host>{HOST}</host><port>{conf.local_cluster_keeper_port}</port></node>
+    </zookeeper>
+    <distributed_ddl>
+        <path>/clickhouse/task_queue/ddl</path>
+    </distributed_ddl>{keeper}
+</clickhouse>
+"""
+
+
+USERS_XML = """<clickhouse>
+    <profiles><default/></profiles>
+    <quotas><default/></quotas>
+    <users>
+        <default>
+            <password></password>
+            <networks><ip>127.0.0.1</ip><ip>::1</ip></networks>
+            <profile>default</profile>
+            <quota>default</quota>
+            <access_management>1</access_management>
+        </default>
+    </users>
+</clickhouse>
+"""
+
+
+def _wait_ready(port, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://{HOST}:{port}/ping", timeout=1) as response:
+                if response.read().strip() == b'Ok.':
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def start(shards, binary='clickhouse', base_dir=None):
+    base_dir = os.path.abspath(base_dir or conf.local_cluster_dir)
+    pids = {}
+    for i in range(1, shards + 1):
+        node_dir = os.path.join(base_dir, f"node{i}")
+        os.makedirs(os.path.join(node_dir, 'log'), exist_ok=True)
+        with open(os.path.join(node_dir, 'config.xml'), 'w', encoding='utf-8') as f:
+            f.write(_config_xml(i, shards, node_dir))
+        with open(os.path.join(node_dir, 'users.xml'), 'w', encoding='utf-8') as f:
+            f.write(USERS_XML)
+        with open(os.path.join(base_dir, f"config_node{i}.json"), 'w', encoding='utf-8') as f:
+            json.dump({'host': HOST, 'port': node_ports(i)['http'], 'username': 'default',
+                       'password': '', 'secure': False}, f, indent=2)
+
+        with open(os.path.join(node_dir, 'log', 'stdout.log'), 'ab') as out:
+            process = subprocess.Popen([binary, 'server', f"--config-file={node_dir}/config.xml"],
+                                       cwd=node_dir, stdout=out, stderr=subprocess.STDOUT,
+                                       start_new_session=True)
+        pids[i] = process.pid
+        print(f" Nodo {i}: pid {process.pid}, HTTP {node_ports(i)['http']}, TCP {node_ports(i)['tcp']}")
+
+    with open(os.path.join(base_dir, 'pids.json'), 'w', encoding='utf-8') as f:
+        json.dump(pids, f)
+
+    for i in range(1, shards + 1):
+        if not _wait_ready(node_ports(i)['http']):
+            print(f" ✗ El nodo {i} no responde; revisa {base_dir}/node{i}/log/")
+            return False
+
+    hosts = [{'host': HOST, 'port': node_ports(i)['http']} for i in range(1, shards + 1)]
+    print(f"\n Cluster '{CLUSTER_NAME}' listo con {shards} shards. En config.py:")
+    print(f"    config_file = r'{os.path.join(base_dir, 'config_node1.json')}'")
+    print(f"    cluster_name = '{CLUSTER_NAME}'")
+    print(f"    cluster_shard_hosts = {hosts}")
+    return True
+
+
+def stop(base_dir=None):
+    base_dir = os.path.abspath(base_dir or conf.local_cluster_dir)
+    pids_path = os.path.join(base_dir, 'pids.json')
+    if not os.path.exists(pids_path):
+        print(" No hay cluster local en marcha.")
+        return
+    with open(pids_path, 'r', encoding='utf-8') as f:
+        pids = json.load(f)
+    for i, pid in pids.items():
+        try:
+            os.kill(pid, signal.SIGTERM)
+            print(f" Nodo {i} (pid {pid}) detenido.")
+        except ProcessLookupError:
+            pass
+    os.remove(pids_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Cluster ClickHouse local (varios procesos) para pruebas.")
+    parser.add_argument('action', choices=['start', 'stop'])
+    parser.add_argument('--shards', type=int, default=2)
+    parser.add_argument('--binary', default='clickhouse', help="Binario de ClickHouse")
+    parser.add_argument('--dir', default=None, help="Carpeta de trabajo (por defecto config.local_cluster_dir)")
+    args = parser.parse_args(argv)
+
+    if args.action == 'start':
+        start(args.shards, args.binary, args.dir)
+    else:
+        stop(args.dir)
+
+
+if __name__ == "__main__":
+    main()
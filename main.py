@@ -1,79 +1,164 @@
 # Imports
-from datetime import date
-import random
-from random import randint, choice
-import time
-import faker
-from datetime import datetime
-import os
-import clickhouse_connect
-import json
-import pandas as pd
+# Los módulos de cada capa se importan dentro de cada subcomando: así
+# `python main.py gold` o `python main.py query` no cargan pandas, pymongo
+# ni el resto de capas que no necesitan.
+import argparse
 import sys
 
-import mongo as mng
-import lakehouseConfig as lakehouseConfig
-import bronze_layer as bl
-import silver_layer as sl
-import gold_layer as gl
 
-def main():
+def main(resume=False, force=False):
+    import pipeline_scheduler as scheduler
+
     print("="*50)
     print("🚀 INICIANDO ORQUESTADOR DEL LAKEHOUSE")
     print("="*50)
 
     # ------------------------------------------------------
-    # PASO 1: Carga de Datos Operacionales (MongoDB)
-    # ------------------------------------------------------
-    print("\n[PASO 1/5] Cargando datos en MongoDB...")
-    try:
-        mng.load_data_to_mongo() # Llamamos a la función principal del script 1
-    except Exception as e:
-        print(f"Falló el Paso 1: {e}")
-        sys.exit(1) # Detenemos todo si falla la fuente
-     #------------------------------------------------------
-     #PASO 2: Inicialización de Estructura (ClickHouse DDL)
-     #------------------------------------------------------
-    print("\n [PASO 2/5] Creando estructura del Lakehouse...")
-    try:
-        lakehouseConfig.setup_lakehouse() # Llamamos a la función del script 2
-    except Exception as e:
-        print(f"Falló el Paso 2: {e}")
-        sys.exit(1)
-
-    # ------------------------------------------------------
-    # PASO 3: Ingesta Capa Bronze (Raw Data)
+    # El pipeline (Mongo -> DDL -> Bronze -> Silver -> Gold) se ejecuta como
+    # un grafo de tareas: las independientes (las 3 fuentes Bronze, las vistas
+    # Gold) van en paralelo, con reintentos y sin repetir tareas cuyas
+    # entradas no han cambiado. Ver pipeline_scheduler.py
     # ------------------------------------------------------
-    print("\n [PASO 3/5] Ingestando Capa BRONZE...")
-    try:
-        bl.ingest_bronze() # Llamamos a la función del script 3
-    except Exception as e:
-        print(f" Falló el Paso 3: {e}")
+    success = scheduler.run_pipeline(resume=resume, force=force)
+    if not success:
+        print("\n Falló el pipeline. Puedes retomarlo con: python main.py --resume")
         sys.exit(1)
 
-    # ------------------------------------------------------
-    # PASO 4: Procesamiento Capa Silver (Clean & Join)
-    # ------------------------------------------------------
-    print("\n [PASO 4/5] Procesando Capa SILVER...")
-    try:
-         sl.process_silver()
-    except Exception as e:
-         print(f"Falló el Paso 4: {e}")
-         sys.exit(1)
-
-    # ------------------------------------------------------
-    # PASO 5: Agregación Capa Gold 
-    # ------------------------------------------------------
-    print("\n [PASO 5/5] Ejecutando Capa GOLD...")
-    try:
-         gl.run_gold_layer()
-    except Exception as e:
-        print(f" Falló el Paso 5: {e}")
-        sys.exit(1)
-        
     print("\n" + "="*50)
-    print(f" EJECUCIÓN COMPLETADA CON ÉXITO")
+    print(" EJECUCIÓN COMPLETADA CON ÉXITO")
     print("="*50)
 
+
+# =========================================================================
+# SUBCOMANDOS (una sola capa)
+# =========================================================================
+
+def cmd_load_mongo(args):
+    import mongo as mng
+    mng.load_data_to_mongo()
+
+
+def cmd_setup(args):
+    import lakehouseConfig
+    lakehouseConfig.setup_lakehouse()
+
+
+def cmd_bronze(args):
+    import bronze_layer as bl
+    if args.logs:
+        bl.path_logs_csv = args.logs
+    sources = {
+        'logs': bl.ingest_logs,
+        'users': bl.ingest_users,
+        'ip_reputation': bl.ingest_ip_reputation,
+    }
+    unknown = set(args.sources) - set(sources)
+    if unknown:
+        sys.exit(f" Fuentes desconocidas: {', '.join(sorted(unknown))}. Disponibles: {', '.join(sources)}")
+    for source in args.sources or list(sources):
+        sources[source]()
+
+
+def cmd_silver(args):
+    import silver_layer as sl
+    sl.process_silver()
+
+
+def cmd_gold(args):
+    import gold_layer as gl
+    if not args.views:
+        gl.create_gold_views()
+        return
+    unknown = set(args.views) - set(gl.GOLD_VIEWS)
+    if unknown:
+        sys.exit(f" Vistas desconocidas: {', '.join(sorted(unknown))}. Disponibles: {', '.join(gl.GOLD_VIEWS)}")
+    for view in args.views:
+        gl.create_gold_view(view)
+        print(f"   ✓ gold.{view}: {gl.verify_gold_view(view):,} registros")
+
+
+def cmd_query(args):
+    import lakehouseConfig
+    if args.sql is None:
+        import gold_layer as gl
+        if args.example is None:
+            gl.query_gold_examples(fmt='rows')  # Sin pandas: se imprimen las filas
+            return
+        title, sql = gl.GOLD_EXAMPLE_QUERIES[args.example - 1]
+        print(f" {title}:")
+    else:
+        sql = args.sql
+
+    client = lakehouseConfig.get_client()
+    with lakehouseConfig.tagged_queries("lakehouse:cli_query"):
+        result = client.query(sql)
+    print(" | ".join(result.column_names))
+    for row in result.result_rows:
+        print(" | ".join(str(value) for value in row))
+    print(f"({len(result.result_rows)} filas)")
+
+
+def cmd_compact(args):
+    import gold_compaction
+    argv = ['--force'] if args.force else []
+    if args.status:
+        argv.append('--status')
+    gold_compaction.main(argv)
+
+
+def cmd_reverse_etl(args):
+    import reverse_etl
+    reverse_etl.sync_all(full=args.full)
+
+
+def cmd_retention(args):
+    import retention
+    retention.apply_retention()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Lakehouse: pipeline completo o una sola capa.")
+    # Sin subcomando se ejecuta el pipeline completo (compatibilidad con `python main.py --resume`)
+    parser.add_argument('--resume', action='store_true', help="Retoma la última ejecución fallida")
+    parser.add_argument('--force', action='store_true', help="Ejecuta todas las tareas aunque no hayan cambiado")
+    subparsers = parser.add_subparsers(dest='command')
+
+    subparsers.add_parser('load-mongo', help="Carga users/ip_reputation en MongoDB").set_defaults(func=cmd_load_mongo)
+    subparsers.add_parser('setup', help="Crea bases de datos y tablas Bronze").set_defaults(func=cmd_setup)
+
+    bronze = subparsers.add_parser('bronze', help="Ingesta a Bronze")
+    bronze.add_argument('sources', nargs='*', help="logs, users y/o ip_reputation (por defecto todas)")
+    bronze.add_argument('--logs', default=None, help="Fichero, carpeta o patrón glob de logs")
+    bronze.set_defaults(func=cmd_bronze)
+
+    subparsers.add_parser('silver', help="Recalcula silver.enriched_events").set_defaults(func=cmd_silver)
+
+    gold = subparsers.add_parser('gold', help="Crea las vistas Gold")
+    gold.add_argument('views', nargs='*', help="Vistas a crear (por defecto todas)")
+    gold.set_defaults(func=cmd_gold)
+
+    query = subparsers.add_parser('query', help="Consulta SQL o consultas Gold de ejemplo")
+    query.add_argument('sql', nargs='?', default=None, help="Consulta SQL (sin ella: ejemplos Gold)")
+    query.add_argument('--example', type=int, default=None, help="Solo el ejemplo Gold N (1-4)")
+    query.set_defaults(func=cmd_query)
+
+    compact = subparsers.add_parser('compact', help="Compacta las particiones Gold con filas sin combinar")
+    compact.add_argument('--force', action='store_true', help="Compacta aunque no sea franja tranquila")
+    compact.add_argument('--status', action='store_true', help="Muestra el estado sin compactar")
+    compact.set_defaults(func=cmd_compact)
+
+    reverse = subparsers.add_parser('reverse-etl', help="Sincroniza alertas y valor de usuarios Gold con MongoDB")
+    reverse.add_argument('--full', action='store_true', help="Revisa todos los días, no solo los modificados")
+    reverse.set_defaults(func=cmd_reverse_etl)
+
+    subparsers.add_parser('retention', help="Aplica las políticas de retención (config.retention_policies)"
+                          ).set_defaults(func=cmd_retention)
+    return parser
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = build_parser().parse_args()
+    if args.command is None:
+        main(resume=args.resume, force=args.force)
+    else:
+        args.func(args)
@@ -0,0 +1,266 @@
+"""
+MÉTRICAS DE RENDIMIENTO POR ETAPA
+=================================
+
+Cada etapa del pipeline (carga Mongo, fuentes Bronze, Silver, vistas Gold)
+se instrumenta con el decorador @instrumented o el context manager stage():
+
+- Tiempo de pared, filas de entrada/salida y filas/s.
+- Pico de memoria RSS del proceso Python mientras la etapa está activa,
+  más el de los procesos hijos que lanza (ver record).
+- Filas/bytes leídos y escritos y pico de memoria en ClickHouse, sacados de
+  system.query_log: los clientes creados dentro de una etapa envían su
+  nombre como log_comment (ver lakehouseConfig.get_client).
+
+write_run_report() vuelca la ejecución a un JSON (uno por ejecución, para
+comparar entre ejecuciones) y a un textfile de Prometheus.
+"""
+
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+import lakehouseConfig as lhc
+import config as conf
+
+_lock = threading.Lock()
+_run_id = uuid.uuid4().hex[:12]
+_run_started = datetime.now()
+_stages = []
+_active = []
+_sampler = None
+
+
+def process_peak_rss_bytes():
+    """
+    Pico de RSS de este proceso desde que arrancó (KB en Linux, bytes en macOS).
+    """
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _current_rss_bytes():
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # Sin /proc (macOS/Windows): pico del proceso
+        return process_peak_rss_bytes()
+
+
+def _sample_rss(interval=0.05):
+    while True:
+        rss = _current_rss_bytes()
+        with _lock:
+            for record in _active:
+                record['peak_rss_bytes'] = max(record['peak_rss_bytes'], rss)
+        time.sleep(interval)
+
+
+def _ensure_sampler():
+    global _sampler
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample_rss, name='rss-sampler', daemon=True)
+        _sampler.start()
+
+
+def reset_run():
+    """
+    Empieza una nueva ejecución (nuevo run_id, sin etapas registradas).
+    """
+    global _run_id, _run_started
+    with _lock:
+        _run_id = uuid.uuid4().hex[:12]
+        _run_started = datetime.now()
+        _stages.clear()
+
+
+def record(rows_in=0, rows_out=0, child_rss_bytes=0):
+    """
+    Suma filas de entrada/salida a la etapa activa en este hilo.
+    child_rss_bytes: pico de RSS de procesos hijos de la etapa (p.ej. el pool
+    de Bronze), que el muestreo de este proceso no ve; se suma a peak_rss_bytes.
+    """
+    tag = lhc.query_tag.get()
+    with _lock:
+        for stage_record in _active:
+            if stage_record['log_comment'] == tag:
+                stage_record['rows_in'] += rows_in
+                stage_record['rows_out'] += rows_out
+                stage_record['child_peak_rss_bytes'] += child_rss_bytes
+
+
+@contextmanager
+def stage(name):
+    _ensure_sampler()
+    stage_record = {
+        'stage': name,
+        'log_comment': f"lakehouse:{_run_id}:{name}",
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'status': 'ok',
+        'rows_in': 0,
+        'rows_out': 0,
+        'peak_rss_bytes': _current_rss_bytes(),
+        'child_peak_rss_bytes': 0,
+    }
+    token = lhc.query_tag.set(stage_record['log_comment'])
+    with _lock:
+        _active.append(stage_record)
+    start = time.perf_counter()
+    try:
+        yield stage_record
+    except Exception:
+        stage_record['status'] = 'failed'
+        raise
+    finally:
+        stage_record['duration_seconds'] = time.perf_counter() - start
+        stage_record['rows_per_second'] = (stage_record['rows_out'] / stage_record['duration_seconds']
+                                           if stage_record['duration_seconds'] else 0.0)
+        lhc.query_tag.reset(token)
+        with _lock:
+            _active.remove(stage_record)
+            # Cota superior: los procesos hijos pueden no coincidir en su pico
+            stage_record['peak_rss_bytes'] += stage_record['child_peak_rss_bytes']
+            _stages.append(stage_record)
+
+
+def instrumented(name):
+    """
+    Decorador: ejecuta la función dentro de stage(name).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _clickhouse_stats():
+    """
+    Estadísticas de system.query_log agrupadas por etapa (log_comment).
+    """
+    client = lhc.get_client()
+    try:
+        client.command("SYSTEM FLUSH LOGS")
+    except Exception:
+        pass  # Sin permisos: los logs se vuelcan solos cada pocos segundos
+    result = client.query("""
+        SELECT
+            splitByChar('#', log_comment)[1] AS stage_comment,  -- profiling.py añade '#<id>'
+            count() AS queries,
+            sum(read_rows), sum(read_bytes),
+            sum(written_rows), sum(written_bytes),
+            max(memory_usage)
+        FROM system.query_log
+        WHERE type = 'QueryFinish'
+          AND event_date >= toDate({since:DateTime})
+          AND startsWith(log_comment, {prefix:String})
+        GROUP BY stage_comment
+    """, parameters={'since': _run_started, 'prefix': f"lakehouse:{_run_id}:"})
+    return {row[0]: {
+        'ch_queries': int(row[1]),
+        'read_rows': int(row[2]), 'read_bytes': int(row[3]),
+        'written_rows': int(row[4]), 'written_bytes': int(row[5]),
+        'ch_peak_memory_bytes': int(row[6]),
+    } for row in result.result_rows}
+
+
+PROMETHEUS_METRICS = [
+    ('duration_seconds', "Tiempo de pared de la etapa"),
+    ('rows_in', "Filas de entrada"),
+    ('rows_out', "Filas de salida"),
+    ('rows_per_second', "Filas de salida por segundo"),
+    ('read_rows', "Filas leídas por ClickHouse"),
+    ('read_bytes', "Bytes leídos por ClickHouse"),
+    ('written_rows', "Filas escritas por ClickHouse"),
+    ('written_bytes', "Bytes escritos por ClickHouse"),
+    ('ch_peak_memory_bytes', "Pico de memoria de una consulta ClickHouse"),
+    ('peak_rss_bytes', "Pico de RSS del proceso Python (y sus procesos hijos)"),
+]
+
+
+def _prometheus_text(stages):
+    lines = []
+    for metric, help_text in PROMETHEUS_METRICS:
+        lines.append(f"# HELP lakehouse_stage_{metric} {help_text}")
+        lines.append(f"# TYPE lakehouse_stage_{metric} gauge")
+        for stage_record in stages:
+            if metric in stage_record:
+                lines.append(f'lakehouse_stage_{metric}{{stage="{stage_record["stage"]}"}} {stage_record[metric]}')
+    lines.append("# HELP lakehouse_run_timestamp_seconds Fin de la última ejecución")
+    lines.append("# TYPE lakehouse_run_timestamp_seconds gauge")
+    lines.append(f"lakehouse_run_timestamp_seconds {time.time():.0f}")
+    return '\n'.join(lines) + '\n'
+
+
+def _previous_report(metrics_dir):
+    reports = sorted(f for f in os.listdir(metrics_dir) if f.startswith('run_') and f.endswith('.json'))
+    if not reports:
+        return None
+    with open(os.path.join(metrics_dir, reports[-1]), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def collect_run():
+    """
+    Etapas registradas en la ejecución actual, completadas con las
+    estadísticas de ClickHouse.
+    """
+    with _lock:
+        stages = [dict(s) for s in _stages]
+    if not stages:
+        return []
+
+    try:
+        ch_stats = _clickhouse_stats()
+    except Exception as e:
+        print(f" No se pudieron leer métricas de system.query_log: {e}")
+        ch_stats = {}
+    for stage_record in stages:
+        stage_record.update(ch_stats.get(stage_record['log_comment'], {}))
+    return stages
+
+
+def write_run_report():
+    """
+    Escribe el informe JSON de la ejecución y el textfile de Prometheus.
+    Muestra las etapas que han empeorado respecto a la ejecución anterior.
+    """
+    stages = collect_run()
+    if not stages:
+        return None
+
+    metrics_dir = os.path.join(conf.ruta_reports, 'metrics')
+    os.makedirs(metrics_dir, exist_ok=True)
+    previous = _previous_report(metrics_dir)
+
+    report = {'run_id': _run_id, 'started_at': _run_started.isoformat(timespec='seconds'), 'stages': stages}
+    json_path = os.path.join(metrics_dir, f"run_{_run_started:%Y%m%d_%H%M%S}_{_run_id}.json")
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    # El textfile collector de node_exporter lee el fichero: escritura atómica
+    prom_path = os.path.join(metrics_dir, conf.metrics_prometheus_file)
+    with open(prom_path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(_prometheus_text(stages))
+    os.replace(prom_path + '.tmp', prom_path)
+
+    print(f"\n Métricas de la ejecución en {json_path}")
+    if previous:
+        before = {s['stage']: s for s in previous['stages']}
+        for stage_record in stages:
+            old = before.get(stage_record['stage'])
+            if old and old['duration_seconds'] > 0:
+                change = stage_record['duration_seconds'] / old['duration_seconds'] - 1
+                if change > conf.metrics_regression_warning:
+                    print(f"   ! {stage_record['stage']}: {old['duration_seconds']:.2f}s -> "
+                          f"{stage_record['duration_seconds']:.2f}s (+{change:.0%})")
+    return report
@@ -2,6 +2,7 @@ import json
 from pymongo import MongoClient
 import os
 import config as conf
+import metrics
 
 
 def create_mongo_connection():
@@ -14,7 +15,9 @@ def create_mongo_connection():
     print(f" Conexión establecida con la base de datos: {conf.db_name}")
     return client, db
 
+@metrics.instrumented('load_mongo')
 def load_data_to_mongo():
+    client = None
     try:
         # 1. Conexión a MongoDB
         client, db = create_mongo_connection()
@@ -31,6 +34,7 @@ def load_data_to_mongo():
             
             if isinstance(users_data, list) and len(users_data) > 0:
                 db.users.insert_many(users_data)
+                metrics.record(rows_in=len(users_data), rows_out=len(users_data))
                 print(f"Insertados {len(users_data)} documentos en colección 'users'.")
             else:
                 print("El fichero users.json está vacío o no es una lista.")
@@ -48,6 +52,7 @@ def load_data_to_mongo():
             
             if isinstance(ip_data, list) and len(ip_data) > 0:
                 db.ip_reputation.insert_many(ip_data)
+                metrics.record(rows_in=len(ip_data), rows_out=len(ip_data))
                 print(f" Insertados {len(ip_data)} documentos en colección 'ip_reputation'.")
             else:
                 print(" El fichero ip_reputation.json está vacío o no es una lista.")
@@ -56,8 +61,10 @@ def load_data_to_mongo():
 
     except Exception as e:
         print(f" Error durante la carga a Mongo: {e}")
+        raise  # El orquestador decide si reintentar
     finally:
-        client.close()
+        if client is not None:
+            client.close()
 
 #if __name__ == "__main__":
 #    load_data_to_mongo()
\ No newline at end of file
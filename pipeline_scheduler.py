@@ -0,0 +1,297 @@
+"""
+ORQUESTADOR DAG DEL LAKEHOUSE
+=============================
+
+Modela el pipeline como un grafo de tareas con dependencias explícitas:
+
+    load_mongo ──┬─> bronze_users ─────────┐
+                 └─> bronze_ip_reputation ─┤
+    setup ───────┬─> bronze_users          ├─> silver ──> gold_<vista> (x14)
+                 ├─> bronze_ip_reputation  │                    │
+                 └─> bronze_logs ──────────┘                    └─> reverse_etl
+
+- Las tareas independientes se ejecutan en paralelo (pool de hilos: el
+  trabajo pesado ocurre en ClickHouse/Mongo, no en Python).
+- Cada tarea se reintenta con backoff exponencial.
+- Cada tarea tiene una huella de sus entradas; si no ha cambiado desde la
+  última ejecución correcta (y ninguna dependencia se ha re-ejecutado), se salta.
+- Con resume=True se retoma una ejecución fallida: las tareas completadas en
+  ella no se repiten y se continúa desde la que falló.
+
+El estado se guarda en config.pipeline_state_file.
+"""
+
+import hashlib
+import inspect
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import date, datetime
+import config as conf
+import catalog
+import dimension_cache
+import mongo as mng
+import lakehouseConfig as lhc
+import bronze_layer as bl
+import silver_layer as sl
+import gold_layer as gl
+import reverse_etl
+import retention
+import metrics
+import profiling
+
+
+class Task:
+    """
+    Tarea del pipeline: función a ejecutar, dependencias y (opcional) una
+    función que calcula la huella de sus entradas.
+    """
+
+    def __init__(self, name, func, deps=(), fingerprint=None):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.fingerprint = fingerprint
+
+
+# =========================================================================
+# HUELLAS DE ENTRADA
+# =========================================================================
+
+def _hash(value):
+    return hashlib.md5(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _files_fingerprint(*paths):
+    return _hash([(p, os.path.getsize(p), os.path.getmtime(p)) if os.path.exists(p) else (p, None)
+                  for p in paths])
+
+
+def _mongo_collection_fingerprint(collection):
+    client, db = mng.create_mongo_connection()
+    try:
+        # Huella por metadatos de la colección (ver dimension_cache.collection_fingerprint)
+        return _hash([collection, dimension_cache.collection_fingerprint(db, collection)])
+    finally:
+        client.close()
+
+
+def _catalog_fingerprint(table, extra=None):
+    """
+    Huella de una tabla según el catálogo de estadísticas: a diferencia de
+    las partes, no cambia con los merges.
+    """
+    return _hash([catalog.fingerprint(lhc.get_client(), table), extra])
+
+
+def _setup_fingerprint():
+    """
+    Huella del esquema base: el código que lo crea, el cluster y las tablas
+    que existen en Bronze y en el catálogo (si alguien borra una, se vuelve a crear).
+    """
+    client = lhc.get_client()
+    result = client.query("""
+        SELECT database, name, engine FROM system.tables
+        WHERE database IN ('bronze', 'catalog')
+        ORDER BY database, name
+    """)
+    databases = client.query("""
+        SELECT name FROM system.databases WHERE name IN ('bronze', 'silver', 'gold', 'catalog') ORDER BY name
+    """)
+    code = [inspect.getsource(lhc.setup_lakehouse), inspect.getsource(catalog.setup_catalog),
+            catalog.CATALOG_TABLES]
+    return _hash([code, conf.cluster_name, result.result_rows, databases.result_rows])
+
+
+def _silver_inputs_fingerprint():
+    """
+    Huella de las entradas de Silver: el registro de ficheros cargados en
+    Bronze (la retención no lo cambia) y la versión de cada dimensión cargada.
+    """
+    client = lhc.get_client()
+    files = client.query("""
+        SELECT file_path, argMax((file_size, file_mtime, status, rows), updated_at)
+        FROM bronze.ingested_files
+        GROUP BY file_path
+        ORDER BY file_path
+    """)
+    dimensions = [catalog.consumed(client, 'bronze', f"mongo.{collection}").get('')
+                  for collection in ('users', 'ip_reputation')]
+    return _hash([files.result_rows, dimensions])
+
+
+def _gold_view_fingerprint(view):
+    client = lhc.get_client()
+    exists = client.command(f"EXISTS TABLE gold.{view}")
+    return _catalog_fingerprint('silver.enriched_events', extra=[gl.GOLD_VIEW_DDL[view], exists])
+
+
+# =========================================================================
+# DEFINICIÓN DEL PIPELINE
+# =========================================================================
+
+def build_pipeline():
+    """
+    Devuelve el grafo de tareas del lakehouse (nombre -> Task).
+    """
+    tasks = [
+        Task('load_mongo', mng.load_data_to_mongo,
+             fingerprint=lambda: _files_fingerprint(os.path.join(conf.ruta_data, 'users.json'),
+                                                    os.path.join(conf.ruta_data, 'ip_reputation.json'))),
+        Task('setup', lhc.setup_lakehouse, fingerprint=_setup_fingerprint),
+        Task('bronze_logs', bl.ingest_logs, deps=['setup'],
+             fingerprint=lambda: _files_fingerprint(*bl.list_log_files(bl.path_logs_csv))),
+        Task('bronze_users', bl.ingest_users, deps=['setup', 'load_mongo'],
+             fingerprint=lambda: _mongo_collection_fingerprint('users')),
+        Task('bronze_ip_reputation', bl.ingest_ip_reputation, deps=['setup', 'load_mongo'],
+             fingerprint=lambda: _mongo_collection_fingerprint('ip_reputation')),
+        Task('silver', sl.process_silver, deps=['bronze_logs', 'bronze_users', 'bronze_ip_reputation'],
+             fingerprint=_silver_inputs_fingerprint),
+    ]
+    for view in gl.GOLD_VIEWS:
+        tasks.append(Task(f'gold_{view}', lambda view=view: gl.create_gold_view(view), deps=['silver'],
+                          fingerprint=lambda view=view: _gold_view_fingerprint(view)))
+    # Alertas y valor por usuario de vuelta a MongoDB (solo los días que han cambiado)
+    tasks.append(Task('reverse_etl', reverse_etl.sync_all,
+                      deps=[f"gold_{target['view']}" for target in reverse_etl.REVERSE_ETL_TARGETS.values()],
+                      fingerprint=lambda: _catalog_fingerprint('silver.enriched_events', extra='reverse_etl')))
+    if conf.scheduler_retention_enabled:
+        # Retención al final: poda Silver y las vistas Gold horarias que leen las tareas anteriores.
+        # Las edades se cuentan en días, así que basta con aplicarla una vez al día
+        tasks.append(Task('retention', retention.apply_retention,
+                          deps=[f"gold_{view}" for view in gl.GOLD_VIEWS] + ['reverse_etl'],
+                          fingerprint=lambda: _hash([date.today(), conf.retention_policies])))
+    return {task.name: task for task in tasks}
+
+
+# =========================================================================
+# EJECUCIÓN
+# =========================================================================
+
+def load_state():
+    if os.path.exists(conf.pipeline_state_file):
+        with open(conf.pipeline_state_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'tasks': {}, 'last_run': None}
+
+
+def save_state(state):
+    tmp_path = conf.pipeline_state_file + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, conf.pipeline_state_file)
+
+
+def _safe_fingerprint(task):
+    if task.fingerprint is None:
+        return None
+    try:
+        return task.fingerprint()
+    except Exception as e:
+        # Sin huella la tarea simplemente se ejecuta
+        print(f"   [{task.name}] No se pudo calcular la huella: {e}")
+        return None
+
+
+def _execute(task, previous_fingerprint, deps_executed, force, retries, backoff):
+    """
+    Ejecuta una tarea (o la salta). Devuelve (estado, huella, segundos).
+    """
+    start = time.time()
+    fingerprint = _safe_fingerprint(task)
+    if (not force and not deps_executed and fingerprint is not None
+            and fingerprint == previous_fingerprint):
+        return 'skipped', fingerprint, 0.0
+
+    for attempt in range(retries + 1):
+        try:
+            task.func()
+            # La huella se recalcula tras ejecutar (p.ej. la vista ya existe)
+            return 'ok', _safe_fingerprint(task), time.time() - start
+        except Exception as e:
+            if attempt == retries:
+                print(f" ✗ [{task.name}] Falló tras {retries + 1} intentos: {e}")
+                return 'failed', None, time.time() - start
+            wait_seconds = backoff * 2 ** attempt
+            print(f" ! [{task.name}] Error ({e}). Reintento {attempt + 1}/{retries} en {wait_seconds:.0f}s...")
+            time.sleep(wait_seconds)
+
+
+def run_pipeline(tasks=None, max_workers=None, resume=False, force=False):
+    """
+    Ejecuta el grafo de tareas. Devuelve True si todas terminaron bien.
+    """
+    tasks = tasks or build_pipeline()
+    max_workers = max_workers or conf.scheduler_max_workers
+    state = load_state()
+    metrics.reset_run()
+
+    # Tareas ya completadas en la ejecución fallida que se retoma
+    resumed = set()
+    last_run = state.get('last_run')
+    if resume and last_run and last_run.get('status') == 'failed':
+        resumed = set(last_run.get('completed', []))
+        print(f" Retomando ejecución fallida: {len(resumed)} tareas ya completadas.")
+
+    status = {}
+    durations = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while len(status) < len(tasks):
+            progress = False
+            for name, task in tasks.items():
+                if name in status or name in running.values():
+                    continue
+                if any(status.get(dep) in ('failed', 'blocked') for dep in task.deps):
+                    status[name] = 'blocked'
+                    progress = True
+                elif all(status.get(dep) in ('ok', 'skipped') for dep in task.deps):
+                    if name in resumed:
+                        status[name] = 'skipped'
+                        progress = True
+                        continue
+                    deps_executed = any(status[dep] == 'ok' for dep in task.deps)
+                    previous = state['tasks'].get(name, {}).get('fingerprint')
+                    future = pool.submit(_execute, task, previous, deps_executed, force,
+                                         conf.scheduler_retries, conf.scheduler_backoff_seconds)
+                    running[future] = name
+                    progress = True
+
+            if not running:
+                if progress:
+                    continue
+                raise ValueError("El grafo de tareas tiene dependencias cíclicas o inexistentes.")
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                status[name], fingerprint, durations[name] = future.result()
+                if status[name] == 'ok':
+                    state['tasks'][name] = {'fingerprint': fingerprint,
+                                            'finished_at': datetime.now().isoformat(timespec='seconds')}
+                elif status[name] == 'failed':
+                    state['tasks'].pop(name, None)
+
+    success = all(s in ('ok', 'skipped') for s in status.values())
+    state['last_run'] = {
+        'status': 'ok' if success else 'failed',
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'completed': sorted(n for n, s in status.items() if s in ('ok', 'skipped')),
+        'failed': sorted(n for n, s in status.items() if s == 'failed'),
+        'blocked': sorted(n for n, s in status.items() if s == 'blocked'),
+    }
+    save_state(state)
+
+    print("\n" + "-" * 50)
+    print(" RESUMEN DE TAREAS")
+    for name in tasks:
+        seconds = f"{durations[name]:.1f}s" if name in durations and status[name] != 'skipped' else ""
+        print(f"   {status[name]:<8} {name} {seconds}")
+    metrics.write_run_report()
+    profiling.write_slow_query_report()
+    return success
+
+
+if __name__ == "__main__":
+    run_pipeline()
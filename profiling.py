@@ -0,0 +1,287 @@
+"""
+PROFILING DE CONSULTAS CLICKHOUSE
+=================================
+
+Envuelve el cliente devuelto por lakehouseConfig.get_client() (y el de
+async_api.get_async_client()), así que cubre todas las llamadas del pipeline
+y de las consultas Gold:
+
+- Cada llamada se etiqueta al hacerla con la etapa/vista en curso
+  (lakehouseConfig.query_tag): log_comment = '<etiqueta>'. Así funciona
+  también con clientes creados antes de lakehouseConfig.tagged_queries().
+- Con el profiling activo (config.profiling_enabled o LAKEHOUSE_PROFILE=1)
+  el log_comment lleva además un id propio ('<etiqueta>#<id>') y:
+  - Si tarda más de config.profiling_slow_query_ms, se guardan su
+    EXPLAIN indexes = 1 y EXPLAIN PIPELINE (de la parte SELECT de la sentencia).
+  - Al escribir el informe se cruzan con system.query_log: filas/bytes leídos,
+    memoria, marcas (granules) seleccionadas y escrituras a disco por spill.
+
+El informe (Markdown) se escribe en <ruta_reports>/slow_queries_<fecha>.md al
+terminar el proceso o con write_slow_query_report().
+"""
+
+import atexit
+import os
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+import lakehouseConfig as lhc
+import config as conf
+
+# Métodos del cliente cuyo primer argumento es una consulta SQL
+QUERY_METHODS = {'command', 'query', 'raw_query', 'query_df', 'query_np', 'query_arrow',
+                 'query_arrow_stream', 'query_df_stream', 'query_np_stream', 'query_rows_stream'}
+# Métodos de inserción (primer argumento: tabla)
+INSERT_METHODS = {'insert', 'insert_df', 'insert_arrow'}
+
+_lock = threading.Lock()
+_slow_queries = []
+_started = datetime.now()
+_report_registered = False
+
+
+def is_enabled():
+    return bool(conf.profiling_enabled) or os.environ.get('LAKEHOUSE_PROFILE') == '1'
+
+
+def explainable_select(sql):
+    """
+    Parte SELECT de una sentencia (SELECT, INSERT ... SELECT, CREATE ... AS SELECT),
+    o None si no hay nada que explicar.
+    """
+    statement = sql.strip()
+    if re.match(r'^(SELECT|WITH)\b', statement, re.IGNORECASE):
+        return statement
+    if re.match(r'^(INSERT|CREATE)\b', statement, re.IGNORECASE):
+        match = re.search(r'\bSELECT\b', statement, re.IGNORECASE)
+        if match:
+            return statement[match.start():]
+    return None
+
+
+class ProfiledClient:
+    """
+    Envoltorio de un cliente clickhouse_connect. Cada llamada se etiqueta en
+    el momento de hacerla con la etapa/consulta en curso (lakehouseConfig.query_tag),
+    aunque el cliente se haya creado antes o fuera de ella; con el profiling
+    activo además se mide y, si es lenta, se captura su EXPLAIN.
+    El resto de atributos se delegan en el cliente original.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._profiling = is_enabled()
+        if self._profiling:
+            _register_report()
+
+    def __getattr__(self, name):
+        attribute = getattr(self._client, name)
+        if name in QUERY_METHODS or name in INSERT_METHODS:
+            return lambda *args, **kwargs: self._call(name, attribute, *args, **kwargs)
+        return attribute
+
+    def _settings(self, kwargs):
+        """
+        (etiqueta, id, settings de la llamada con su log_comment).
+        """
+        tag = lhc.query_tag.get() or ('lakehouse:adhoc' if self._profiling else None)
+        profile_id = uuid.uuid4().hex[:16]
+        settings = dict(kwargs.pop('settings', None) or {})
+        if self._profiling:
+            settings['log_comment'] = f"{tag}#{profile_id}"
+        elif tag:
+            settings['log_comment'] = tag
+        return tag, profile_id, settings
+
+    def _call(self, method, func, statement, *args, **kwargs):
+        tag, profile_id, settings = self._settings(kwargs)
+        if not self._profiling:
+            return func(statement, *args, settings=settings, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return func(statement, *args, settings=settings, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= conf.profiling_slow_query_ms:
+                entry = _slow_entry(tag, profile_id, method, statement, elapsed_ms, settings)
+                for kind, sql in _explains(entry):
+                    try:
+                        result = self._client.query(sql, parameters=kwargs.get('parameters'),
+                                                    settings=entry['settings'])
+                        entry[kind] = '\n'.join(str(row[0]) for row in result.result_rows)
+                    except Exception as e:
+                        entry[kind] = f"(no disponible: {e})"
+                _add_slow_query(entry)
+
+
+class AsyncProfiledClient(ProfiledClient):
+    """
+    Lo mismo para el AsyncClient de clickhouse_connect (async_api.py): sus
+    métodos de consulta son corrutinas.
+    """
+
+    async def _call(self, method, func, statement, *args, **kwargs):
+        tag, profile_id, settings = self._settings(kwargs)
+        if not self._profiling:
+            return await func(statement, *args, settings=settings, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return await func(statement, *args, settings=settings, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if elapsed_ms >= conf.profiling_slow_query_ms:
+                entry = _slow_entry(tag, profile_id, method, statement, elapsed_ms, settings)
+                for kind, sql in _explains(entry):
+                    try:
+                        result = await self._client.query(sql, parameters=kwargs.get('parameters'),
+                                                          settings=entry['settings'])
+                        entry[kind] = '\n'.join(str(row[0]) for row in result.result_rows)
+                    except Exception as e:
+                        entry[kind] = f"(no disponible: {e})"
+                _add_slow_query(entry)
+
+
+def _slow_entry(tag, profile_id, method, statement, elapsed_ms, settings):
+    sql = f"INSERT INTO {statement}" if method in INSERT_METHODS else statement
+    return {
+        'tag': tag,
+        'log_comment': f"{tag}#{profile_id}",
+        'sql': sql.strip(),
+        'elapsed_ms': elapsed_ms,
+        # El EXPLAIN usa los mismos settings que la consulta (p.ej. join_algorithm),
+        # salvo los que identifican la ejecución
+        'settings': {k: v for k, v in settings.items() if k not in ('log_comment', 'query_id')},
+        'captured_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+
+def _explains(entry):
+    """
+    [(clave, consulta EXPLAIN)] de la parte SELECT de la sentencia, si la tiene.
+    """
+    select = explainable_select(entry['sql'])
+    if not select:
+        return []
+    return [('explain_indexes', f"EXPLAIN indexes = 1 {select}"), ('explain_pipeline', f"EXPLAIN PIPELINE {select}")]
+
+
+def _add_slow_query(entry):
+    with _lock:
+        _slow_queries.append(entry)
+
+
+def wrap(client):
+    """
+    Envuelve un cliente síncrono: etiqueta siempre sus llamadas y, con el
+    profiling activo, las mide.
+    """
+    return ProfiledClient(client)
+
+
+def wrap_async(client):
+    return AsyncProfiledClient(client)
+
+
+def _query_log_stats(client, log_comments):
+    try:
+        client.command("SYSTEM FLUSH LOGS")
+    except Exception:
+        pass
+    result = client.query("""
+        SELECT
+            log_comment,
+            read_rows, read_bytes, written_rows, memory_usage, query_duration_ms,
+            ProfileEvents['SelectedParts'], ProfileEvents['SelectedMarks'],
+            ProfileEvents['ExternalSortWritePart'] + ProfileEvents['ExternalAggregationWritePart']
+                + ProfileEvents['ExternalJoinWritePart'] AS spilled_parts,
+            exception
+        FROM system.query_log
+        WHERE type IN ('QueryFinish', 'ExceptionWhileProcessing')
+          AND event_date >= toDate({since:DateTime})
+          AND log_comment IN {comments:Array(String)}
+    """, parameters={'since': _started, 'comments': log_comments})
+    keys = ['read_rows', 'read_bytes', 'written_rows', 'memory_usage', 'query_duration_ms',
+            'selected_parts', 'selected_marks', 'spilled_parts', 'exception']
+    return {row[0]: dict(zip(keys, row[1:])) for row in result.result_rows}
+
+
+def _findings(entry):
+    """
+    Pistas automáticas a partir del EXPLAIN y de system.query_log.
+    """
+    findings = []
+    for selected, total in re.findall(r'Granules:\s*(\d+)/(\d+)', entry.get('explain_indexes', '')):
+        if int(total) > 8 and int(selected) == int(total):
+            findings.append(f"El índice no descarta granules ({selected}/{total}): escaneo completo.")
+            break
+    stats = entry.get('query_log', {})
+    if stats.get('spilled_parts'):
+        findings.append(f"Spill a disco ({stats['spilled_parts']} partes externas de sort/agregación/join).")
+    if stats.get('memory_usage', 0) > conf.profiling_memory_warning_bytes:
+        findings.append(f"Memoria alta: {stats['memory_usage'] / 1024 / 1024:,.0f} MB.")
+    if 'Join' in entry.get('explain_pipeline', '') and stats.get('memory_usage', 0) > conf.profiling_memory_warning_bytes:
+        findings.append("JOIN con tabla hash grande: revisar el orden (la tabla pequeña a la derecha) o join_algorithm.")
+    return findings
+
+
+def write_slow_query_report():
+    """
+    Escribe el informe de consultas lentas capturadas hasta ahora.
+    """
+    with _lock:
+        entries = list(_slow_queries)
+        _slow_queries.clear()
+    if not entries:
+        return None
+
+    try:
+        client = lhc.get_client()
+        client = getattr(client, '_client', client)  # Sin perfilar las consultas del propio informe
+        stats = _query_log_stats(client, [e['log_comment'] for e in entries])
+    except Exception as e:
+        print(f" No se pudo leer system.query_log para el informe de profiling: {e}")
+        stats = {}
+
+    lines = [f"# Consultas lentas ({datetime.now():%Y-%m-%d %H:%M:%S})", "",
+             f"Umbral: {conf.profiling_slow_query_ms} ms. Consultas capturadas: {len(entries)}.", ""]
+    for entry in sorted(entries, key=lambda e: e['elapsed_ms'], reverse=True):
+        entry['query_log'] = stats.get(entry['log_comment'], {})
+        lines += [f"## {entry['tag']} — {entry['elapsed_ms']:,.0f} ms", "",
+                  f"`log_comment = '{entry['log_comment']}'`", ""]
+        if entry['settings']:
+            lines += ["Settings: " + ", ".join(f"`{k} = {v}`" for k, v in sorted(entry['settings'].items())), ""]
+        if entry['query_log']:
+            q = entry['query_log']
+            lines += [f"- Filas leídas: {q['read_rows']:,} ({q['read_bytes'] / 1024 / 1024:,.1f} MB)",
+                      f"- Filas escritas: {q['written_rows']:,}",
+                      f"- Memoria: {q['memory_usage'] / 1024 / 1024:,.1f} MB",
+                      f"- Partes/marcas seleccionadas: {q['selected_parts']:,} / {q['selected_marks']:,}",
+                      f"- Partes de spill a disco: {q['spilled_parts']:,}"]
+            if q['exception']:
+                lines.append(f"- Error: {q['exception']}")
+            lines.append("")
+        for finding in _findings(entry):
+            lines.append(f"> ⚠ {finding}")
+        lines += ["", "```sql", entry['sql'], "```", ""]
+        for kind, title in (('explain_indexes', 'EXPLAIN indexes = 1'), ('explain_pipeline', 'EXPLAIN PIPELINE')):
+            if kind in entry:
+                lines += [f"**{title}**", "", "```", entry[kind], "```", ""]
+
+    os.makedirs(conf.ruta_reports, exist_ok=True)
+    path = os.path.join(conf.ruta_reports, f"slow_queries_{datetime.now():%Y%m%d_%H%M%S}.md")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(lines))
+    print(f" Informe de consultas lentas ({len(entries)}) en {path}")
+    return path
+
+
+def _register_report():
+    global _report_registered
+    with _lock:
+        if not _report_registered:
+            atexit.register(write_slow_query_report)
+            _report_registered = True
@@ -0,0 +1,263 @@
+"""
+RETENCIÓN Y DOWNSAMPLING POR CAPAS
+==================================
+
+Aplica las políticas de retención definidas en config.retention_policies:
+
+- Bronze: TTL que borra los logs raw N días después de su carga (_ingested_at).
+- Silver: las particiones diarias más antiguas que N días se resumen por hora
+  en silver.enriched_events_hourly y después se borra el detalle. El
+  histórico de Silver no depende de la TTL de Bronze: Silver solo recarga los
+  días de los ficheros nuevos o modificados (ver silver_layer.py). Las
+  particiones "frías" se recomprimen con ZSTD y, si hay storage policy, se
+  mueven al volumen frío.
+- Gold: las vistas con granularidad horaria se podan tras N días (las
+  vistas diarias/semanales se conservan).
+
+Al terminar genera un informe con el espacio recuperado y el cambio en el
+tiempo de las consultas Gold estándar.
+
+Solo para un único nodo: en cluster (config.cluster_name) no se aplica.
+"""
+
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+import lakehouseConfig as lhc
+import gold_layer as gl
+import config as conf
+import catalog
+import cluster
+
+
+def create_rollup_table(client):
+    """
+    Tabla resumen (hora) donde se conserva el histórico de Silver tras el downsampling.
+    """
+    client.command("""
+    CREATE TABLE IF NOT EXISTS silver.enriched_events_hourly (
+        event_hour DateTime,
+        url_path String,
+        http_method String,
+        status_code Int32,
+        user_country String,
+        user_is_premium Bool,
+        ip_risk_level String,
+        is_suspicious UInt8,
+
+        -- Medidas sumables
+        requests UInt64,
+        total_bytes_sent Int64,
+        total_response_time_ms Int64,
+        max_response_time_ms Int32
+    ) ENGINE = SummingMergeTree((requests, total_bytes_sent, total_response_time_ms))
+    PARTITION BY toDate(event_hour)
+    ORDER BY (event_hour, url_path, http_method, status_code, user_country,
+              user_is_premium, ip_risk_level, is_suspicious)
+    """)
+
+
+def storage_snapshot(client):
+    """
+    Bytes en disco y filas activas por tabla de las tres capas.
+    """
+    result = client.query("""
+        SELECT database, table, sum(bytes_on_disk), sum(rows)
+        FROM system.parts
+        WHERE active AND database IN ('bronze', 'silver', 'gold')
+        GROUP BY database, table
+    """)
+    return {f"{db}.{table}": {'bytes': int(b), 'rows': int(r)} for db, table, b, r in result.result_rows}
+
+
+def time_gold_queries(client, repetitions=3):
+    """
+    Mejor tiempo (s) de cada consulta Gold estándar.
+    """
+    timings = {}
+    for title, sql in gl.GOLD_EXAMPLE_QUERIES:
+        best = None
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            client.query(sql)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[title] = best
+    return timings
+
+
+def apply_bronze_ttl(client, ttl_days):
+    # Tablas creadas antes de añadir _ingested_at: añadimos la columna
+    client.command("ALTER TABLE bronze.logs_web ADD COLUMN IF NOT EXISTS _ingested_at DateTime DEFAULT now()")
+    client.command(f"ALTER TABLE bronze.logs_web MODIFY TTL _ingested_at + INTERVAL {int(ttl_days)} DAY")
+    # Forzamos que la TTL se aplique ya sobre las partes existentes
+    client.command("ALTER TABLE bronze.logs_web MATERIALIZE TTL", settings={'mutations_sync': 1})
+    # Lo borrado por la TTL no pasa por la vista del catálogo
+    catalog.rebuild(client, 'bronze.logs_web')
+    print(f" [bronze] TTL de {ttl_days} días aplicada a bronze.logs_web.")
+
+
+def silver_partitions_before(client, cutoff):
+    result = client.query("""
+        SELECT DISTINCT partition
+        FROM system.parts
+        WHERE active AND database = 'silver' AND table = 'enriched_events'
+          -- toDateOrNull descarta la partición 'tuple()' de una tabla antigua sin particionar
+          AND toDateOrNull(partition) < {cutoff:Date}
+        ORDER BY partition
+    """, parameters={'cutoff': cutoff})
+    return [row[0] for row in result.result_rows]
+
+
+def downsample_silver(client, downsample_after_days):
+    create_rollup_table(client)
+    cutoff = date.today() - timedelta(days=downsample_after_days)
+    partitions = silver_partitions_before(client, cutoff)
+
+    for partition in partitions:
+        # Idempotente: si el día ya estaba resumido, se reemplaza
+        client.command(f"ALTER TABLE silver.enriched_events_hourly DROP PARTITION '{partition}'")
+        client.command(f"""
+        INSERT INTO silver.enriched_events_hourly
+        SELECT
+            toStartOfHour(event_ts) AS event_hour,
+            url_path, http_method, status_code, user_country,
+            user_is_premium, ip_risk_level, is_suspicious,
+            count() AS requests,
+            sum(bytes_sent) AS total_bytes_sent,
+            sum(response_time_ms) AS total_response_time_ms,
+            max(response_time_ms) AS max_response_time_ms
+        FROM silver.enriched_events
+        WHERE toDate(event_ts) = '{partition}'
+        GROUP BY event_hour, url_path, http_method, status_code, user_country,
+                 user_is_premium, ip_risk_level, is_suspicious
+        """)
+        client.command(f"ALTER TABLE silver.enriched_events DROP PARTITION '{partition}'")
+    if partitions:
+        catalog.forget(client, 'silver.enriched_events', partitions)
+    print(f" [silver] {len(partitions)} particiones anteriores a {cutoff} resumidas por hora.")
+
+
+def compress_cold_silver(client, cold_after_days):
+    # Recompresión de lo frío con un códec más agresivo
+    client.command(f"""
+        ALTER TABLE silver.enriched_events
+        MODIFY TTL event_ts + INTERVAL {int(cold_after_days)} DAY RECOMPRESS CODEC(ZSTD(9))
+    """)
+
+    if not conf.storage_policy:
+        print(f" [silver] Recompresión ZSTD(9) tras {cold_after_days} días (sin storage policy: no se mueven particiones).")
+        return
+
+    # Movemos al volumen frío las particiones que aún no están en él
+    cutoff = date.today() - timedelta(days=cold_after_days)
+    result = client.query("""
+        SELECT DISTINCT p.partition
+        FROM system.parts AS p
+        WHERE p.active AND p.database = 'silver' AND p.table = 'enriched_events'
+          AND toDateOrNull(p.partition) < {cutoff:Date}
+          AND p.disk_name NOT IN (
+              SELECT arrayJoin(disks) FROM system.storage_policies
+              WHERE policy_name = {policy:String} AND volume_name = {volume:String}
+          )
+    """, parameters={'cutoff': cutoff, 'policy': conf.storage_policy, 'volume': conf.cold_volume})
+    partitions = [row[0] for row in result.result_rows]
+    for partition in partitions:
+        client.command(f"ALTER TABLE silver.enriched_events MOVE PARTITION '{partition}' TO VOLUME '{conf.cold_volume}'")
+    print(f" [silver] {len(partitions)} particiones movidas al volumen '{conf.cold_volume}'.")
+
+
+def prune_gold_hourly(client, hourly_ttl_days):
+    hourly_views = [view for view, (_, grain) in gl.GOLD_TIME_COLUMNS.items() if grain == 'hour']
+    for view in hourly_views:
+        time_column = gl.GOLD_TIME_COLUMNS[view][0]
+        # Las mutaciones sobre una vista materializada se reenvían a su tabla destino
+        client.command(f"""
+            ALTER TABLE gold.{view}
+            DELETE WHERE {time_column} < now() - INTERVAL {int(hourly_ttl_days)} DAY
+        """, settings={'mutations_sync': 1})
+    print(f" [gold] {len(hourly_views)} vistas horarias podadas a {hourly_ttl_days} días.")
+
+
+def validate_policies(policies):
+    """
+    Comprueba que las políticas tienen sentido antes de borrar nada.
+    """
+    values = {
+        'bronze.ttl_days': policies['bronze']['ttl_days'],
+        'silver.downsample_after_days': policies['silver']['downsample_after_days'],
+        'silver.cold_after_days': policies['silver']['cold_after_days'],
+        'gold.hourly_ttl_days': policies['gold']['hourly_ttl_days'],
+    }
+    invalid = [name for name, value in values.items() if not isinstance(value, int) or value <= 0]
+    if invalid:
+        raise ValueError(f"Políticas de retención no válidas (deben ser enteros positivos): {', '.join(invalid)}")
+    # Lo frío se mueve antes de resumirse: con cold >= downsample nunca habría particiones frías
+    if values['silver.cold_after_days'] >= values['silver.downsample_after_days']:
+        raise ValueError("silver.cold_after_days debe ser menor que silver.downsample_after_days.")
+
+
+def write_report(report):
+    os.makedirs(conf.ruta_reports, exist_ok=True)
+    path = os.path.join(conf.ruta_reports, f"retention_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return path
+
+
+def apply_retention():
+    if cluster.is_clustered():
+        # Las operaciones por partición tendrían que hacerse en cada shard
+        print(" La retención aún no está soportada en despliegues en cluster; no se aplica.")
+        return None
+    client = lhc.get_client()
+    policies = conf.retention_policies
+    validate_policies(policies)
+    print(" Aplicando políticas de retención...")
+
+    storage_before = storage_snapshot(client)
+    timings_before = time_gold_queries(client)
+
+    apply_bronze_ttl(client, policies['bronze']['ttl_days'])
+    downsample_silver(client, policies['silver']['downsample_after_days'])
+    compress_cold_silver(client, policies['silver']['cold_after_days'])
+    prune_gold_hourly(client, policies['gold']['hourly_ttl_days'])
+
+    storage_after = storage_snapshot(client)
+    timings_after = time_gold_queries(client)
+
+    # INFORME
+    # ---------------------------------------------------------
+    tables = sorted(set(storage_before) | set(storage_after))
+    storage = {}
+    for table in tables:
+        before = storage_before.get(table, {'bytes': 0, 'rows': 0})
+        after = storage_after.get(table, {'bytes': 0, 'rows': 0})
+        storage[table] = {
+            'bytes_before': before['bytes'], 'bytes_after': after['bytes'],
+            'rows_before': before['rows'], 'rows_after': after['rows'],
+        }
+    reclaimed = sum(t['bytes_before'] - t['bytes_after'] for t in storage.values())
+    queries = {title: {'seconds_before': timings_before[title], 'seconds_after': timings_after[title]}
+               for title in timings_before}
+
+    report = {
+        'executed_at': datetime.now().isoformat(timespec='seconds'),
+        'policies': policies,
+        'bytes_reclaimed': reclaimed,
+        'storage': storage,
+        'gold_queries': queries,
+    }
+    path = write_report(report)
+
+    print("-" * 30)
+    print(f" Espacio recuperado: {reclaimed / 1024 / 1024:.2f} MB")
+    for title, t in queries.items():
+        print(f"   • {title}: {t['seconds_before'] * 1000:.1f} ms -> {t['seconds_after'] * 1000:.1f} ms")
+    print(f" Informe guardado en {path}")
+    return report
+
+
+if __name__ == "__main__":
+    apply_retention()
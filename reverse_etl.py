@@ -0,0 +1,196 @@
+"""
+REVERSE ETL: DE GOLD A MONGODB
+==============================
+
+Lleva a MongoDB los resultados de Gold que necesita la aplicación, para que
+consulte el riesgo o el valor de un usuario en milisegundos sin pasar por
+ClickHouse:
+
+- gold.user_security_alerts -> colección user_risk (calculated_risk_score...)
+- gold.user_value_estimation -> colección user_value (estimated_value_points...)
+
+Un documento por usuario y día (_id = '<user_id>:<YYYY-MM-DD>'), con índice
+(user_id, date) para leer el último de un usuario (get_user_risk / get_user_value).
+
+Solo se envía lo que ha cambiado:
+1. Ventana de fechas: el catálogo (catalog.changed_partitions) dice qué días
+   de Silver han cambiado desde la última sincronización. Si cambian las
+   dimensiones (usuarios, IPs) se revisan todos los días.
+2. Hash por fila: de esos días se comparan las filas de Gold con el hash
+   guardado en cada documento (_row_hash); solo las distintas se reescriben
+   y las que ya no están en Gold se borran.
+3. Escritura con bulk_write desordenado (ordered=False) en lotes de
+   config.reverse_etl_batch_size.
+
+Uso:
+    python reverse_etl.py            # sincroniza los cambios
+    python reverse_etl.py --full     # revisa todos los días
+"""
+
+import argparse
+import hashlib
+import json
+from datetime import datetime, date
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne
+import lakehouseConfig as lhc
+import mongo as mng
+import config as conf
+import catalog
+import gold_compaction
+import metrics
+
+# Colección Mongo -> vista Gold, columna de fecha y consulta (filtrada por días)
+REVERSE_ETL_TARGETS = {
+    'user_risk': {
+        'view': 'user_security_alerts',
+        'date_column': 'alert_date',
+        # ReplacingMergeTree: FINAL solo si quedan partes sin combinar
+        'sql': """
+            SELECT
+                user_id, alert_date, user_name, user_email, user_country,
+                high_risk_ip_usage, suspicious_activities, failed_auth_attempts,
+                distinct_ips_used, off_hours_activity, calculated_risk_score
+            FROM gold.user_security_alerts{final}
+            WHERE alert_date IN {{days:Array(Date)}}
+        """,
+    },
+    'user_value': {
+        'view': 'user_value_estimation',
+        'date_column': 'value_date',
+        # SummingMergeTree: se suman las filas aún sin combinar
+        'sql': """
+            SELECT
+                user_id, value_date,
+                any(user_name) AS user_name,
+                any(user_is_premium) AS user_is_premium,
+                any(user_country) AS user_country,
+                sum(activity_score) AS activity_score,
+                sum(conversion_actions) AS conversion_actions,
+                sum(estimated_value_points) AS estimated_value_points
+            FROM gold.user_value_estimation
+            WHERE value_date IN {{days:Array(Date)}}
+            GROUP BY user_id, value_date
+        """,
+    },
+}
+
+
+def setup_indexes(db):
+    for collection in REVERSE_ETL_TARGETS:
+        db[collection].create_index([('user_id', ASCENDING), ('date', DESCENDING)])
+        db[collection].create_index([('date', ASCENDING)])
+
+
+def _row_hash(values):
+    return hashlib.md5(json.dumps(values, default=str).encode()).hexdigest()
+
+
+def _document(row, column_names, date_column):
+    doc = dict(zip(column_names, row))
+    day = doc.pop(date_column)
+    doc['date'] = datetime(day.year, day.month, day.day)  # BSON no tiene tipo fecha sin hora
+    doc['_id'] = f"{doc['user_id']}:{day.isoformat()}"
+    doc['_row_hash'] = _row_hash(list(row))
+    return doc
+
+
+def _days_to_sync(client, target, full):
+    """
+    (días a revisar, firmas de Silver a registrar al terminar, firma de dimensiones).
+    """
+    consumer = f"reverse_etl_{target}"
+    dimensions = catalog.consumed(client, 'silver', 'dimensions').get('')
+    if full or catalog.consumed(client, consumer, 'dimensions').get('') != dimensions:
+        changed = catalog.partition_signatures(client, 'silver.enriched_events')
+    else:
+        changed = catalog.changed_partitions(client, consumer, 'silver.enriched_events')
+    days = sorted(date.fromisoformat(p) for p in changed if p)
+    return days, changed, dimensions
+
+
+def sync_target(client, db, target, full=False):
+    """
+    Sincroniza una colección. Devuelve (filas leídas de Gold, documentos escritos, documentos borrados).
+    """
+    spec = REVERSE_ETL_TARGETS[target]
+    view = spec['view']
+    if not client.command(f"EXISTS TABLE gold.{view}"):
+        print(f" [reverse_etl] gold.{view} no existe todavía; se omite {target}.")
+        return 0, 0, 0
+
+    days, signatures, dimensions = _days_to_sync(client, target, full)
+    if not days:
+        print(f" [reverse_etl] {target}: sin días nuevos o modificados.")
+        return 0, 0, 0
+
+    final = " FINAL" if '{final}' in spec['sql'] and gold_compaction.needs_final(client, view) else ""
+    result = client.query(spec['sql'].format(final=final), parameters={'days': days})
+    current = {doc['_id']: doc for doc in
+               (_document(row, result.column_names, spec['date_column']) for row in result.result_rows)}
+
+    # Hash de lo que ya hay en Mongo para esos días (índice por fecha)
+    collection = db[target]
+    synced = {doc['_id']: doc.get('_row_hash') for doc in collection.find(
+        {'date': {'$in': [datetime(d.year, d.month, d.day) for d in days]}}, {'_row_hash': 1})}
+
+    now = datetime.now()
+    operations = [ReplaceOne({'_id': _id}, {**doc, '_synced_at': now}, upsert=True)
+                  for _id, doc in current.items() if synced.get(_id) != doc['_row_hash']]
+    operations += [DeleteOne({'_id': _id}) for _id in synced.keys() - current.keys()]
+
+    written = deleted = 0
+    batch_size = conf.reverse_etl_batch_size
+    for start in range(0, len(operations), batch_size):
+        result = collection.bulk_write(operations[start:start + batch_size], ordered=False)
+        written += result.upserted_count + result.modified_count
+        deleted += result.deleted_count
+
+    consumer = f"reverse_etl_{target}"
+    catalog.mark_consumed(client, consumer, 'silver.enriched_events', signatures)
+    if dimensions is not None:
+        catalog.mark_consumed(client, consumer, 'dimensions', {'': dimensions})
+    print(f" [reverse_etl] {target}: {len(days)} días revisados, {len(current)} filas en Gold, "
+          f"{written} documentos escritos, {deleted} borrados.")
+    return len(current), written, deleted
+
+
+@metrics.instrumented('reverse_etl')
+def sync_all(full=False):
+    client = lhc.get_client()
+    mongo_client, db = mng.create_mongo_connection()
+    try:
+        setup_indexes(db)
+        for target in REVERSE_ETL_TARGETS:
+            rows, written, deleted = sync_target(client, db, target, full=full)
+            metrics.record(rows_in=rows, rows_out=written + deleted)
+    finally:
+        mongo_client.close()
+
+
+# =========================================================================
+# LECTURA (para la aplicación)
+# =========================================================================
+
+def get_user_risk(db, user_id):
+    """
+    Última alerta de riesgo del usuario (o None).
+    """
+    return db.user_risk.find_one({'user_id': user_id}, sort=[('date', DESCENDING)])
+
+
+def get_user_value(db, user_id):
+    """
+    Último valor estimado del usuario (o None).
+    """
+    return db.user_value.find_one({'user_id': user_id}, sort=[('date', DESCENDING)])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sincroniza resultados Gold con MongoDB.")
+    parser.add_argument('--full', action='store_true', help="Revisa todos los días, no solo los modificados")
+    args = parser.parse_args(argv)
+    sync_all(full=args.full)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,396 @@
-import clickhouse_connect
+import math
 import time
+import uuid
+from datetime import date, timedelta
 import lakehouseConfig as conf
+import config as cfg
+import catalog
+import cluster
+import gold_layer as gl
+import metrics
+import user_agents as ua
 
+# Columnas de la dimensión user-agent (silver.user_agents)
+UA_COLUMNS = {
+    'ua_browser': 'LowCardinality(String)',
+    'ua_os': 'LowCardinality(String)',
+    'ua_device_class': 'LowCardinality(String)',
+    'ua_is_bot': 'Bool',
+}
 
+
+# Tabla auxiliar donde se recalculan los días que ya estaban en Silver
+STAGING = 'silver.enriched_events_staging'
+
+# Columnas de Silver que vienen del log, en el orden de la tabla
+LOG_COLUMNS = ['event_id', 'event_ts', 'user_id', 'ip_address', 'http_method', 'url_path',
+               'status_code', 'bytes_sent', 'response_time_ms', 'user_agent', 'is_suspicious']
+
+# Columnas de Silver que salen de las dimensiones: (columna, tipo, expresión).
+# Si no cruza (usuario anónimo, IP sin reputación) se ponen valores por defecto.
+DIMENSION_COLUMNS = [
+    # Campos de Users (bronze.users)
+    ('user_name', 'String', "if(U.username = '', 'Anonymous', U.username)"),
+    ('user_email', 'String', "U.email"),
+    ('user_role', 'String', "if(U.role = '', 'guest', U.role)"),  # [cite: 94]
+    ('user_country', 'String', "if(U.country = '', 'XX', U.country)"),
+    ('user_is_premium', 'Bool', "ifNull(U.is_premium, 0)"),
+    # Campos de IP Reputation (bronze.ip_reputation): si no cruza, riesgo bajo/desconocido
+    ('ip_risk_level', 'String', "if(I.risk_level = '', 'unknown', I.risk_level)"),  # [cite: 133]
+    ('ip_threat_type', 'String', "if(I.threat_type = '', 'benign', I.threat_type)"),
+    ('ip_source', 'String', "I.source"),
+    # Campos de la dimensión user-agent (silver.user_agents)
+    *[(column, column_type, f"A.{column}") for column, column_type in UA_COLUMNS.items()],
+]
+
+# Expresión de cada columna del log según la tabla de origen ('bronze' o 'silver')
+LOG_EXPRESSIONS = {
+    'bronze': {
+        'event_ts': "parseDateTimeBestEffort(L.event_ts)",  # Conversión a DateTime
+        'bytes_sent': "ifNull(L.bytes_sent, 0)",              # Limpieza de Nulos
+        'response_time_ms': "ifNull(L.response_time_ms, 0)",  # Limpieza de Nulos
+    },
+    'silver': {},
+}
+
+# Hacemos LEFT JOIN porque:
+# - Puede haber logs de usuarios no registrados (user_id vacío) -> LEFT JOIN users
+# - Puede haber IPs que no estén en nuestra lista de reputación -> LEFT JOIN ip_reputation
+# En cluster cada shard procesa sus propios logs (parallel_distributed_insert_select):
+# los usuarios están en el mismo shard que sus logs (tabla local) y la tabla
+# de IPs, sharded por IP, se lee completa desde cada shard (igual que la de user-agents).
+DIMENSION_JOINS = """
+    LEFT JOIN {users} AS U
+        ON L.user_id = U._id  -- Cruce por ID de usuario [cite: 88]
+    LEFT JOIN bronze.ip_reputation AS I
+        ON L.ip_address = I.ip -- Cruce por IP [cite: 121]
+    LEFT JOIN silver.user_agents AS A
+        ON L.user_agent = A.user_agent
+"""
+
+# Filas de cada origen que entran en el INSERT (parámetros: days, files)
+SOURCE_FILTERS = {
+    # Logs de los ficheros nuevos o recargados, sin usuarios anónimos
+    'bronze': """
+        L.user_id IS NOT NULL
+        AND L.user_id != ''
+        AND has({files:Array(String)}, L._source_file)
+        AND toDate(parseDateTimeBestEffort(L.event_ts)) IN {days:Array(Date)}
+    """,
+    # Lo que ya estaba en Silver, salvo las filas de los ficheros que se
+    # recargan (y las anteriores a _source_file que vuelven a llegar de Bronze)
+    'silver': """
+        toDate(L.event_ts) IN {days:Array(Date)}
+        AND NOT has({files:Array(String)}, L._source_file)
+        AND NOT (L._source_file = '' AND L.event_id IN (
+            SELECT event_id FROM bronze.logs_web WHERE has({files:Array(String)}, _source_file)))
+    """,
+}
+
+
+def enrich_sql(source, target='silver.enriched_events'):
+    """
+    INSERT en `target` de los eventos de `source` ('bronze': bronze.logs_web;
+    'silver': los que ya están en Silver) cruzados con las dimensiones.
+    Lista de columnas explícita: no depende del orden de las columnas en la tabla.
+    """
+    log_columns = [LOG_EXPRESSIONS[source].get(column, f"L.{column}") for column in LOG_COLUMNS]
+    columns = LOG_COLUMNS + ['_source_file'] + [column for column, _, _ in DIMENSION_COLUMNS]
+    expressions = log_columns + ['L._source_file'] + [expression for _, _, expression in DIMENSION_COLUMNS]
+    table = 'bronze.logs_web' if source == 'bronze' else 'silver.enriched_events'
+    separator = ',\n        '
+    return f"""
+    INSERT INTO {target} (
+        {', '.join(columns)}
+    )
+    SELECT
+        {separator.join(expressions)}
+    FROM {table} AS L
+    {DIMENSION_JOINS.format(users=cluster.local_name('bronze.users'))}
+    WHERE {SOURCE_FILTERS[source]}
+    """
+
+
+def _dimensions_signature(client):
+    # Las tablas de dimensiones son pequeñas: un hash de su contenido es barato
+    return str(client.query("""
+        SELECT (SELECT (count(), sum(cityHash64(*))) FROM bronze.users),
+               (SELECT (count(), sum(cityHash64(*))) FROM bronze.ip_reputation)
+    """).result_rows[0])
+
+
+def _days_range(days):
+    return f"{days[0]} a {days[-1]}" if days else "ningún día"
+
+
+def _partitioned_by_day(client):
+    return client.command(
+        "SELECT partition_key FROM system.tables WHERE database = 'silver' AND name = {table:String}",
+        parameters={'table': cluster.local_name('silver.enriched_events').split('.')[1]}) == 'toDate(event_ts)'
+
+
+def _clear_silver(client, days):
+    """
+    Borra de Silver (y de Gold) los días que se van a recalcular. Devuelve los
+    días a recalcular con backfill en las vistas semanales.
+    """
+    if not days:
+        return {}
+    backfill = gl.invalidate_gold_days(client, days)
+    if _partitioned_by_day(client):
+        for day in days:
+            client.command(f"ALTER TABLE {cluster.ddl_name('silver.enriched_events')} DROP PARTITION '{day}'")
+    else:
+        # Tabla creada antes de particionar Silver por día
+        client.command(f"ALTER TABLE {cluster.ddl_name('silver.enriched_events')} "
+                       "DELETE WHERE toDate(event_ts) IN {days:Array(Date)}",
+                       parameters={'days': days}, settings={'mutations_sync': 2 if cluster.is_clustered() else 1})
+    catalog.forget(client, 'silver.enriched_events', [day.isoformat() for day in days])
+    print(f"🧹 {len(days)} días de Silver limpiados para recarga ({_days_range(days)}).")
+    return backfill
+
+
+# =========================================================================
+# QUÉ HAY QUE RECALCULAR
+# =========================================================================
+# Silver guarda el histórico: los días ya cargados no se vuelven a leer de
+# Bronze (su TTL los habrá borrado en parte o del todo). Lo consumido se
+# registra por fichero cargado (bronze.ingested_files), no por día.
+
+def changed_files(client, silver_created=False):
+    """
+    {fichero: firma} de los ficheros de logs cargados (o recargados) en
+    Bronze desde la última ejecución de Silver. Con una tabla Silver nueva,
+    todos, incluidas las filas anteriores al registro (fichero '').
+    """
+    result = client.query("""
+        SELECT file_path, argMax(status, updated_at),
+               concat(toString(argMax(file_size, updated_at)), ':', toString(argMax(file_mtime, updated_at)),
+                      ':', toString(argMax(rows, updated_at)), ':', toString(max(updated_at)))
+        FROM bronze.ingested_files
+        GROUP BY file_path
+    """)
+    loaded = {path: signature for path, status, signature in result.result_rows if status == 'done'}
+    if silver_created:
+        return {**loaded, '': ''}
+    done = catalog.consumed(client, 'silver', 'bronze.ingested_files')
+    return {path: signature for path, signature in loaded.items() if done.get(path) != signature}
+
+
+def _file_days(client, files):
+    """
+    (días con logs de esos ficheros en Bronze, días con filas de sus cargas
+    anteriores en Silver).
+    """
+    if not files:
+        return [], []
+    new = client.query("""
+        SELECT DISTINCT toDate(parseDateTimeBestEffortOrNull(event_ts)) AS day
+        FROM bronze.logs_web
+        WHERE has({files:Array(String)}, _source_file) AND day IS NOT NULL
+    """, parameters={'files': files})
+    # Solo los ficheros que Silver ya había consumido pueden tener filas en ella
+    consumed = catalog.consumed(client, 'silver', 'bronze.ingested_files')
+    reloaded = [path for path in files if path in consumed]
+    old = client.query("""
+        SELECT DISTINCT toDate(event_ts) FROM silver.enriched_events
+        WHERE has({files:Array(String)}, _source_file)
+    """, parameters={'files': reloaded}) if reloaded else None
+    return (sorted(row[0] for row in new.result_rows),
+            sorted(row[0] for row in old.result_rows) if old else [])
+
+
+def stale_days(client, settings=None):
+    """
+    Días de Silver con alguna fila cuyo enriquecimiento ya no coincide con
+    las dimensiones actuales (usuarios, IPs, user-agents).
+    """
+    differs = ' OR '.join(f"L.{column} != CAST({expression} AS {column_type})"
+                          for column, column_type, expression in DIMENSION_COLUMNS)
+    result = client.query(f"""
+        SELECT DISTINCT toDate(L.event_ts) AS day
+        FROM silver.enriched_events AS L
+        {DIMENSION_JOINS.format(users=cluster.local_name('bronze.users'))}
+        WHERE {differs}
+    """, settings=settings)
+    return sorted(row[0] for row in result.result_rows)
+
+
+# =========================================================================
+# RECÁLCULO DE DÍAS YA CARGADOS
+# =========================================================================
+# Los días a recalcular se escriben primero en la tabla de staging (las filas
+# que se conservan, re-enriquecidas, más las nuevas de Bronze). Después se
+# borran de Silver y Gold y se copian desde staging: las vistas materializadas
+# los reciben de nuevo. Si el proceso falla durante la copia, la siguiente
+# ejecución la termina (recover_staging).
+
+def _drop_staging(client):
+    if cluster.is_clustered():
+        client.command(f"DROP TABLE IF EXISTS {STAGING}{cluster.on_cluster()} SYNC")
+    client.command(f"DROP TABLE IF EXISTS {cluster.ddl_name(STAGING)} SYNC")
+
+
+def _create_staging(client):
+    # Misma estructura que Silver; se recrea siempre por si Silver ha cambiado de columnas
+    _drop_staging(client)
+    client.command(f"CREATE TABLE {cluster.ddl_name(STAGING)} AS {cluster.local_name('silver.enriched_events')}")
+    cluster.create_distributed(client, STAGING)
+
+
+def _copy_from_staging(client, days):
+    """
+    Sustituye esos días de Silver por los de staging. Devuelve los días a
+    recalcular con backfill en las vistas semanales.
+    """
+    catalog.mark_consumed(client, 'silver', STAGING, {'': 'pending'})
+    backfill = _clear_silver(client, days)
+    client.command(f"INSERT INTO silver.enriched_events SELECT * FROM {STAGING}",
+                   settings=cluster.insert_select_settings())
+    catalog.mark_consumed(client, 'silver', STAGING, {'': 'done'})
+    _drop_staging(client)
+    return backfill
+
+
+def recover_staging(client):
+    """
+    Termina la copia desde staging de una ejecución anterior que falló a medias.
+    """
+    if catalog.consumed(client, 'silver', STAGING).get('') != 'pending':
+        return [], {}
+    days = sorted(row[0] for row in client.query(
+        f"SELECT DISTINCT toDate(event_ts) FROM {STAGING}").result_rows)
+    print(f" Terminando la recarga interrumpida de {len(days)} días de Silver ({_days_range(days)})...")
+    return days, _copy_from_staging(client, days)
+
+
+# =========================================================================
+# ESTRATEGIA DE JOIN
+# =========================================================================
+# Con el algoritmo 'hash' las tablas de la derecha de los LEFT JOIN se cargan
+# enteras en memoria. Según su tamaño y config.silver_join_memory_budget_bytes:
+# - hash: caben de sobra (el más rápido)
+# - grace_hash: se reparten en buckets y los que no caben se vuelcan a disco
+# - partial_merge: ordena y cruza por bloques con volcado a disco (servidores < 22.12)
+JOIN_DIMENSIONS = ['bronze.users', 'bronze.ip_reputation', 'silver.user_agents']
+JOIN_ALGORITHMS = ['hash', 'grace_hash', 'partial_merge']
+
+
+def _dimension_bytes(client):
+    """
+    Bytes sin comprimir de cada dimensión que ve un shard: la de usuarios es
+    la local de cada shard; IPs y user-agents se leen completas.
+    """
+    names = {cluster.local_name(table).split('.')[1]: table for table in JOIN_DIMENSIONS}
+    result = client.query(f"""
+        SELECT table, groupArray(bytes)
+        FROM (
+            SELECT hostName() AS host, table, sum(data_uncompressed_bytes) AS bytes
+            FROM {cluster.system_table('parts')}
+            WHERE active AND database IN ('bronze', 'silver') AND table IN {{tables:Array(String)}}
+            GROUP BY host, table
+        )
+        GROUP BY table
+    """, parameters={'tables': list(names)})
+    sizes = {table: 0 for table in JOIN_DIMENSIONS}
+    for name, per_host in result.result_rows:
+        table = names[name]
+        sizes[table] = max(per_host) if table == 'bronze.users' else sum(per_host)
+    return sizes
+
+
+def choose_join_strategy(client):
+    """
+    Algoritmo de JOIN para el INSERT de Silver a partir del tamaño estimado
+    de las tablas hash (bytes sin comprimir * silver_join_hash_overhead).
+    """
+    dimensions = _dimension_bytes(client)
+    estimated = int(sum(dimensions.values()) * cfg.silver_join_hash_overhead)
+    # Parte del presupuesto para los JOIN; el resto, para leer Bronze e insertar (y las vistas Gold)
+    join_budget = int(cfg.silver_join_memory_budget_bytes * cfg.silver_join_memory_fraction)
+    version = tuple(int(x) for x in client.command("SELECT version()").split('.')[:2])
+    algorithms = [a for a in JOIN_ALGORITHMS if a != 'grace_hash' or version >= (22, 12)]
+    algorithm = 'hash' if estimated <= join_budget else algorithms[1]
+    return {
+        'algorithm': algorithm,
+        # Alternativas si aun así se supera la memoria
+        'fallbacks': algorithms[algorithms.index(algorithm) + 1:],
+        'dimension_bytes': dimensions,
+        'estimated_bytes': estimated,
+        'join_budget_bytes': join_budget,
+    }
+
+
+def join_settings(algorithm, strategy):
+    settings = {
+        'join_algorithm': algorithm,
+        'max_memory_usage': cfg.silver_join_memory_budget_bytes,
+    }
+    if algorithm == 'grace_hash':
+        # Buckets (potencia de 2) para que cada uno quepa en el presupuesto; si no, se duplican
+        ratio = max(2, strategy['estimated_bytes'] / strategy['join_budget_bytes'])
+        settings['grace_hash_join_initial_buckets'] = 2 ** math.ceil(math.log2(ratio))
+        settings['max_bytes_in_join'] = strategy['join_budget_bytes']
+    elif algorithm == 'partial_merge':
+        settings['max_bytes_in_join'] = strategy['join_budget_bytes']
+    return settings
+
+
+def _is_memory_error(error):
+    return 'MEMORY_LIMIT_EXCEEDED' in str(error) or 'Code: 241' in str(error)
+
+
+def join_report(client, query_id):
+    """
+    Pico de memoria y bytes volcados a disco por el JOIN (system.query_log,
+    sumando los shards en cluster). None si no hay query_log.
+    """
+    try:
+        client.command(f"SYSTEM FLUSH LOGS{cluster.on_cluster()}")
+        result = client.query(f"""
+            SELECT max(memory_usage),
+                   sum(ProfileEvents['ExternalJoinWritePart']),
+                   sum(ProfileEvents['ExternalJoinUncompressedBytes'])
+            FROM {cluster.system_table('query_log')}
+            WHERE type = 'QueryFinish' AND event_date >= yesterday()
+              AND initial_query_id = {{query_id:String}}
+        """, parameters={'query_id': query_id})
+    except Exception as e:
+        print(f" No se pudo leer el consumo del JOIN en system.query_log: {e}")
+        return None
+    peak, spilled_parts, spilled_bytes = result.result_rows[0]
+    return {'peak_memory_bytes': peak, 'spilled_parts': spilled_parts, 'spilled_bytes': spilled_bytes}
+
+
+def run_with_join_fallback(client, strategy, label, run, on_retry=None):
+    """
+    Ejecuta run(settings) con el algoritmo de JOIN elegido. Si se supera el
+    presupuesto de memoria, llama a on_retry() (limpiar lo insertado a
+    medias) y repite con el siguiente algoritmo, que vuelca a disco.
+    Devuelve lo que devuelva run.
+    """
+    algorithms = [strategy['algorithm'], *strategy['fallbacks']]
+    for algorithm in algorithms:
+        query_id = f"lakehouse-silver-{uuid.uuid4().hex}"
+        settings = {**cluster.insert_select_settings(), **join_settings(algorithm, strategy), 'query_id': query_id}
+        try:
+            result = run(settings)
+            break
+        except Exception as e:
+            if not _is_memory_error(e) or algorithm == algorithms[-1]:
+                raise
+            print(f" El JOIN '{algorithm}' superó el presupuesto de memoria; se repite con otro algoritmo.")
+            if on_retry is not None:
+                on_retry()
+
+    report = join_report(client, query_id)
+    if report:
+        print(f" {label}: JOIN '{algorithm}', pico de memoria {report['peak_memory_bytes'] / 1024 ** 2:.1f} MB, "
+              f"{report['spilled_bytes'] / 1024 ** 2:.1f} MB volcados a disco ({report['spilled_parts']} partes).")
+    return result
+
+
+@metrics.instrumented('silver')
 def process_silver():
     client = conf.get_client()
     print(" Iniciando procesamiento Capa SILVER...")
@@ -11,10 +399,12 @@ def process_silver():
     # 1. DEFINICIÓN DE TABLA SILVER (DDL)
     # ---------------------------------------------------------
     # Creamos una tabla "aplanada" que junta info de logs, usuarios e IPs.
-    # Usamos motor MergeTree ordenado por tiempo.
+    # Usamos motor MergeTree ordenado por hora y, dentro de cada hora, por
+    # hash de usuario: es la clave de muestreo (SAMPLE BY) que usa
+    # approx_query.py para leer solo una fracción de los usuarios.
     
     ddl_silver = """
-    CREATE TABLE IF NOT EXISTS silver.enriched_events (
+    CREATE TABLE IF NOT EXISTS {table} (
         -- Datos del Log Original
         event_id String,
         event_ts DateTime,
@@ -38,76 +428,163 @@ def process_silver():
         -- Datos Enriquecidos de IP (JOIN con ip_reputation)
         ip_risk_level String,
         ip_threat_type String,
-        ip_source String
+        ip_source String,
+
+        -- Datos de la dimensión user-agent (JOIN con silver.user_agents)
+        ua_browser LowCardinality(String),
+        ua_os LowCardinality(String),
+        ua_device_class LowCardinality(String),
+        ua_is_bot Bool,
+
+        -- Fichero Bronze de origen (permite recargar un fichero sin releer el resto del día)
+        _source_file String DEFAULT ''
         
     ) ENGINE = MergeTree()
-    ORDER BY event_ts
+    PARTITION BY toDate(event_ts)  -- Particiones diarias: permiten retención/movimiento por día
+    ORDER BY (toStartOfHour(event_ts), cityHash64(user_id), event_ts)
+    SAMPLE BY cityHash64(user_id)
+    {settings}
     """
-    client.command(ddl_silver)
+    # Si hay storage policy con volumen frío, las particiones antiguas se podrán mover (retention.py)
+    settings = f"SETTINGS storage_policy = '{cfg.storage_policy}'" if cfg.storage_policy else ""
+    # Tabla nueva (o recreada): hay que cargar todo lo que hay en Bronze aunque ya se hubiera consumido
+    silver_created = not client.command(f"EXISTS TABLE {cluster.local_name('silver.enriched_events')}")
+    client.command(ddl_silver.format(table=cluster.ddl_name('silver.enriched_events'), settings=settings))
+    # En cluster: tabla Distributed sharded por usuario, como bronze.logs_web
+    cluster.create_distributed(client, 'silver.enriched_events')
+
+    # Tablas creadas antes de la dimensión user-agent o de _source_file: añadimos
+    # sus columnas (las ua_* se rellenan al re-enriquecer los días afectados)
+    existing = {row[0] for row in client.query(
+        "SELECT name FROM system.columns WHERE database = 'silver' AND table = {table:String}",
+        parameters={'table': cluster.local_name('silver.enriched_events').split('.')[1]}).result_rows}
+    ua_columns_added = 'ua_browser' not in existing
+    added_columns = {**UA_COLUMNS, '_source_file': "String DEFAULT ''"}
+    tables = [cluster.ddl_name('silver.enriched_events')]
+    if cluster.is_clustered():
+        tables.append(f"silver.enriched_events{cluster.on_cluster()}")
+    for column, column_type in added_columns.items():
+        if column not in existing:
+            for table in tables:
+                client.command(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {column_type}")
+    if silver_created:
+        # Estadísticas de una tabla Silver anterior (borrada)
+        catalog.forget(client, 'silver.enriched_events')
+    catalog.track(client, 'silver.enriched_events')
     print(" Tabla 'silver.enriched_events' verificada.")
+    if not client.command(
+            "SELECT sampling_key != '' FROM system.tables WHERE database = 'silver' AND name = {table:String}",
+            parameters={'table': cluster.local_name('silver.enriched_events').split('.')[1]}):
+        # El ORDER BY no se puede cambiar con ALTER: hay que recrear la tabla
+        print(" Aviso: la tabla se creó sin clave de muestreo; approx_query.py filtrará por la clave "
+              "de muestreo (misma muestra) leyendo todos los datos. Para activarla, bórrala (DROP TABLE) y relanza Silver.")
 
-    # 2. LIMPIEZA PREVIA (Idempotencia)
+    # 2. DÍAS AFECTADOS
     # ---------------------------------------------------------
-    # Borramos datos antiguos para recargar (en un entorno real usaríamos particiones)
-    client.command("TRUNCATE TABLE silver.enriched_events")
-    print("🧹 Tabla Silver limpiada para nueva carga.")
+    # - Días con logs de ficheros nuevos o recargados en Bronze: los que aún
+    #   no están en Silver se insertan directamente; los que ya están se
+    #   recalculan con sus filas actuales más las nuevas.
+    # - Si cambian las dimensiones (usuarios, IPs, user-agents), los días de
+    #   Silver cuyo enriquecimiento ya no coincide se re-enriquecen desde la
+    #   propia Silver: no se pierde el histórico que Bronze ya no tiene.
+    recovered_days, backfill = recover_staging(client)
+    files = changed_files(client, silver_created)
+    # Los user-agents nuevos de esos ficheros se clasifican (una vez por
+    # user-agent distinto) y se añaden a la dimensión silver.user_agents.
+    ua_reclassified = ua.sync_user_agents(client, list(files))
+    # El algoritmo de JOIN se elige según el tamaño de las dimensiones y el
+    # presupuesto de memoria (ver choose_join_strategy)
+    strategy = choose_join_strategy(client)
+    print(f" JOIN '{strategy['algorithm']}': dimensiones ~{strategy['estimated_bytes'] / 1024 ** 2:.1f} MB en memoria "
+          f"(presupuesto {strategy['join_budget_bytes'] / 1024 ** 2:.0f} MB).")
+    file_days, reloaded_days = _file_days(client, list(files))
+    dimensions = _dimensions_signature(client)
+    dimensions_changed = ua_columns_added or ua_reclassified or catalog.consumed(client, 'silver', 'dimensions').get('') != dimensions
+    silver_days = {date.fromisoformat(p) for p in catalog.partition_stats(client, 'silver.enriched_events') if p}
+
+    redo_days = set(reloaded_days) | (set(file_days) & silver_days)
+    if dimensions_changed and silver_days:
+        redo_days |= set(run_with_join_fallback(client, strategy, "Días con dimensiones desactualizadas",
+                                                lambda settings: stale_days(client, settings)))
+    if redo_days and cluster.is_clustered() and not cfg.cluster_shard_hosts:
+        # Sin acceso a cada shard no se puede recalcular media semana de las
+        # vistas semanales (backfill): se recalculan las semanas completas
+        weeks = {day - timedelta(days=day.weekday()) for day in redo_days}
+        redo_days |= {day for day in silver_days if day - timedelta(days=day.weekday()) in weeks}
+    redo_days = sorted(redo_days)
+    new_days = sorted(set(file_days) - silver_days)
+
+    if not redo_days and not new_days and not recovered_days:
+        catalog.mark_consumed(client, 'silver', 'bronze.ingested_files', files)
+        catalog.mark_consumed(client, 'silver', 'dimensions', {'': dimensions})
+        print(" Silver sin cambios: ningún fichero nuevo o modificado en Bronze ni días por re-enriquecer.")
+        return
+    file_list = list(files)
 
     # 3. TRANSFORMACIÓN Y CARGA (ETL via SQL)
     # ---------------------------------------------------------
-    # Hacemos LEFT JOIN porque:
-    # - Puede haber logs de usuarios no registrados (user_id vacío) -> LEFT JOIN users
-    # - Puede haber IPs que no estén en nuestra lista de reputación -> LEFT JOIN ip_reputation
-    
-    sql_insert = """
-    INSERT INTO silver.enriched_events
-    SELECT
-        -- Campos de Logs (bronze.logs_web)
-        L.event_id,
-        parseDateTimeBestEffort(L.event_ts) AS event_ts, -- Conversión a DateTime
-        L.user_id,
-        L.ip_address,
-        L.http_method,
-        L.url_path,
-        L.status_code,
-        ifNull(L.bytes_sent, 0),        -- Limpieza de Nulos
-        ifNull(L.response_time_ms, 0),  -- Limpieza de Nulos
-        L.user_agent,
-        L.is_suspicious,
-
-        -- Campos de Users (bronze.users)
-        -- Si no cruza (usuario anónimo), ponemos valores por defecto
-        if(U.username = '', 'Anonymous', U.username) as user_name,
-        U.email,
-        if(U.role = '', 'guest', U.role) as user_role, -- [cite: 94]
-        if(U.country = '', 'XX', U.country) as user_country,
-        ifNull(U.is_premium, 0) as user_is_premium,
-
-        -- Campos de IP Reputation (bronze.ip_reputation)
-        -- Si no cruza, asumimos riesgo bajo/desconocido
-        if(I.risk_level = '', 'unknown', I.risk_level) as ip_risk_level, -- [cite: 133]
-        if(I.threat_type = '', 'benign', I.threat_type) as ip_threat_type, -- 
-        I.source
-
-    FROM bronze.logs_web AS L
-    LEFT JOIN bronze.users AS U 
-        ON L.user_id = U._id  -- Cruce por ID de usuario [cite: 88]
-    LEFT JOIN bronze.ip_reputation AS I 
-        ON L.ip_address = I.ip -- Cruce por IP [cite: 121]
+    # Días ya cargados: se calculan en staging y después se sustituyen en
+    # Silver y Gold (las vistas materializadas reciben de nuevo esos días).
+    if redo_days:
+        print(f" Recalculando {len(redo_days)} días de Silver ({_days_range(redo_days)})...")
+        _create_staging(client)
+        parameters = {'days': redo_days, 'files': file_list}
 
-        WHERE L.user_id IS NOT NULL 
-        AND L.user_id != ''
-    """
-    
-    client.command(sql_insert)
+        def fill_staging(settings):
+            # Filas que se conservan (re-enriquecidas) + filas nuevas de Bronze
+            for source in ('silver', 'bronze'):
+                client.command(enrich_sql(source, STAGING), parameters=parameters, settings=settings)
+
+        run_with_join_fallback(client, strategy, "Recálculo en staging", fill_staging,
+                               on_retry=lambda: _create_staging(client))
+        for view, view_days in _copy_from_staging(client, redo_days).items():
+            backfill[view] = sorted(set(backfill.get(view, [])) | set(view_days))
+
+    # Días nuevos: directamente de Bronze a Silver. Si el JOIN se queda sin
+    # memoria, se limpia lo insertado a medias (también en Gold) y se repite.
+    if new_days:
+        print(f" Cargando {len(new_days)} días nuevos en Silver ({_days_range(new_days)})...")
+        parameters = {'days': new_days, 'files': file_list}
+
+        def clear_new_days():
+            for view, view_days in _clear_silver(client, new_days).items():
+                backfill[view] = sorted(set(backfill.get(view, [])) | set(view_days))
+
+        if silver_created:
+            # Gold puede tener esos días de la tabla Silver anterior (el resto de su histórico se conserva)
+            clear_new_days()
+        run_with_join_fallback(
+            client, strategy, "Carga desde Bronze",
+            lambda settings: client.command(enrich_sql('bronze'), parameters=parameters, settings=settings),
+            on_retry=clear_new_days)
+
+    # Días de semanas incompletas en las vistas semanales: se recalculan desde
+    # Silver (salvo los que se acaban de insertar, que ya han llegado a Gold)
+    loaded_days = set(redo_days) | set(new_days) | set(recovered_days)
+    for view, view_days in backfill.items():
+        view_days = sorted(set(view_days) - loaded_days)
+        if view_days:
+            gl.backfill_gold_view(client, view, view_days)
+
+    catalog.mark_consumed(client, 'silver', 'bronze.ingested_files', files)
+    catalog.mark_consumed(client, 'silver', 'dimensions', {'': dimensions})
     
     # 4. VERIFICACIÓN
     # ---------------------------------------------------------
-    count = client.command("SELECT count() FROM silver.enriched_events")
+    days = sorted(loaded_days)
+    count = catalog.table_summary(client, 'silver.enriched_events', [day.isoformat() for day in days])['rows']
+    rows_in = client.command("""
+        SELECT sum(rows) FROM (
+            SELECT file_path, argMax(rows, updated_at) AS rows FROM bronze.ingested_files GROUP BY file_path
+        ) WHERE has({files:Array(String)}, file_path)
+    """, parameters={'files': file_list}) or 0
+    metrics.record(rows_in=rows_in, rows_out=count)
     duration = time.time() - start_time
     
-    print(f"Procesamiento Silver completado.")
-    print(f"Registros generados: {count}")
+    print("Procesamiento Silver completado.")
+    print(f"Registros generados: {count} en {len(days)} días (a partir de {len(files)} ficheros Bronze "
+          f"con {rows_in} logs) en {duration:.2f}s")
     print("-" * 30)
 
 if __name__ == "__main__":
-    process_silver()
\ No newline at end of file
+    process_silver()
@@ -0,0 +1,153 @@
+"""
+DIMENSIÓN USER-AGENT
+====================
+
+Clasifica cada user-agent en navegador, sistema operativo, tipo de
+dispositivo y bot/humano, y lo guarda en silver.user_agents (una fila por
+user-agent distinto). Silver cruza con ella para tener esas columnas como
+LowCardinality en cada evento.
+
+El coste depende del número de user-agents distintos, no de eventos:
+- Solo se leen de Bronze los user-agents que aún no están en la dimensión,
+  y solo de los ficheros que Silver va a cargar.
+- Si cambian las reglas (PARSER_VERSION), se reclasifican una vez los
+  user-agents ya guardados.
+- parse_user_agent() está memoizado con una caché acotada
+  (config.ua_cache_size), así que cada cadena se analiza una vez por proceso.
+"""
+
+import functools
+import re
+import config as conf
+import catalog
+import cluster
+
+COLUMNS = ['user_agent', 'ua_browser', 'ua_os', 'ua_device_class', 'ua_is_bot']
+# Versión de las reglas: al cambiarlas, se sube y los user-agents ya
+# guardados se vuelven a clasificar (ver _reclassify)
+PARSER_VERSION = '2'
+
+# Reglas en orden: gana la primera que encaja (p.ej. Edge antes que Chrome,
+# porque su user-agent también contiene "Chrome/").
+# "bot" solo cuenta como palabra suelta ("bot"), como final de un nombre con
+# versión ("Googlebot/2.1") o en bots conocidos: así marcas de móviles como
+# "CUBOT X30" no se confunden con bots.
+BOT_PATTERN = re.compile(
+    r'(?<![a-z])bot\b|[a-z]bot(?=/\d)|'
+    r'googlebot|bingbot|yandexbot|duckduckbot|applebot|ahrefsbot|semrushbot|mj12bot|petalbot|'
+    r'slackbot|twitterbot|discordbot|telegrambot|linkedinbot|facebookexternalhit|'
+    r'crawl|spider|slurp|curl|wget|python-requests|python-urllib|aiohttp|httpclient|'
+    r'go-http-client|java/|okhttp|axios|libwww|scrapy|headless|phantomjs|sqlmap|nikto|nmap|masscan|zgrab',
+    re.IGNORECASE)
+BROWSER_RULES = [
+    ('Edge', re.compile(r'edg(e|a|ios)?/', re.IGNORECASE)),
+    ('Opera', re.compile(r'opr/|opera', re.IGNORECASE)),
+    ('Samsung Internet', re.compile(r'samsungbrowser', re.IGNORECASE)),
+    ('Firefox', re.compile(r'firefox/|fxios/', re.IGNORECASE)),
+    ('Chrome', re.compile(r'chrome/|crios/|chromium/', re.IGNORECASE)),
+    ('Safari', re.compile(r'version/.*safari/', re.IGNORECASE)),
+    ('Internet Explorer', re.compile(r'msie |trident/', re.IGNORECASE)),
+]
+OS_RULES = [
+    ('iOS', re.compile(r'iphone|ipad|ipod', re.IGNORECASE)),
+    ('Android', re.compile(r'android', re.IGNORECASE)),
+    ('Windows', re.compile(r'windows', re.IGNORECASE)),
+    ('ChromeOS', re.compile(r'(?<![a-z])cros(?![a-z])', re.IGNORECASE)),
+    ('macOS', re.compile(r'macintosh|mac[ _]?os|(?<![a-z])mac(?![a-z])', re.IGNORECASE)),
+    ('Linux', re.compile(r'linux|x11', re.IGNORECASE)),
+]
+TABLET_PATTERN = re.compile(r'ipad|tablet|kindle|silk/', re.IGNORECASE)
+MOBILE_PATTERN = re.compile(r'mobile|iphone|ipod|android', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=conf.ua_cache_size)
+def parse_user_agent(user_agent):
+    """
+    (navegador, sistema operativo, tipo de dispositivo, es_bot) de un user-agent.
+    """
+    if not user_agent:
+        return 'Unknown', 'Unknown', 'unknown', False
+
+    bot_match = BOT_PATTERN.search(user_agent)
+    os_name = next((name for name, pattern in OS_RULES if pattern.search(user_agent)), 'Other')
+
+    if bot_match:
+        # Los bots se agrupan por su nombre: la palabra que contiene la coincidencia (Googlebot, curl...)
+        start, end = bot_match.span()
+        while start > 0 and (user_agent[start - 1].isalpha() or user_agent[start - 1] == '-'):
+            start -= 1
+        while end < len(user_agent) and (user_agent[end].isalpha() or user_agent[end] == '-'):
+            end += 1
+        return user_agent[start:end], os_name, 'bot', True
+
+    browser = next((name for name, pattern in BROWSER_RULES if pattern.search(user_agent)), 'Other')
+    if TABLET_PATTERN.search(user_agent) or (os_name == 'Android' and 'mobile' not in user_agent.lower()):
+        device_class = 'tablet'
+    elif MOBILE_PATTERN.search(user_agent):
+        device_class = 'mobile'
+    elif os_name in ('Windows', 'macOS', 'Linux', 'ChromeOS'):
+        device_class = 'desktop'
+    else:
+        device_class = 'other'
+    return browser, os_name, device_class, False
+
+
+def setup_user_agents(client):
+    client.command(f"""
+    CREATE TABLE IF NOT EXISTS {cluster.ddl_name('silver.user_agents')} (
+        user_agent String,
+        ua_browser LowCardinality(String),
+        ua_os LowCardinality(String),
+        ua_device_class LowCardinality(String),  -- desktop | mobile | tablet | bot | other | unknown
+        ua_is_bot Bool
+    ) ENGINE = ReplacingMergeTree()
+    ORDER BY user_agent
+    """)
+    cluster.create_distributed(client, 'silver.user_agents')
+
+
+def _reclassify(client):
+    """
+    Si las reglas han cambiado (PARSER_VERSION), vuelve a clasificar los
+    user-agents ya guardados y reemplaza los que cambian. Devuelve cuántos.
+    """
+    if catalog.consumed(client, 'silver', 'user_agents.parser').get('') == PARSER_VERSION:
+        return 0
+    result = client.query("SELECT user_agent, ua_browser, ua_os, ua_device_class, ua_is_bot FROM silver.user_agents FINAL")
+    rows = [[ua, *parse_user_agent(ua)] for ua, *_ in result.result_rows]
+    changed = [new for new, old in zip(rows, result.result_rows) if tuple(new) != tuple(old)]
+    if changed:
+        client.command(f"ALTER TABLE {cluster.ddl_name('silver.user_agents')} "
+                       "DELETE WHERE has({uas:Array(String)}, user_agent)",
+                       parameters={'uas': [row[0] for row in changed]},
+                       settings={'mutations_sync': 2 if cluster.is_clustered() else 1})
+        cluster.insert_sharded(client, 'silver.user_agents', 'user_agent', rows=changed, column_names=COLUMNS)
+    catalog.mark_consumed(client, 'silver', 'user_agents.parser', {'': PARSER_VERSION})
+    return len(changed)
+
+
+def sync_user_agents(client, files=None):
+    """
+    Añade a la dimensión los user-agents que aún no tiene, leyendo de Bronze
+    solo las filas de los ficheros indicados (los que Silver va a cargar; None
+    = toda la tabla). Devuelve cuántos user-agents ya guardados han cambiado
+    de clasificación (hay que re-enriquecer sus eventos).
+    """
+    setup_user_agents(client)
+    reclassified = _reclassify(client)
+    if files is not None and not files:
+        return reclassified
+    file_filter = "AND has({files:Array(String)}, _source_file)" if files is not None else ""
+    result = client.query(f"""
+        SELECT DISTINCT user_agent
+        FROM bronze.logs_web
+        WHERE user_agent NOT IN (SELECT user_agent FROM silver.user_agents) {file_filter}
+    """, parameters={'files': list(files)} if files is not None else None,
+        settings={'distributed_product_mode': 'allow'} if cluster.is_clustered() else None)
+    rows = [[ua, *parse_user_agent(ua)] for (ua,) in result.result_rows]
+    if rows:
+        cluster.insert_sharded(client, 'silver.user_agents', 'user_agent', rows=rows, column_names=COLUMNS)
+    info = parse_user_agent.cache_info()
+    print(f" [user_agents] {len(rows)} user-agents nuevos en la dimensión, {reclassified} reclasificados "
+          f"(caché del parser: {info.hits} aciertos, {info.misses} análisis).")
+    return reclassified